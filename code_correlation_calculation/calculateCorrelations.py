@@ -10,10 +10,14 @@ To run: python calculateCorrelations.py
 Outputs: a folder with CSVs for correlations
 '''
 import scipy.stats
+import numpy as np
 import os
+from multiprocessing import Pool, cpu_count
+from rougeScoresTable import loadRougeScores, getSystemScores
 
 # THE INPUTS TO RUN IN A LOOP - CHANGE YOUR INPUTS HERE:
-# the inputs to run on in the format "(humanAssessmentScoresTableFilepath, RougeScoresTableFilepath, outputCSVFolder)":
+# the inputs to run on in the format "(humanAssessmentScoresTableFilepath, RougeScoresTableFilepath, outputCSVFolder)",
+# where the ROUGE scores can also be the NumPy file written next to the CSV (<RougeScoresTable without .csv>.npz):
 INPUTS = [
     # Examples:
     ('2001_human.csv', '2001_to050_noStops.csv', '2001_correlations_to050'),
@@ -21,9 +25,16 @@ INPUTS = [
     ]
     
 
+# The number of processes computing the correlations of the INPUTS in parallel. None uses all the CPUs, 1 runs them one by one.
+NUM_WORKERS = None
+
 # The ROUGE types used within the scores data:
 ROUGE_TYPES = ['R1', 'R2', 'R3', 'R4', 'RSU', 'RL', 'RW', 'RS']
 
+# The measures of each ROUGE type, and the correlations computed for each:
+MEASURES = ['recall', 'precision', 'f1']
+CORRELATION_TYPES = ['pearson', 'spearman', 'kendall']
+
 def loadAndScore_humanAssessment(humanAssessmentCSVpath):
     '''
     Load the human assessment data from the CSV specified, and calculate the system scores.
@@ -53,142 +64,127 @@ def loadAndScore_humanAssessment(humanAssessmentCSVpath):
     return dataTuples, summaryLens
     
 
-def initDataStructureForAutoRankings(summaryLengths):
+def loadAndScore_AutomaticAssessment(autoAssessmentCSVpath):
+    '''
+    Load the ROUGE assessment data from the CSV specified, or from the NumPy file written next to it by
+    "calculateRouge.py" if the path is of a .npz file (cf. rougeScoresTable.py).
+    Returns a rougeScoresTable.RougeScores, with the array of the scores [system, summaryLength, rougeType, measure].
     '''
-    To initialize a data strucure for all the automatic rankings.
-    Dictionary with format:
-    |_  rouge_type (from ROUGE_TYPES list)
-        |_  summary_length
-            |_  recall/precision/f1 -> {}
+    return loadRougeScores(autoAssessmentCSVpath)
 
-    Returns a newly created dictionary.
+def getScoreMatrices(humanDataTuples, rougeScores):
     '''
-    data = {}
-    for rougeType in ROUGE_TYPES:
-        data[rougeType] = {}
-        for summLen in summaryLengths:
-            data[rougeType][summLen] = {'precision':{}, 'recall':{}, 'f1':{}}
-    
-    return data
+    Aligns the human and ROUGE scores (a RougeScores) of the systems once per summary length, so that all the ROUGE
+    types and measures are correlated with the human scores at once.
+    Returns a dictionary of format:
+    |_  summLen -> (humanScores, autoScores, columns)
+    where humanScores is an array [system] of the human scores, and autoScores an array [system, column] of the
+    ROUGE scores of every (rougeType, recall/precision/f1) column in the list columns, for the same systems (sorted by
+    name), with NaN for the missing ('-') scores.
+    '''
+    matrices = {}
+    for summLen in humanDataTuples:
+        if summLen not in rougeScores.summaryLengths:
+            continue
+        humanDict = dict(humanDataTuples[summLen])
+        systemNames = sorted(humanDict.keys())
+        humanScores = getScoresArray([humanDict[sysName] for sysName in systemNames])
+        # the ROUGE scores of the systems at the summary length, [system, rougeType, measure]:
+        systemScores = getSystemScores(rougeScores, systemNames)[:, rougeScores.summaryLengths.index(summLen)]
+        columns = [(rougeType, measure) for rougeType in ROUGE_TYPES for measure in MEASURES]
+        autoScores = np.full((len(systemNames), len(columns)), np.nan)
+        for colIdx, (rougeType, measure) in enumerate(columns):
+            if rougeType in rougeScores.rougeTypes:
+                autoScores[:, colIdx] = systemScores[:, rougeScores.rougeTypes.index(rougeType),
+                    rougeScores.measures.index(measure)]
+        matrices[summLen] = (humanScores, autoScores, columns)
+    return matrices
     
-def loadAndScore_AutomaticAssessment(autoAssessmentCSVpath):
+def getScoresArray(scores):
     '''
-    Load the ROUGE assessment data from the CSV specified, and rank the systems by scores.
-    Returns a dictionary of format:
-    |_  rougeType
-        |_  summaryLength
-            |_  recall/precision/f1 -> list of (sysName, score) tuples
-            
-    Assuming title line example: ROUGE_type,050_r,100_r,200_r,400_r,050_p,100_p,200_p,400_p,050_f,100_f,200_f,400_f
+    Returns an array of the scores given (strings or numbers), with NaN for the missing ('-') scores.
     '''
-    with open(autoAssessmentCSVpath, 'r') as fIn:
-        lines = fIn.readlines()
-        
-        # for the summaryLengths, take the first N/3 column names (_r/_p/_f repeats for each length) after the
-        # first 'ROUGE_type' column, and then take the string until the '_<r|p|f>' suffix:
-        firstLineParts = lines[0].strip().split(',')[1:]
-        summaryLens = [firstLineParts[i][:-2] for i in range(len(firstLineParts)/3)]
-        
-        # initialize the data structure for the rankings:
-        data = initDataStructureForAutoRankings(summaryLens)
-        
-        # Go over the rest of the lines.
-        # An empty line means a system section will start soon.
-        # A line with just one value is the system name.
-        # A line with multiple columns looks like this example:
-        #   R4,0.0046,0.0102,0.0178,0.0339,0.01915,0.0190,0.0159,0.015,0.0075,0.0132,0.0168,0.0208
-        for line in lines[1:]:
-            lineParts = line.strip().split(',')
-            
-            # line with single value, is the system name:
-            if len(lineParts) == 1:
-                systemName = lineParts[0]
-                
-            # line with multiple values is a data row:
-            elif len(lineParts) > 1:
-                rougeType = lineParts[0] # first column is the rouge type
-                dataRow = lineParts[1:] # the rest of the row is the recall/precision/f1 for each length
-                for summLenInd, summLen in enumerate(summaryLens):
-                    data[rougeType][summLen]['recall'][systemName] = dataRow[summLenInd]
-                    data[rougeType][summLen]['precision'][systemName] = dataRow[summLenInd + len(summaryLens)*1]
-                    data[rougeType][summLen]['f1'][systemName] = dataRow[summLenInd + len(summaryLens)*2]
-            
-    # keep a list of (sysName, score) tuples for each rouge type, for each summary length and for rec/prec/f1:
-    dataTuples = {}
-    for rougeType in ROUGE_TYPES:
-        dataTuples[rougeType] = {}
-        for summLen in summaryLens:
-            dataTuples[rougeType][summLen] = {
-                'precision' : data[rougeType][summLen]['precision'].items(),
-                'recall' : data[rougeType][summLen]['recall'].items(),
-                'f1' : data[rougeType][summLen]['f1'].items()
-                }
+    return np.array([float(score) if score != '-' else np.nan for score in scores], dtype=float)
     
-    return dataTuples
-
-def getCorrelations(humanDataTuples, autoDataTuples):
+def getCorrelations(humanDataTuples, rougeScores):
     '''
-    Gets all the correlation calculations between the human and auto ranked lists provided.
+    Gets all the correlation calculations between the human scores and the ROUGE scores (a RougeScores) provided.
     Returns a dictionary of format:
     |_  rougeType
         |_  summLen
             |_  recall/precision/f1
                 |_  pearson/spearman/kendall -> correlation scores
     '''
-    correlations = {}
-    for rougeType in ROUGE_TYPES:
-        print('Computing correlations for ROUGE: '+rougeType)
-        correlations[rougeType] = {}
-        for summLen in humanDataTuples:
-            print('\tComputing correlations for summLen: '+summLen)
-            if summLen in autoDataTuples[rougeType]:
-                correlations[rougeType][summLen] = {}
-                correlations[rougeType][summLen]['recall'] = \
-                    computeCorrelations(autoDataTuples[rougeType][summLen]['recall'], humanDataTuples[summLen])
-                correlations[rougeType][summLen]['precision'] = \
-                    computeCorrelations(autoDataTuples[rougeType][summLen]['precision'], humanDataTuples[summLen])
-                correlations[rougeType][summLen]['f1'] = \
-                    computeCorrelations(autoDataTuples[rougeType][summLen]['f1'], humanDataTuples[summLen])
+    correlations = {rougeType:{} for rougeType in ROUGE_TYPES}
+    for summLen, (humanScores, autoScores, columns) in getScoreMatrices(humanDataTuples, rougeScores).items():
+        print('\tComputing correlations for summLen: '+summLen)
+        columnsCorrelations = computeCorrelations(autoScores, humanScores)
+        for colIdx, (rougeType, measure) in enumerate(columns):
+            correlations[rougeType].setdefault(summLen, {})[measure] = \
+                {corrType:columnsCorrelations[corrType][colIdx] for corrType in CORRELATION_TYPES}
                     
     return correlations
     
-def computeCorrelations(tuplesListAuto, tuplesListHuman):
+def computeCorrelations(autoScores, humanScores):
     '''
-    Returns a dictionary of pearson/spearman/kendall corellation values for the two ranked lists given.
-    The input is two lists of tuples of format (systemName, score) in different orders.
-    They will be placed in order for the purpose of finding the correlations of rankings.
+    Returns a dictionary of pearson/spearman/kendall -> array [column] of the correlations of each column of the ROUGE
+    scores autoScores [system, column] with the human scores humanScores [system], over the systems that have both
+    scores (not NaN). The columns with the same systems are computed together, with array operations.
     '''
-    # prepare the ranked lists for the correlation functions:
-    listAutoPreped, listHumanPreped = prepareListsForCorrelation(tuplesListAuto, tuplesListHuman)
-    
-    # calculate the correlations:
-    correlations = {}
-    correlations['pearson'] = scipy.stats.pearsonr(listAutoPreped, listHumanPreped)[0]
-    correlations['spearman'] = scipy.stats.spearmanr(listAutoPreped, listHumanPreped)[0]
-    correlations['kendall'] = scipy.stats.kendalltau(listAutoPreped, listHumanPreped)[0]
+    numColumns = autoScores.shape[1]
+    correlations = {corrType:np.full(numColumns, np.nan) for corrType in CORRELATION_TYPES}
+    valid = ~np.isnan(autoScores) & ~np.isnan(humanScores)[:, np.newaxis]
+    # the different sets of systems of the columns (usually a single one), and the set of each column:
+    systemMasks, columnMasks = np.unique(valid.T, axis=0, return_inverse=True)
+    columnMasks = columnMasks.ravel()
+    for maskIdx, systemMask in enumerate(systemMasks):
+        columnIdxs = np.flatnonzero(columnMasks == maskIdx)
+        listsAuto = autoScores[systemMask][:, columnIdxs]
+        listHuman = humanScores[systemMask]
+        if len(listHuman) < 2:
+            # no correlation with fewer than two systems:
+            continue
+        correlations['pearson'][columnIdxs] = getPearsonColumns(listsAuto, listHuman)
+        # ranked as scipy.stats.spearmanr does (ties get their average rank):
+        correlations['spearman'][columnIdxs] = getPearsonColumns(
+            np.apply_along_axis(scipy.stats.rankdata, 0, listsAuto), scipy.stats.rankdata(listHuman))
+        correlations['kendall'][columnIdxs] = getKendallColumns(listsAuto, listHuman)
     
     return correlations
     
-def prepareListsForCorrelation(tuplesList1, tuplesList2):
+def getPearsonColumns(listsX, listY):
     '''
-    Puts the second list in the order of the first list in terms of the first value in the tuples.
-    Makes sure values perfectly intersect.
-    Returns two lists with an equal intersection of systemNames, with the scores only (second part of tuple).
+    The Pearson correlation of each column of listsX [system, column] with listY [system] (NaN if either is constant).
     '''
-    # get the system names intersection of the two lists:
-    set1 = set([sysName for sysName, score in tuplesList1 if score != '-'])
-    set2 = set([sysName for sysName, score in tuplesList2 if score != '-'])
-    intersectingSetOfSysNames = set1.intersection(set2)
-    
-    # convert to dictionaries for easy access:
-    dictOf1 = dict(tuplesList1)
-    dictOf2 = dict(tuplesList2)
-    
-    # create the two lists of scores in the same system order:
-    rankedList1 = [float(dictOf1[sysName]) for sysName in intersectingSetOfSysNames]
-    rankedList2 = [float(dictOf2[sysName]) for sysName in intersectingSetOfSysNames]
+    centeredX = listsX - listsX.mean(axis=0)
+    centeredY = listY - listY.mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlations = np.dot(centeredY, centeredX) / np.sqrt(np.sum(centeredX ** 2, axis=0) * np.dot(centeredY, centeredY))
+    # the mean of constant scores can differ from them by rounding, so they are found by comparison:
+    correlations[(listsX == listsX[:1]).all(axis=0) | (listY == listY[:1]).all()] = np.nan
+    return correlations
     
-    return rankedList1, rankedList2
+def getKendallColumns(listsX, listY):
+    '''
+    The Kendall tau-b correlation of each column of listsX [system, column] with listY [system] (NaN if either is
+    constant), as scipy.stats.kendalltau computes it: the difference of the concordant and discordant pairs of systems,
+    over the geometric mean of the numbers of pairs not tied in either list. The signs of the pairs of a system with
+    the following systems are computed for all the columns at once.
+    '''
+    numColumns = listsX.shape[1]
+    concordance = np.zeros(numColumns)
+    untiedX = np.zeros(numColumns)
+    untiedY = 0
+    for sysIdx in range(len(listY) - 1):
+        signsX = np.sign(listsX[sysIdx] - listsX[sysIdx + 1:])
+        signsY = np.sign(listY[sysIdx] - listY[sysIdx + 1:])
+        concordance += np.dot(signsY, signsX)
+        untiedX += np.count_nonzero(signsX, axis=0)
+        untiedY += np.count_nonzero(signsY)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlations = concordance / np.sqrt(untiedX * untiedY)
+    # as scipy, without the rounding errors beyond -1 and 1:
+    return np.clip(correlations, -1.0, 1.0)
     
 def outputToCsv(correlations, outputFolderpath, summaryLengths):
     '''
@@ -214,8 +210,8 @@ def outputToCsv(correlations, outputFolderpath, summaryLengths):
     os.makedirs(outputFolderpath) # create the output dir
     
     # write the table for each metric_corrType:
-    for measure in ['recall','precision','f1']:
-        for corrType in ['pearson', 'spearman', 'kendall']:
+    for measure in MEASURES:
+        for corrType in CORRELATION_TYPES:
             csvFilepath = os.path.join(outputFolderpath, 'correlations_{}_{}.csv'.format(measure, corrType))
             with open(csvFilepath, 'w') as fOut:
                 titleLine = ','.join(['Method']+[summLen for summLen in summaryLengths]) # Method,<len1>,<len2>,<len3>,<len4>
@@ -226,18 +222,35 @@ def outputToCsv(correlations, outputFolderpath, summaryLengths):
                     fOut.write(corrLine+'\n')
                     
 
+def runInput(inputParams):
+    '''
+    Computes the correlations of an input of INPUTS, and outputs them to CSV files.
+    '''
+    humanAssessmentCsvPath, autoAssessmentCsvPath, outputCsvPath = inputParams
+    print('--- Computing correlations for input: '+autoAssessmentCsvPath)
+    # load the human scores:
+    humanDataTuples, summaryLengths = loadAndScore_humanAssessment(humanAssessmentCsvPath)
+    # load the ROUGE scores:
+    rougeScores = loadAndScore_AutomaticAssessment(autoAssessmentCsvPath)
+    # get the correlations between the human and ROUGE scores:
+    correlations = getCorrelations(humanDataTuples, rougeScores)
+    # output to CSV files:
+    outputToCsv(correlations, outputCsvPath, summaryLengths)
+    
 def main():
-    # go over all inputs:
-    for humanAssessmentCsvPath, autoAssessmentCsvPath, outputCsvPath in INPUTS:
-        print('--- Computing correlations for next input...')
-        # load the human scores:
-        humanDataTuples, summaryLengths = loadAndScore_humanAssessment(humanAssessmentCsvPath)
-        # load the ROUGE scores:
-        autoDataTuples = loadAndScore_AutomaticAssessment(autoAssessmentCsvPath)
-        # get the correlations between the human and ROUGE scores:
-        correlations = getCorrelations(humanDataTuples, autoDataTuples)
-        # output to CSV files:
-        outputToCsv(correlations, outputCsvPath, summaryLengths)
+    numWorkers = min(NUM_WORKERS or cpu_count(), len(INPUTS))
+    # go over all inputs, in parallel processes if there are several:
+    if numWorkers <= 1:
+        for inputParams in INPUTS:
+            runInput(inputParams)
+    else:
+        pool = Pool(numWorkers)
+        try:
+            pool.map(runInput, INPUTS)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
         
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -12,10 +12,13 @@ To run: python calculateCorrelationsPairwise.py
 Outputs: a folder with CSVs for correlations
 '''
 import scipy.stats
+import numpy as np
 import os
+from rougeScoresTable import loadRougeScores, getSystemScores
 
 # THE INPUTS TO RUN IN A LOOP - CHANGE YOUR INPUTS HERE:
-# the inputs to run on in the format "(humanAssessmentScoresTableFilepath, RougeScoresTableFilepath, outputCSVFolder)":
+# the inputs to run on in the format "(humanAssessmentScoresTableFilepath, RougeScoresTableFilepath, outputCSVFolder)",
+# where the ROUGE scores can also be the NumPy file written next to the CSV (<RougeScoresTable without .csv>.npz):
 INPUTS = [
     #('output2001_human.csv', 'output2001_allLens.csv', 'output2001_allLens_correlations'),
     #('output2002_human.csv', 'output2002_allLens.csv', 'output2002_allLens_correlations'),
@@ -46,37 +49,37 @@ INPUTS = [
 ROUGE_TYPES = ['R1', 'R2', 'R3', 'R4', 'RSU', 'RL', 'RW', 'RS']
 
 
-def getPairwiseDifferences(dataDict, systemNamesSorted):
+def getScoresArray(dataDict, systemNamesSorted):
     '''
-    Returns a dictionary of system pair tuples to their corresponding score differences.
-    The difference is in the order of the pair (sys1-sys2 for pair (sys1,sys2)).
+    Returns an array of the scores of dataDict (sysName -> score) in the order of systemNamesSorted, with NaN for the
+    systems without a score ('-' or not in dataDict).
     '''
-    scoreDiffs = {}
-    
-    for i in range(len(systemNamesSorted)):
-        sysName1 = systemNamesSorted[i]
-        if not sysName1 in dataDict:
-            continue
-        score1Str = dataDict[sysName1]
-        for j in range(i+1, len(systemNamesSorted)):
-            sysName2 = systemNamesSorted[j]
-            if not sysName2 in dataDict:
-                continue
-            score2Str = dataDict[sysName2]
-            if score1Str == '-' or score2Str == '-':
-                continue
-            else:
-                scoreDiffs[(sysName1, sysName2)] = float(score1Str) - float(score2Str)
-    return scoreDiffs
+    return np.array([float(dataDict[sysName]) if dataDict.get(sysName, '-') != '-' else np.nan \
+        for sysName in systemNamesSorted], dtype=float)
+
+
+def getPairwiseDifferences(scores):
+    '''
+    Returns an array of the score differences of all the pairs of systems, for an array of their scores in the order
+    of the sorted system names. The difference is in the order of the pair (sys1-sys2 for pair (sys1,sys2), where sys1
+    is before sys2), and the pairs are in the order (sys1,sys2),(sys1,sys3),...,(sys2,sys3),...
+    '''
+    numSystems = len(scores)
+    diffs = np.empty(numSystems * (numSystems - 1) // 2)
+    start = 0
+    for sysIdx in range(numSystems - 1):
+        end = start + numSystems - 1 - sysIdx
+        np.subtract(scores[sysIdx], scores[sysIdx + 1:], out=diffs[start:end])
+        start = end
+    return diffs
 
 
 def loadAndScore_humanAssessment(humanAssessmentCSVpath):
     '''
-    Load the human assessment data from the CSV specified, and calculate the pairwise system scores.
-    Returns the pairwise score difference, the summary lengths and the system names (sorted)
-    The pairwise score differences are in the format:
-    |_ summary_length
-        |_ (sysName1, sysName2) -> score1 - score2
+    Load the human assessment data from the CSV specified.
+    Returns the system scores, the summary lengths and the system names (sorted)
+    The system scores are in the format:
+    |_ summary_length -> array of the scores of the systems (sorted), NaN for missing scores
     '''
     systemNames = {}
     # The file is in the format: system_name,<len1>,<len2>,<len3>,<len4>
@@ -95,92 +98,30 @@ def loadAndScore_humanAssessment(humanAssessmentCSVpath):
     
     systemNamesSorted = sorted(systemNames.keys())
     
-    # keep the differences of the system scores:
-    scoreDiffs = {}
+    # keep the scores of the systems in the sorted order, for their pairwise differences:
+    scores = {}
     for summLen in data:
-        scoreDiffs[summLen] = getPairwiseDifferences(data[summLen], systemNamesSorted)
+        scores[summLen] = getScoresArray(data[summLen], systemNamesSorted)
     
 
-    return scoreDiffs, summaryLens, systemNamesSorted
+    return scores, summaryLens, systemNamesSorted
     
 
-def initDataStructureForAutoRankings(summaryLengths):
-    '''
-    To initialize a data strucure for all the automatic rankings.
-    Dictionary with format:
-    |_  rouge_type (from ROUGE_TYPES list)
-        |_  summary_length
-            |_  recall/precision/f1 -> {}
-
-    Returns a newly created dictionary.
-    '''
-    data = {}
-    for rougeType in ROUGE_TYPES:
-        data[rougeType] = {}
-        for summLen in summaryLengths:
-            data[rougeType][summLen] = {'precision':{}, 'recall':{}, 'f1':{}}
-    
-    return data
-    
 def loadAndScore_AutomaticAssessment(autoAssessmentCSVpath, systemNamesSorted):
     '''
-    Load the auto assessment data from the CSV specified, and rank the systems by scores.
-    Returns a dictionary of format:
-    |_  rougeType
-        |_  summaryLength
-            |_  recall/precision/f1
-                |_  sysNamePair -> recallScoreDifference
-            
-    Assuming title line example: ROUGE_type,050_r,100_r,200_r,400_r,050_p,100_p,200_p,400_p,050_f,100_f,200_f,400_f
+    Load the auto assessment data from the CSV specified, or from the NumPy file written next to it by
+    "calculateRouge.py" if the path is of a .npz file (cf. rougeScoresTable.py), for the systems of systemNamesSorted.
+    Returns a rougeScoresTable.RougeScores of the systems of systemNamesSorted, with the array of their scores
+    [system (sorted), summaryLength, rougeType, measure], NaN for missing scores.
     '''
-    with open(autoAssessmentCSVpath, 'r') as fIn:
-        lines = fIn.readlines()
-        
-        # for the summaryLengths, take the first N/3 column names (_r/_p/_f repeats for each length) after the
-        # first 'ROUGE_type' column, and then take the string until the '_<r|p|f>' suffix:
-        firstLineParts = lines[0].strip().split(',')[1:]
-        summaryLens = [firstLineParts[i][:-2] for i in range(len(firstLineParts)/3)]
-        
-        # initialize the data structure for the rankings:
-        data = initDataStructureForAutoRankings(summaryLens)
-        
-        # Go over the rest of the lines.
-        # An empty line means a system section will start soon.
-        # A line with just one value is the system name.
-        # A line with multiple columns looks like this example:
-        #   R4,0.0046,0.0102,0.0178,0.0339,0.01915,0.0190,0.0159,0.015,0.0075,0.0132,0.0168,0.0208
-        for line in lines[1:]:
-            lineParts = line.strip().split(',')
-            
-            # line with single value, is the system name:
-            if len(lineParts) == 1:
-                systemName = lineParts[0]
-                
-            # line with multiple values is a data row:
-            elif len(lineParts) > 1:
-                rougeType = lineParts[0] # first column is the rouge type
-                dataRow = lineParts[1:] # the rest of the row is the recall/precision/f1 for each length
-                for summLenInd, summLen in enumerate(summaryLens):
-                    data[rougeType][summLen]['recall'][systemName] = dataRow[summLenInd]
-                    data[rougeType][summLen]['precision'][systemName] = dataRow[summLenInd + len(summaryLens)*1]
-                    data[rougeType][summLen]['f1'][systemName] = dataRow[summLenInd + len(summaryLens)*2]
-            
-    # get score differences between pairs of systems for each rouge type, for each summary length and for rec/prec/f1:
-    scoreDiffs = {}
-    for rougeType in ROUGE_TYPES:
-        scoreDiffs[rougeType] = {}
-        for summLen in summaryLens:
-            scoreDiffs[rougeType][summLen] = {
-                'precision' : getPairwiseDifferences(data[rougeType][summLen]['precision'], systemNamesSorted),
-                'recall' : getPairwiseDifferences(data[rougeType][summLen]['recall'], systemNamesSorted),
-                'f1' : getPairwiseDifferences(data[rougeType][summLen]['f1'], systemNamesSorted)
-                }
-    
-    return scoreDiffs
+    rougeScores = loadRougeScores(autoAssessmentCSVpath)
+    return rougeScores._replace(systemNames=list(systemNamesSorted),
+        scores=getSystemScores(rougeScores, systemNamesSorted))
 
-def getCorrelations(scoreDiffsHuman, scoreDiffsAuto):
+def getCorrelations(scoresHuman, scoresAuto):
     '''
-    Gets all the correlation calculations between the human and auto pair-wise score difference lists provided.
+    Gets all the correlation calculations between the pair-wise score differences of the human and auto system scores
+    provided (the auto scores as a RougeScores of the same systems).
     Returns a dictionary of format:
     |_  rougeType
         |_  summLen
@@ -191,52 +132,68 @@ def getCorrelations(scoreDiffsHuman, scoreDiffsAuto):
     for rougeType in ROUGE_TYPES:
         print('Computing correlations for ROUGE: '+rougeType)
         correlations[rougeType] = {}
-        for summLen in scoreDiffsHuman:
+        for summLen in scoresHuman:
             print('\tComputing correlations for summLen: '+summLen)
-            if summLen in scoreDiffsAuto[rougeType]:
+            if summLen in scoresAuto.summaryLengths and rougeType in scoresAuto.rougeTypes:
                 correlations[rougeType][summLen] = {}
-                correlations[rougeType][summLen]['recall'] = \
-                    computeCorrelations(scoreDiffsAuto[rougeType][summLen]['recall'], scoreDiffsHuman[summLen])
-                correlations[rougeType][summLen]['precision'] = \
-                    computeCorrelations(scoreDiffsAuto[rougeType][summLen]['precision'], scoreDiffsHuman[summLen])
-                correlations[rougeType][summLen]['f1'] = \
-                    computeCorrelations(scoreDiffsAuto[rougeType][summLen]['f1'], scoreDiffsHuman[summLen])
+                scores = scoresAuto.scores[:, scoresAuto.summaryLengths.index(summLen), scoresAuto.rougeTypes.index(rougeType)]
+                for measure in ['recall', 'precision', 'f1']:
+                    correlations[rougeType][summLen][measure] = \
+                        computeCorrelations(scores[:, scoresAuto.measures.index(measure)], scoresHuman[summLen])
                     
     return correlations
     
-def computeCorrelations(scoreDiffsDictAuto, scoreDiffsDictHuman):
+def computeCorrelations(scoresAuto, scoresHuman):
     '''
-    Returns a dictionary of pearson/spearman/kendall values for the two ranked lists given.
-    The input is two lists of tuples of format (systemName, score) in different orders.
-    They will be placed in order for the purpose of finding the correlations of rankings.
+    Returns a dictionary of pearson/spearman/kendall values for the pairwise score differences of the two arrays of
+    system scores given (in the same system order), over the pairs of systems that have both scores (not NaN).
+    The pearson correlation is computed from sums over the systems (cf. getPairwisePearson). The spearman and kendall
+    correlations are computed as before, from the differences of all the pairs: they are of the ranks of the
+    differences among all the differences, which do not follow from the ranks of the system scores.
     '''
-    # prepare the ranked lists for the correlation functions:
-    listAutoPreped, listHumanPreped = prepareListsForCorrelation(scoreDiffsDictAuto, scoreDiffsDictHuman)
+    # keep the systems that have both scores, whose pairs are the pairs with both score differences:
+    valid = ~np.isnan(scoresAuto) & ~np.isnan(scoresHuman)
+    scoresAuto = scoresAuto[valid]
+    scoresHuman = scoresHuman[valid]
     
     # calculate the correlations:
     correlations = {}
-    correlations['pearson'] = scipy.stats.pearsonr(listAutoPreped, listHumanPreped)[0]
-    correlations['spearman'] = scipy.stats.spearmanr(listAutoPreped, listHumanPreped)[0]
-    correlations['kendall'] = scipy.stats.kendalltau(listAutoPreped, listHumanPreped)[0]
+    correlations['pearson'] = getPairwisePearson(scoresAuto, scoresHuman)
+    if len(scoresAuto) < 3:
+        # a single pair at most:
+        correlations['spearman'] = correlations['kendall'] = np.nan
+    else:
+        diffsAuto = getPairwiseDifferences(scoresAuto)
+        diffsHuman = getPairwiseDifferences(scoresHuman)
+        correlations['spearman'] = scipy.stats.spearmanr(diffsAuto, diffsHuman)[0]
+        correlations['kendall'] = scipy.stats.kendalltau(diffsAuto, diffsHuman)[0]
     
     return correlations
     
-def prepareListsForCorrelation(dict1, dict2):
-    '''
-    Puts the second list in the order of the first list in terms of the first value in the tuples.
-    Makes sure values perfectly intersect.
-    Returns two lists with an equal intersection of systemNames, with the scores only.
-    '''
-    # get the system names intersection of the two lists:
-    set1 = set(dict1.keys())
-    set2 = set(dict2.keys())
-    intersectingSetOfSysNames = set1.intersection(set2)
-    
-    # create the two lists of score in the same system order:
-    rankedList1 = [float(dict1[sysTuple]) for sysTuple in intersectingSetOfSysNames]
-    rankedList2 = [float(dict2[sysTuple]) for sysTuple in intersectingSetOfSysNames]
-    
-    return rankedList1, rankedList2
+def getPairwisePearson(scoresX, scoresY):
+    '''
+    Returns the pearson correlation of the pairwise score differences of the two arrays of system scores given (in
+    the same system order), without computing the differences: with n systems (k = 0..n-1 in the sorted order), the
+    sums over the pairs (i,j), i<j, are sums over the systems:
+        sum(x_i - x_j) = sum_k (n-1-2k) x_k
+        sum((x_i - x_j) * (y_i - y_j)) = n sum_k(x_k y_k) - sum_k(x_k) sum_k(y_k)
+    NaN if there is a single pair at most, or if the scores of either array are all the same (as their differences
+    are then constant).
+    '''
+    numSystems = len(scoresX)
+    numPairs = numSystems * (numSystems - 1) / 2.0
+    if numPairs < 2 or (scoresX == scoresX[0]).all() or (scoresY == scoresY[0]).all():
+        return np.nan
+    # the differences are the same without the mean of the scores, which is removed for a better precision:
+    scoresX = scoresX - scoresX.mean()
+    scoresY = scoresY - scoresY.mean()
+    weights = numSystems - 1 - 2 * np.arange(numSystems)
+    sumX = np.dot(weights, scoresX)
+    sumY = np.dot(weights, scoresY)
+    sumXY = numSystems * np.dot(scoresX, scoresY) - scoresX.sum() * scoresY.sum()
+    sumXX = numSystems * np.dot(scoresX, scoresX) - scoresX.sum() ** 2
+    sumYY = numSystems * np.dot(scoresY, scoresY) - scoresY.sum() ** 2
+    return (numPairs * sumXY - sumX * sumY) / np.sqrt((numPairs * sumXX - sumX ** 2) * (numPairs * sumYY - sumY ** 2))
     
 def outputToCsv(correlations, outputFolderpath, summaryLengths):
     '''
@@ -278,12 +235,12 @@ def main():
     # go over all inputs:
     for humanAssessmentCsvPath, autoAssessmentCsvPath, outputCsvPath in INPUTS:
         print('--- Computing correlations for next input...')
-        # load the human pairwise score differences:
-        scoreDiffsHuman, summaryLengths, systemNamesSorted = loadAndScore_humanAssessment(humanAssessmentCsvPath)
-        # load the ROUGE pairwise score differences:
-        scoreDiffsAuto = loadAndScore_AutomaticAssessment(autoAssessmentCsvPath, systemNamesSorted)
-        # get the correlations between the human and ROUGE pairwise scores:
-        correlations = getCorrelations(scoreDiffsHuman, scoreDiffsAuto)
+        # load the human system scores:
+        scoresHuman, summaryLengths, systemNamesSorted = loadAndScore_humanAssessment(humanAssessmentCsvPath)
+        # load the ROUGE system scores:
+        scoresAuto = loadAndScore_AutomaticAssessment(autoAssessmentCsvPath, systemNamesSorted)
+        # get the correlations between the human and ROUGE pairwise score differences:
+        correlations = getCorrelations(scoresHuman, scoresAuto)
         # output to CSV files:
         outputToCsv(correlations, outputCsvPath, summaryLengths)
                     
@@ -0,0 +1,90 @@
+'''
+This module loads the ROUGE scores of the systems output by "calculateRouge.py", for the correlation scripts, as
+arrays: either from its CSV output, or in a single read from the NumPy file written next to it (cf. SCORES_NPZ there).
+
+Example:
+    rougeScores = loadRougeScores('2001_sameLen_noStops.npz')
+    # the recall of the ROUGE-2 scores at summary length 100, of the systems A, B and C (NaN for missing scores):
+    scores = getSystemScores(rougeScores, ['A', 'B', 'C'])[:, rougeScores.summaryLengths.index('100'),
+        rougeScores.rougeTypes.index('R2'), rougeScores.measures.index('recall')]
+'''
+
+import os
+import numpy as np
+from collections import namedtuple
+
+
+# The measures of every ROUGE type, in the order of the CSV columns:
+MEASURES = ['recall', 'precision', 'f1']
+
+# The ROUGE scores of all the systems:
+#   scores:     float array [system, summaryLength, rougeType, measure], with NaN for the missing ('-') scores.
+RougeScores = namedtuple('RougeScores', ['systemNames', 'summaryLengths', 'rougeTypes', 'measures', 'scores'])
+
+
+def loadRougeScores(path):
+    '''
+    Returns the RougeScores of the ROUGE output at path: the NumPy file if the path ends with .npz, or else the CSV.
+    '''
+    if os.path.splitext(path)[1] == '.npz':
+        with np.load(path) as saved:
+            return RougeScores(saved['systemNames'].tolist(), saved['summaryLengths'].tolist(),
+                saved['rougeTypes'].tolist(), saved['measures'].tolist(), saved['scores'])
+    return loadRougeScoresCsv(path)
+
+
+def loadRougeScoresCsv(path):
+    '''
+    Returns the RougeScores of the CSV output of "calculateRouge.py" at path.
+    Assuming title line example: ROUGE_type,050_r,100_r,200_r,400_r,050_p,100_p,200_p,400_p,050_f,100_f,200_f,400_f
+    '''
+    with open(path, 'r') as fIn:
+        lines = fIn.readlines()
+
+    # for the summaryLengths, take the first N/3 column names (_r/_p/_f repeats for each length) after the
+    # first 'ROUGE_type' column, and then take the string until the '_<r|p|f>' suffix:
+    firstLineParts = lines[0].strip().split(',')[1:]
+    summaryLens = [firstLineParts[i][:-2] for i in range(len(firstLineParts) // 3)]
+
+    # Go over the rest of the lines.
+    # An empty line means a system section will start soon.
+    # A line with just one value is the system name.
+    # A line with multiple columns looks like this example:
+    #   R4,0.0046,0.0102,0.0178,0.0339,0.01915,0.0190,0.0159,0.015,0.0075,0.0132,0.0168,0.0208
+    systemNames = []
+    rougeTypes = []
+    rows = {}
+    for line in lines[1:]:
+        lineParts = line.strip().split(',')
+
+        # line with single value, is the system name:
+        if len(lineParts) == 1:
+            if lineParts[0]:
+                systemName = lineParts[0]
+                systemNames.append(systemName)
+
+        # line with multiple values is a data row, of the recall/precision/f1 for each length:
+        elif len(lineParts) > 1:
+            rougeType = lineParts[0] # first column is the rouge type
+            if rougeType not in rougeTypes:
+                rougeTypes.append(rougeType)
+            rows[(systemName, rougeType)] = [float(score) if score != '-' else np.nan for score in lineParts[1:]]
+
+    scores = np.full((len(systemNames), len(summaryLens), len(rougeTypes), len(MEASURES)), np.nan)
+    for (systemName, rougeType), row in rows.items():
+        # the row is in the order [measure, summaryLength]:
+        scores[systemNames.index(systemName), :, rougeTypes.index(rougeType), :] = \
+            np.reshape(row, (len(MEASURES), len(summaryLens))).T
+    return RougeScores(systemNames, summaryLens, rougeTypes, list(MEASURES), scores)
+
+
+def getSystemScores(rougeScores, systemNames):
+    '''
+    Returns the array of the scores of rougeScores [system, summaryLength, rougeType, measure] for the systems of the
+    list systemNames, in its order, with NaN for the systems that are not in rougeScores.
+    '''
+    systemScores = np.full((len(systemNames),) + rougeScores.scores.shape[1:], np.nan)
+    for sysIdx, sysName in enumerate(systemNames):
+        if sysName in rougeScores.systemNames:
+            systemScores[sysIdx] = rougeScores.scores[rougeScores.systemNames.index(sysName)]
+    return systemScores
@@ -2,12 +2,16 @@ from __future__ import print_function, unicode_literals, division
 
 import os
 import re
+import sys
 import codecs
+import atexit
+import shutil
 import platform
 
 from subprocess import check_output
-from tempfile import mkdtemp
+from tempfile import mkdtemp, mkstemp
 from functools import partial
+from collections import OrderedDict, namedtuple
 
 try:
     from configparser import ConfigParser
@@ -19,6 +23,33 @@ from pyrouge.utils.file_utils import DirectoryProcessor
 from pyrouge.utils.file_utils import verify_dir
 
 
+# A ROUGE run prepared by Rouge155.prepare_run(): the command running
+# ROUGE-1.5.5.pl on its own configuration file, and its score cache
+# key and cached output (None if there is no score cache or the
+# output is not in it).
+RougeRun = namedtuple(
+    'RougeRun', ['command', 'config_file', 'cache_key', 'cached_output'])
+
+# The workspaces of the Rouge155 objects that are not removed yet, with
+# the ID of the process that created each of them (a forked process
+# must not remove the workspaces of its parent):
+_workspaces = {}
+
+
+def _remove_workspace(workspace):
+    if _workspaces.get(workspace) == os.getpid():
+        shutil.rmtree(workspace, True)
+    _workspaces.pop(workspace, None)
+
+
+def _remove_workspaces():
+    for workspace in list(_workspaces):
+        _remove_workspace(workspace)
+
+
+atexit.register(_remove_workspaces)
+
+
 class Rouge155(object):
     """
     This is a wrapper for the ROUGE 1.5.5 summary evaluation package.
@@ -69,9 +100,89 @@ class Rouge155(object):
             rouge_output = rouge.evaluate(system_id)
             print(rouge_output)
 
+    To compute the scores in-process instead of running the Perl
+    script (the ROUGE 'data' directory is still used for the stop
+    words and stemming exceptions). This backend, and the worker
+    backend below, are experimental: their outputs are not yet checked
+    against reference outputs of ROUGE-1.5.5.pl.
+
+        rouge = Rouge155(backend=Rouge155.BACKEND_NATIVE)
+
+    To compute them in a long-lived worker process instead (cf.
+    pyrouge.rouge_worker), which keeps the stop words, stemming
+    exceptions and tokenized summaries loaded for all the evaluations
+    of the process (it is shared by the Rouge155 objects and stopped
+    at exit), e.g. with a Python interpreter that has NumPy when this
+    one has not:
+
+        rouge = Rouge155(backend=Rouge155.BACKEND_WORKER)
+        rouge.worker_python = '/usr/bin/python3'
+
+    To reuse the outputs of earlier runs over the same summaries with
+    the same options (cf. pyrouge.rouge_cache):
+
+        rouge.score_cache = RougeScoreCache('rouge_scores.sqlite')
+
+    To find the model summaries of each system summary in an index of
+    the model summary filenames, instead of listing and scanning
+    model_dir for every system summary, set model_index to an object
+    with a get_model_filenames(id, model_dir, model_filename_pattern)
+    method returning the matching model filenames:
+
+        rouge.model_index = corpus_index
+
+    The native backend tokenizes every summary once. To keep the
+    tokenized summaries in a file for later runs (cf.
+    pyrouge.rouge_tokens), set a token cache and tokenize the
+    summaries before the evaluations:
+
+        rouge.token_cache = RougeTokenCache('rouge_tokens.bin')
+        rouge.tokenize_summaries()
+
+    When only the average scores are needed, the bootstrap resampling
+    of the confidence intervals can be skipped: the Perl script then
+    draws a single resample (-r 1, so its intervals are meaningless),
+    and the native backend none at all (its intervals are reported as
+    the averages). The native resampling is seeded with bootstrap_seed.
+
+        rouge.confidence_intervals = False
+
+    The configuration file and the converted summaries are written to a
+    scratch workspace of the object (cf. workspace), a new directory in
+    scratch_dir, or in the default temporary directory if it is None.
+    It is removed by cleanup(), when the object is garbage collected or
+    at exit. To keep it in memory (tmpfs) and remove it at the end:
+
+        with Rouge155() as rouge:
+            rouge.scratch_dir = Rouge155.TMPFS_DIR
+            ...
+
+    To run several evaluations of the Perl script at the same time,
+    each ROUGE run can be prepared with its own configuration file
+    and run by the caller, e.g. with the asyncio subprocess pool of
+    pyrouge.rouge_async (Python 3), which bounds the number of
+    concurrent runs and stops the runs that take too long:
+
+        pool = RougeProcessPool(max_processes=8, timeout=600)
+        output, results = await pool.evaluate(rouge)
+
     """
 
-    def __init__(self, rouge_dir=None, rouge_args=None):
+    BACKEND_PERL = 'perl'
+    BACKEND_NATIVE = 'native'
+    BACKEND_WORKER = 'worker'
+
+    # A directory in memory (tmpfs) on most Linux systems, for
+    # scratch_dir (the default temporary directory is used if it does
+    # not exist):
+    TMPFS_DIR = '/dev/shm'
+
+    __AVERAGE_LINE_PATTERN = re.compile(
+        r"(\S+) (ROUGE-\S+) (Average_\w): (\d.\d+) "
+        r"\(95%-conf.int. (\d.\d+) - (\d.\d+)\)")
+
+    def __init__(self, rouge_dir=None, rouge_args=None,
+                 backend=BACKEND_PERL):
         """
         Create a Rouge155 object.
 
@@ -79,12 +190,28 @@ class Rouge155(object):
             rouge_args: Arguments to pass through to ROUGE if you
                         don't want to use the default pyrouge
                         arguments.
+            backend:    BACKEND_PERL to run ROUGE-1.5.5.pl, or
+                        BACKEND_NATIVE to compute the same scores
+                        in-process without spawning Perl, or
+                        BACKEND_WORKER to compute them in a worker
+                        process kept for all the evaluations.
 
         """
         self.log = log.get_global_console_logger()
         self.__set_dir_properties()
         self._config_file = None
+        self.scratch_dir = None
+        self._workspace = None
+        self._converted_dir = None
         self._settings_file = self.__get_config_path()
+        self._native_rouge = None
+        self.worker_python = sys.executable
+        self.backend = backend
+        self.score_cache = None
+        self.model_index = None
+        self.token_cache = None
+        self.confidence_intervals = True
+        self.bootstrap_seed = 0
         self.__set_rouge_dir(rouge_dir)
         self.args = self.__clean_rouge_args(rouge_args)
         self._system_filename_pattern = None
@@ -112,6 +239,25 @@ class Rouge155(object):
         #    self.extraArgs += extraArgs
         self.extraArgs = extraArgs
     
+    @property
+    def backend(self):
+        """
+        The ROUGE implementation used by evaluate(): BACKEND_PERL,
+        BACKEND_NATIVE or BACKEND_WORKER.
+
+        """
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        backends = (Rouge155.BACKEND_PERL, Rouge155.BACKEND_NATIVE,
+                    Rouge155.BACKEND_WORKER)
+        if backend not in backends:
+            raise Exception(
+                "Unknown ROUGE backend {}. Use {}, {} or {}.".format(
+                    backend, *backends))
+        self._backend = backend
+
     @property
     def settings_file(self):
         """
@@ -247,7 +393,8 @@ class Rouge155(object):
     @staticmethod
     def write_config_static(system_dir, system_filename_pattern,
                             model_dir, model_filename_pattern,
-                            config_file_path, system_id=None):
+                            config_file_path, system_id=None,
+                            model_index=None):
         """
         Write the ROUGE configuration file, which is basically a list
         of system summary files and their corresponding model summary
@@ -269,6 +416,11 @@ class Rouge155(object):
             config_file_path:           Path of the configuration file.
             system_id:                  Optional system ID string which
                                         will appear in the ROUGE output.
+            model_index:                Optional index of the model
+                                        summary filenames, answering the
+                                        model filename queries instead
+                                        of listing model_dir (cf. the
+                                        model_index attribute).
 
         """
         system_filenames = [f for f in os.listdir(system_dir)]
@@ -280,7 +432,7 @@ class Rouge155(object):
             if match:
                 id = match.groups(0)[0]
                 model_filenames = Rouge155.__get_model_filenames_for_id(
-                    id, model_dir, model_filename_pattern)
+                    id, model_dir, model_filename_pattern, model_index)
                 system_models_tuples.append(
                     (system_filename, sorted(model_filenames)))
                 
@@ -296,11 +448,88 @@ class Rouge155(object):
                     system_models_tuples, start=1):
 
                 eval_string = Rouge155.__get_eval_string(
-                    task_id, system_id,
-                    system_dir, system_filename,
-                    model_dir, model_filenames)
+                    task_id, [(system_id, system_filename)],
+                    system_dir, model_dir, model_filenames)
+                f.write(eval_string)
+            f.write("</ROUGE-EVAL>")
+
+    @staticmethod
+    def write_batch_config_static(system_dir, model_dir, jobs,
+                                  config_file_path, model_index=None):
+        """
+        Write a single ROUGE configuration file for several systems,
+        so that one ROUGE run evaluates all of them. Each job is a
+        (system_id, system_filename_pattern, model_filename_pattern)
+        tuple, with patterns as for write_config_static(). System
+        summaries of the same document ID that are matched with the
+        same model summaries are listed as peers of a single EVAL, so
+        every model file is read once per document.
+
+            system_dir:         Path of directory containing system
+                                summaries.
+            model_dir:          Path of directory containing model
+                                summaries.
+            jobs:               List of (system_id,
+                                system_filename_pattern,
+                                model_filename_pattern) tuples. The
+                                system IDs must be unique and contain
+                                no whitespace.
+            config_file_path:   Path of the configuration file.
+            model_index:        Optional index of the model summary
+                                filenames (cf. write_config_static()).
+
+        Returns: The list of system IDs that matched any files. Jobs
+                 without system or model summaries are left out, and
+                 will be missing in ROUGE's output.
+
+        """
+        system_filenames = sorted(os.listdir(system_dir))
+        # (document ID, model filenames) -> list of (system ID, filename):
+        evals = OrderedDict()
+        evaluated_ids = []
+        for system_id, system_filename_pattern, model_filename_pattern \
+                in jobs:
+            pattern = re.compile(system_filename_pattern)
+            peers = []
+            try:
+                for system_filename in system_filenames:
+                    match = pattern.match(system_filename)
+                    if match:
+                        id = match.groups(0)[0]
+                        model_filenames = \
+                            Rouge155.__get_model_filenames_for_id(
+                                id, model_dir, model_filename_pattern,
+                                model_index)
+                        peers.append(
+                            ((id, tuple(sorted(model_filenames))),
+                             (system_id, system_filename)))
+            except Exception as e:
+                log.get_global_console_logger().warning(
+                    "Skipping system {}: {}".format(system_id, e))
+                continue
+            for eval_key, peer in peers:
+                evals.setdefault(eval_key, []).append(peer)
+            if peers:
+                evaluated_ids.append(system_id)
+
+        if not evals:
+            raise Exception(
+                "Did not find any system summaries with matching model "
+                "summaries in the system summaries directory {}.".format(
+                    system_dir))
+
+        # several model sets per document are numbered: <ID>.1, <ID>.2
+        eval_counts = {}
+        with codecs.open(config_file_path, 'w', encoding='utf-8') as f:
+            f.write('<ROUGE-EVAL version="1.55">')
+            for (id, model_filenames), peers in evals.items():
+                eval_counts[id] = eval_counts.get(id, 0) + 1
+                eval_string = Rouge155.__get_eval_string(
+                    "{}.{}".format(id, eval_counts[id]), peers,
+                    system_dir, model_dir, model_filenames)
                 f.write(eval_string)
             f.write("</ROUGE-EVAL>")
+        return evaluated_ids
 
     def write_config(self, config_file_path=None, system_id=None):
         """
@@ -316,20 +545,91 @@ class Rouge155(object):
         """
         if not system_id:
             system_id = 1
-        if (not config_file_path) or (not self._config_dir):
-            self._config_dir = mkdtemp()
-            config_filename = "rouge_conf.xml"
-        else:
-            config_dir, config_filename = os.path.split(config_file_path)
-            verify_dir(config_dir, "configuration file")
-        self._config_file = os.path.join(self._config_dir, config_filename)
+        self._config_file = self.__get_config_file_path(config_file_path)
         Rouge155.write_config_static(
             self._system_dir, self._system_filename_pattern,
             self._model_dir, self._model_filename_pattern,
-            self._config_file, system_id)
+            self._config_file, system_id, self.model_index)
         self.log.info(
             "Written ROUGE configuration to {}".format(self._config_file))
 
+    @property
+    def workspace(self):
+        """
+        The scratch directory of this object, which holds its ROUGE
+        configuration file (rewritten for every evaluation) and its
+        converted summaries. It is created on first use, in scratch_dir
+        if it exists, with a unique name so that objects in concurrent
+        processes never share it. It is removed by cleanup(), when the
+        object is deleted, or at exit.
+
+        """
+        if self._workspace is None or not os.path.isdir(self._workspace):
+            if self._workspace is not None:
+                _workspaces.pop(self._workspace, None)
+            scratch_dir = self.scratch_dir
+            if scratch_dir and not os.path.isdir(scratch_dir):
+                scratch_dir = None
+            self._workspace = mkdtemp(prefix='pyrouge_', dir=scratch_dir)
+            _workspaces[self._workspace] = os.getpid()
+            self._converted_dir = None
+        return self._workspace
+
+    def cleanup(self):
+        """
+        Remove the workspace, with the configuration file and converted
+        summaries in it. A new one is created if the object is used
+        again. The ROUGE worker process is kept for the following
+        evaluations of the process (cf. pyrouge.rouge_worker).
+
+        """
+        if self._workspace is not None:
+            _remove_workspace(self._workspace)
+        if self._converted_dir is not None:
+            # the directories of the converted summaries are removed:
+            self._system_dir = self._model_dir = None
+        if self._workspace and self._config_file and \
+                os.path.dirname(self._config_file) == self._workspace:
+            self._config_file = None
+        self._workspace = None
+        self._converted_dir = None
+
+    def __del__(self):
+        # the workspace of an object that was not cleaned up:
+        workspace = getattr(self, '_workspace', None)
+        if workspace is not None and _remove_workspace is not None:
+            _remove_workspace(workspace)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def write_batch_config(self, jobs, config_file_path=None):
+        """
+        Write a ROUGE configuration file evaluating several systems in
+        one run, for the system_dir and model_dir set on this object.
+
+        This is a non-static version of write_batch_config_static().
+
+            jobs:               List of (system_id,
+                                system_filename_pattern,
+                                model_filename_pattern) tuples.
+            config_file_path:   Path of the configuration file.
+
+        Returns: The list of system IDs that will be evaluated.
+
+        """
+        self._config_file = self.__get_config_file_path(config_file_path)
+        evaluated_ids = Rouge155.write_batch_config_static(
+            self._system_dir, self._model_dir, jobs, self._config_file,
+            self.model_index)
+        self.log.info(
+            "Written ROUGE configuration for {} systems to {}".format(
+                len(evaluated_ids), self._config_file))
+        return evaluated_ids
+
     def evaluate(self, system_id=1, rouge_args=None):
         """
         Run ROUGE to evaluate the system summaries in system_dir against
@@ -343,14 +643,119 @@ class Rouge155(object):
 
         """
         self.write_config(system_id=system_id)
+        return self.__run_rouge(rouge_args)
+
+    def evaluate_batch(self, jobs, rouge_args=None):
+        """
+        Run ROUGE once for several systems, each given by its own
+        system and model filename patterns, instead of running
+        evaluate() for each of them. The results of the systems can be
+        separated with output_to_dict(output, by_system=True).
+
+            jobs:   List of (system_id, system_filename_pattern,
+                    model_filename_pattern) tuples, with unique system
+                    IDs containing no whitespace.
+
+        Returns: Rouge output as string.
+
+        """
+        self.write_batch_config(jobs)
+        return self.__run_rouge(rouge_args)
+
+    def __run_rouge(self, rouge_args=None):
+        """
+        Run ROUGE on the configuration file last written, or take its
+        output from the score cache if one is set.
+
+        """
         options = self.__get_options(rouge_args)
-        command = [self._bin_path] + options
-        command.insert(0, 'perl ')
-        self.log.info(
-            "Running ROUGE with command {}".format(" ".join(command)))
-        rouge_output = check_output(command).decode("UTF-8")
+        cache_key = None
+        if self.score_cache is not None:
+            cache_key = self.__get_cache_key(options)
+            rouge_output = self.score_cache.get(cache_key)
+            if rouge_output is not None:
+                self.log.info(
+                    "Using cached ROUGE output for {}".format(
+                        self._config_file))
+                return rouge_output
+
+        if self._backend == Rouge155.BACKEND_NATIVE:
+            self.log.info(
+                "Running native ROUGE with options {}".format(
+                    " ".join(options)))
+            rouge_output = self.__get_native_rouge().evaluate(
+                options, self.confidence_intervals, self.bootstrap_seed)
+        elif self._backend == Rouge155.BACKEND_WORKER:
+            self.log.info(
+                "Running ROUGE worker with options {}".format(
+                    " ".join(options)))
+            rouge_output = self.__get_worker().evaluate(
+                options, self.confidence_intervals, self.bootstrap_seed)
+        else:
+            command = self.__get_command(options)
+            self.log.info(
+                "Running ROUGE with command {}".format(" ".join(command)))
+            rouge_output = check_output(command).decode("UTF-8")
+
+        if cache_key is not None:
+            self.score_cache.put(cache_key, rouge_output)
         return rouge_output
 
+    def prepare_run(self, system_id=1, rouge_args=None, jobs=None):
+        """
+        Prepare the Perl ROUGE run of evaluate() (or of
+        evaluate_batch() with jobs) without running it: its
+        configuration file is written to a new file in the workspace,
+        so that the system_dir, model_dir and filename patterns can be
+        changed for the next run while this one is going on.
+
+            system_id:  Optional system ID which will be printed in
+                        ROUGE's output.
+            jobs:       List of (system_id, system_filename_pattern,
+                        model_filename_pattern) tuples of a batch run,
+                        as for evaluate_batch().
+
+        Returns: A RougeRun. The caller runs its command, unless it
+                 has a cached output, and passes the output to
+                 finish_run().
+
+        """
+        if self._backend != Rouge155.BACKEND_PERL:
+            raise Exception(
+                "Only the {} backend runs ROUGE in a separate process.".format(
+                    Rouge155.BACKEND_PERL))
+        handle, config_file_path = mkstemp(
+            prefix='rouge_conf_', suffix='.xml', dir=self.workspace)
+        os.close(handle)
+        if jobs is None:
+            self.write_config(config_file_path, system_id)
+        else:
+            self.write_batch_config(jobs, config_file_path)
+        options = self.__get_options(rouge_args)
+        cache_key = None
+        cached_output = None
+        if self.score_cache is not None:
+            cache_key = self.__get_cache_key(options)
+            cached_output = self.score_cache.get(cache_key)
+        return RougeRun(
+            self.__get_command(options), config_file_path, cache_key,
+            cached_output)
+
+    def finish_run(self, run, rouge_output=None):
+        """
+        Store the output of a run of prepare_run() in the score cache
+        (if it was not taken from it), and remove its configuration
+        file. The output is None if the run failed.
+
+        """
+        if rouge_output is not None and run.cache_key is not None and \
+                run.cached_output is None:
+            self.score_cache.put(run.cache_key, rouge_output)
+        if self._config_file == run.config_file:
+            self._config_file = None
+        if os.path.exists(run.config_file):
+            os.remove(run.config_file)
+
     def convert_and_evaluate(self, system_id=1,
                              split_sentences=False, rouge_args=None):
         """
@@ -376,34 +781,357 @@ class Rouge155(object):
         rouge_output = self.evaluate(system_id, rouge_args)
         return rouge_output
 
-    def output_to_dict(self, output):
+    def convert_and_evaluate_batch(self, jobs, split_sentences=False,
+                                   rouge_args=None):
+        """
+        Convert plain text summaries to ROUGE format and run ROUGE once
+        for several systems. This is the batch version of
+        convert_and_evaluate() (cf. evaluate_batch()).
+
+        Returns: ROUGE output as string.
+
+        """
+        if split_sentences:
+            self.split_sentences()
+        self.__write_summaries()
+        return self.evaluate_batch(jobs, rouge_args)
+
+    def tokenize_summaries(self, dirs=None, metadata=None):
+        """
+        Tokenize the summaries (in the one-sentence-per-line HTML format
+        ROUGE understands) of system_dir and model_dir, or of dirs, into
+        the token cache of the native backend, together with their
+        stemmed and stop word forms, and save the token cache if it has
+        a file and changed. The native evaluations then start from the
+        tokenized summaries.
+
+            dirs:       Optional list of the directories to tokenize.
+            metadata:   Optional function of a directory and a filename,
+                        returning a dictionary to keep with the summary
+                        in the token cache (cf.
+                        RougeTokenCache.summary_metadata()).
+
+        """
+        from pyrouge.rouge_tokens import RougeTokenCache
+        if self.token_cache is None:
+            self.token_cache = RougeTokenCache()
+        if dirs is None:
+            dirs = [self._system_dir, self._model_dir]
+        for dir_path in dirs:
+            self.token_cache.add_dir(
+                dir_path, None if metadata is None
+                else partial(metadata, dir_path))
+        native_rouge = self.__get_native_rouge()
+        self.token_cache.stopword_flags(
+            self._data_dir, native_rouge.stopwords,
+            native_rouge.stopwords_signature)
+        self.token_cache.stem_ids(
+            self._data_dir, native_rouge.stem,
+            native_rouge.exceptions_signature)
+        if self.token_cache.path and self.token_cache.modified:
+            self.token_cache.save()
+        self.log.info("Tokenized the summaries of {}".format(
+            ", ".join(dirs)))
+
+    def evaluate_pairs(self, pairs, rouge_args=None, lengths=None):
+        """
+        Count the matches of system summaries against single model
+        summaries, with the native ROUGE implementation whatever the
+        backend. The scores against any set of model summaries can then
+        be assembled from these counts with pair_counts_to_dict(),
+        instead of running ROUGE for every set. The summaries are
+        assumed to be in the one-sentence-per-line HTML format ROUGE
+        understands. The ROUGE-N matches of all the pairs are counted
+        together, from sparse n-gram count matrices of the summaries.
+
+            pairs:      List of (system_filename, model_filename)
+                        tuples, of files in system_dir and model_dir.
+            lengths:    If given, the ROUGE-N matches are counted with
+                        the summaries truncated to each of these word
+                        counts (as with -l), in one pass per pair,
+                        instead of to the -l length of the options.
+
+        Returns: List with an OrderedDict of rouge type -> (hit,
+                 model_total, peer_total) for each pair, or with
+                 lengths, a list of them (one per length, in the order
+                 of lengths) for each pair.
+
+        """
+        from pyrouge.rouge_native import RougeSettings
+        native_rouge = self.__get_native_rouge()
+        settings = RougeSettings.from_options(self.__get_options(rouge_args))
+        counts = []
+        if lengths is not None:
+            order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+            sorted_lengths = [lengths[i] for i in order]
+            for system_filename, model_filename in pairs:
+                peer = native_rouge.summary_token_positions(
+                    os.path.join(self._system_dir, system_filename),
+                    settings)
+                model = native_rouge.summary_token_positions(
+                    os.path.join(self._model_dir, model_filename), settings)
+                sorted_counts = native_rouge.pair_counts_by_length(
+                    peer, model, settings, sorted_lengths)
+                length_counts = [None] * len(lengths)
+                for index, pair_counts in zip(order, sorted_counts):
+                    length_counts[index] = pair_counts
+                counts.append(length_counts)
+            return counts
+        peers = OrderedDict()
+        models = OrderedDict()
+        for system_filename, model_filename in pairs:
+            if system_filename not in peers:
+                peers[system_filename] = native_rouge.summary_sentences(
+                    os.path.join(self._system_dir, system_filename),
+                    settings)
+            if model_filename not in models:
+                models[model_filename] = native_rouge.summary_sentences(
+                    os.path.join(self._model_dir, model_filename), settings)
+        # the ROUGE-N counts of all the peers against all the models at
+        # once, with the index of every summary in them:
+        ngram_counts = native_rouge.ngram_pair_counts(
+            list(peers.values()), list(models.values()), settings)
+        peer_index = dict((filename, index)
+                          for index, filename in enumerate(peers))
+        model_index = dict((filename, index)
+                           for index, filename in enumerate(models))
+        for system_filename, model_filename in pairs:
+            i = peer_index[system_filename]
+            j = model_index[model_filename]
+            pair_ngram_counts = OrderedDict(
+                (rouge_type, (int(hits[i, j]), int(model_totals[j]),
+                              int(peer_totals[i])))
+                for rouge_type, (hits, model_totals, peer_totals)
+                in ngram_counts.items())
+            counts.append(native_rouge.pair_counts(
+                peers[system_filename], models[model_filename], settings,
+                pair_ngram_counts))
+        return counts
+
+    def evaluate_matrix(self, filenames, rouge_args=None):
+        """
+        Count the matches of every summary of model_dir in filenames
+        against every one of them (itself included), as
+        evaluate_pairs() counts them for all the pairs of the list, but
+        with the matches of a pair and of its reverse counted once
+        where they are the same (cf. RougeNative.matrix_pair_counts()).
+        The scores of any summary of the list against any set of the
+        others can then be assembled with pair_count_arrays_to_dict().
+
+            filenames:  List of the filenames of summaries in
+                        model_dir.
+
+        Returns: (list of rouge types, array [peer, model, rouge type,
+                 (hit, model_total, peer_total)]), with the summaries
+                 in the order of filenames.
+
+        """
+        from pyrouge.rouge_native import RougeSettings
+        native_rouge = self.__get_native_rouge()
+        settings = RougeSettings.from_options(self.__get_options(rouge_args))
+        summaries = [
+            native_rouge.summary_sentences(
+                os.path.join(self._model_dir, filename), settings)
+            for filename in filenames]
+        return native_rouge.matrix_pair_counts(summaries, settings)
+
+    def pair_counts_to_dict(self, eval_counts, rouge_args=None,
+                            by_eval=False):
+        """
+        Score a system from the counts of evaluate_pairs(), as ROUGE
+        scores it against the same model summaries, into the dictionary
+        output_to_dict() returns (without the confidence intervals).
+
+            eval_counts:    List with an item per ROUGE EVAL (system
+                            summary): the list of the evaluate_pairs()
+                            counts against each of its model summaries,
+                            in the order of their filenames. Only the
+                            rouge types in the counts are scored.
+            by_eval:        If True, the scores of every EVAL are
+                            returned too, unrounded (ROUGE -d prints
+                            them rounded).
+
+        Returns: dictionary of the average scores, or with by_eval, a
+                 tuple of it and the list of the dictionaries of the
+                 scores of every EVAL, in the order of eval_counts.
+
+        """
+        import numpy as np
+        from pyrouge.rouge_native import RougeSettings
+        if not eval_counts:
+            raise Exception("No system summaries to score.")
+        if not all(eval_counts):
+            raise Exception(
+                "Could not find any model summaries for a system summary.")
+        settings = RougeSettings.from_options(self.__get_options(rouge_args))
+        rouge_types = [
+            rouge_type
+            for rouge_type in self.__get_native_rouge().rouge_types(settings)
+            if rouge_type in eval_counts[0][0]]
+        num_models = [len(model_counts) for model_counts in eval_counts]
+        counts = np.zeros(
+            (len(eval_counts), max(num_models), len(rouge_types), 3))
+        for eval_index, model_counts in enumerate(eval_counts):
+            for model_index, pair_counts in enumerate(model_counts):
+                counts[eval_index, model_index] = [
+                    pair_counts[rouge_type] for rouge_type in rouge_types]
+        return self.pair_count_arrays_to_dict(
+            counts, num_models, rouge_types, rouge_args, by_eval)
+
+    def pair_count_arrays_to_dict(self, counts, num_models, rouge_types,
+                                  rouge_args=None, by_eval=False):
+        """
+        pair_counts_to_dict() from arrays of the counts, scoring all the
+        EVALs of a rouge type at once (cf. jackknife_score_arrays()),
+        so that the scores against any set of model summaries are
+        computed from the counts without going through the pairs.
+
+            counts:         Array [EVAL, model, rouge type, (hit,
+                            model_total, peer_total)] of the
+                            evaluate_pairs() counts of every EVAL,
+                            with its models first, in the order of
+                            their filenames.
+            num_models:     The number of models of every EVAL.
+            rouge_types:    The rouge types of the counts.
+
+        Returns: as pair_counts_to_dict().
+
+        """
+        import numpy as np
+        from pyrouge.rouge_native import RougeSettings, \
+            jackknife_score_arrays, round_score, wlcs_weight_of
+        num_models = np.asarray(num_models)
+        if not len(num_models):
+            raise Exception("No system summaries to score.")
+        if not num_models.all():
+            raise Exception(
+                "Could not find any model summaries for a system summary.")
+        settings = RougeSettings.from_options(self.__get_options(rouge_args))
+        counts = np.asarray(counts, dtype=np.float64)
+        results = {}
+        eval_results = [{} for _ in num_models]
+        for type_index, rouge_type in enumerate(rouge_types):
+            scores = jackknife_score_arrays(
+                counts[:, :, type_index], num_models, settings.score_mode,
+                settings.alpha, weight=wlcs_weight_of(rouge_type))
+            rouge_type = rouge_type.lower().replace("-", '_')
+            for index, measure in enumerate(
+                    ['recall', 'precision', 'f_score']):
+                key = "{}_{}".format(rouge_type, measure)
+                values = scores[:, index].tolist()
+                results[key] = round_score(sum(values) / len(values))
+                for eval_result, value in zip(eval_results, values):
+                    eval_result[key] = value
+        if by_eval:
+            return results, eval_results
+        return results
+
+    def output_to_dict(self, output, by_system=False):
         """
         Convert the ROUGE output into python dictionary for further
         processing.
 
+            by_system:  If True, the results are split by the system
+                        (peer) ID printed by ROUGE, as needed for the
+                        output of evaluate_batch(), and a dictionary of
+                        system ID -> results dictionary is returned.
+
+        """
+        results = {}
+        results_by_system = OrderedDict()
+        for line in output.split("\n"):
+            average = Rouge155.parse_average_line(line)
+            if average:
+                sys_id, key, result, conf_begin, conf_end = average
+                if by_system:
+                    results = results_by_system.setdefault(sys_id, {})
+                results[key] = result
+                results["{}_cb".format(key)] = conf_begin
+                results["{}_ce".format(key)] = conf_end
+        if by_system:
+            return results_by_system
+        return results
+
+    @staticmethod
+    def parse_average_line(line):
+        """
+        Parse a line of the ROUGE output with an average score, such
+        as the lines output_to_dict() reads.
+
+        Returns: A (system_id, key, score, conf_begin, conf_end) tuple,
+                 with the output_to_dict() key of the score, or None if
+                 the line has no average score.
+
         """
         #0 ROUGE-1 Average_R: 0.02632 (95%-conf.int. 0.02632 - 0.02632)
+        match = Rouge155.__AVERAGE_LINE_PATTERN.match(line)
+        if not match:
+            return None
+        sys_id, rouge_type, measure, result, conf_begin, conf_end = \
+            match.groups()
+        measure = {
+            'Average_R': 'recall',
+            'Average_P': 'precision',
+            'Average_F': 'f_score'
+            }[measure]
+        rouge_type = rouge_type.lower().replace("-", '_')
+        key = "{}_{}".format(rouge_type, measure)
+        return (sys_id, key, float(result), float(conf_begin),
+                float(conf_end))
+
+    def output_to_eval_dict(self, output, by_system=False):
+        """
+        Convert the scores of every EVAL in the ROUGE output, which
+        ROUGE prints when run with -d, into a python dictionary of EVAL
+        ID -> results dictionary, with the keys of output_to_dict()
+        (without the confidence intervals). ROUGE prints these scores
+        rounded to 5 decimals.
+
+            by_system:  If True, a dictionary of system (peer) ID ->
+                        EVAL ID -> results dictionary is returned, as
+                        needed for the output of evaluate_batch().
+
+        """
+        #1 ROUGE-1 Eval 1 R:0.02632 P:0.02632 F:0.02632
         pattern = re.compile(
-            r"(\d+) (ROUGE-\S+) (Average_\w): (\d.\d+) "
-            r"\(95%-conf.int. (\d.\d+) - (\d.\d+)\)")
-        results = {}
+            r"(\S+) (ROUGE-\S+) Eval (\S+) "
+            r"R:(\d.\d+) P:(\d.\d+) F:(\d.\d+)")
+        results_by_system = OrderedDict()
         for line in output.split("\n"):
             match = pattern.match(line)
             if match:
-                sys_id, rouge_type, measure, result, conf_begin, conf_end = \
+                sys_id, rouge_type, eval_id, recall, precision, f_score = \
                     match.groups()
-                measure = {
-                    'Average_R': 'recall',
-                    'Average_P': 'precision',
-                    'Average_F': 'f_score'
-                    }[measure]
                 rouge_type = rouge_type.lower().replace("-", '_')
-                key = "{}_{}".format(rouge_type, measure)
-                results[key] = float(result)
-                results["{}_cb".format(key)] = float(conf_begin)
-                results["{}_ce".format(key)] = float(conf_end)
+                results = results_by_system.setdefault(
+                    sys_id, OrderedDict()).setdefault(eval_id, {})
+                results["{}_recall".format(rouge_type)] = float(recall)
+                results["{}_precision".format(rouge_type)] = float(precision)
+                results["{}_f_score".format(rouge_type)] = float(f_score)
+        if by_system:
+            return results_by_system
+        results = OrderedDict()
+        for eval_results in results_by_system.values():
+            results.update(eval_results)
         return results
 
+    def get_config_peers(self, config_file_path=None):
+        """
+        The system summaries of every EVAL of the configuration file
+        last written (or of config_file_path, e.g. the configuration
+        file of a RougeRun), e.g. to find the system summary of the
+        scores returned by output_to_eval_dict().
+
+        Returns: OrderedDict of EVAL ID -> list of (system_id,
+                 system_filename) tuples.
+
+        """
+        from pyrouge.rouge_native import RougeNative
+        return OrderedDict(
+            (spec.eval_id, spec.peers)
+            for spec in RougeNative.read_config(
+                config_file_path or self._config_file))
+
     ###################################################################
     # Private methods
 
@@ -420,12 +1148,93 @@ class Rouge155(object):
             self.save_home_dir()
         self._bin_path = os.path.join(self._home_dir, 'ROUGE-1.5.5.pl')
         self.data_dir = os.path.join(self._home_dir, 'data')
-        if not os.path.exists(self._bin_path):
+        if self._backend == Rouge155.BACKEND_PERL and \
+                not os.path.exists(self._bin_path):
             raise Exception(
                 "ROUGE binary not found at {}. Please set the "
                 "correct path by running pyrouge_set_rouge_path "
                 "/path/to/rouge/home.".format(self._bin_path))
 
+    def __get_native_rouge(self):
+        """
+        The in-process ROUGE implementation, created once per object so
+        that its stop words, stemming exceptions and tokenized
+        summaries are reused between evaluations.
+
+        """
+        if self._native_rouge is None:
+            from pyrouge.rouge_native import RougeNative
+            self._native_rouge = RougeNative(
+                self._data_dir, self.token_cache)
+        elif self.token_cache is not None:
+            self._native_rouge.token_cache = self.token_cache
+        return self._native_rouge
+
+    def __get_command(self, options):
+        """
+        The command line running ROUGE-1.5.5.pl with the options.
+
+        """
+        return ['perl', self._bin_path] + options
+
+    def __get_worker(self):
+        """
+        The ROUGE worker process of the data directory, token cache
+        file (of token_cache, if it has one) and worker_python, started
+        on the first evaluation of the process and kept for all the
+        following ones, of any Rouge155 object, until the process exits.
+
+        """
+        from pyrouge.rouge_worker import get_worker
+        token_cache_path = None
+        if self.token_cache is not None:
+            token_cache_path = self.token_cache.path
+        return get_worker(
+            self._data_dir, token_cache_path, self.worker_python)
+
+    def __get_cache_key(self, options):
+        """
+        The score cache key of a ROUGE run: the backend, the ROUGE
+        options (without the configuration file path, the last option),
+        the content hashes of the files of the data directory (stop
+        words, WordNet exceptions) and, for every EVAL of the
+        configuration file, the content hashes of its system summaries
+        with their IDs and the sorted content hashes of its model
+        summaries. Native runs also depend on the confidence interval
+        settings.
+
+        """
+        with codecs.open(self._config_file, 'r', encoding='utf-8') as f:
+            config = f.read()
+        file_hash = self.score_cache.file_hash
+        # the worker runs the native implementation, with the same output:
+        backend = self._backend
+        if backend == Rouge155.BACKEND_WORKER:
+            backend = Rouge155.BACKEND_NATIVE
+        parts = [backend, " ".join(options[:-1])]
+        if self._data_dir and os.path.isdir(self._data_dir):
+            parts.append(" ".join(
+                self.score_cache.dir_hashes(self._data_dir)))
+        if backend == Rouge155.BACKEND_NATIVE:
+            parts.append("confidence_intervals={} bootstrap_seed={}".format(
+                self.confidence_intervals, self.bootstrap_seed))
+        for eval_id, body in re.findall(
+                r'<EVAL ID="([^"]*)">(.*?)</EVAL>', config, re.DOTALL):
+            peer_root = re.search(
+                r'<PEER-ROOT>(.*?)</PEER-ROOT>', body).group(1)
+            model_root = re.search(
+                r'<MODEL-ROOT>(.*?)</MODEL-ROOT>', body).group(1)
+            peers = [
+                "{}:{}".format(id, file_hash(os.path.join(peer_root, name)))
+                for id, name in re.findall(
+                    r'<P ID="([^"]*)">(.*?)</P>', body)]
+            models = sorted(
+                file_hash(os.path.join(model_root, name))
+                for name in re.findall(r'<M ID="[^"]*">(.*?)</M>', body))
+            parts.append("{} {} | {}".format(
+                eval_id, " ".join(peers), " ".join(models)))
+        return self.score_cache.make_key(parts)
+
     def __get_rouge_home_dir_from_settings(self):
         config = ConfigParser()
         with open(self._settings_file) as f:
@@ -439,21 +1248,22 @@ class Rouge155(object):
 
     @staticmethod
     def __get_eval_string(
-            task_id, system_id,
-            system_dir, system_filename,
-            model_dir, model_filenames):
+            task_id, peers,
+            system_dir, model_dir, model_filenames):
         """
         ROUGE can evaluate several system summaries for a given text
         against several model summaries, i.e. there is an m-to-n
         relation between system and model summaries. The system
         summaries are listed in the <PEERS> tag and the model summaries
-        in the <MODELS> tag. pyrouge currently only supports one system
-        summary per text, i.e. it assumes a 1-to-n relation between
-        system and model summaries.
+        in the <MODELS> tag. peers is a list of (system_id,
+        system_filename) tuples: a single one for write_config_static(),
+        and one per system for write_batch_config_static().
 
         """
-        peer_elems = "<P ID=\"{id}\">{name}</P>".format(
+        peer_elems = ["<P ID=\"{id}\">{name}</P>".format(
             id=system_id, name=system_filename)
+            for system_id, system_filename in peers]
+        peer_elems = "\n\t\t\t".join(peer_elems)
 
         model_elems = ["<M ID=\"{id}\">{name}</M>".format(
             id=chr(65 + i), name=name)
@@ -486,7 +1296,7 @@ class Rouge155(object):
         system and model folders.
 
         """
-        temp_dir = mkdtemp()
+        temp_dir = mkdtemp(prefix='summaries_', dir=self.workspace)
         new_system_dir = os.path.join(temp_dir, "system")
         os.mkdir(new_system_dir)
         new_model_dir = os.path.join(temp_dir, "model")
@@ -498,16 +1308,37 @@ class Rouge155(object):
         process_func(self._model_dir, new_model_dir)
         self._system_dir = new_system_dir
         self._model_dir = new_model_dir
+        # the summaries processed before are not used anymore:
+        if self._converted_dir is not None:
+            shutil.rmtree(self._converted_dir, ignore_errors=True)
+        self._converted_dir = temp_dir
+
+    def __get_config_file_path(self, config_file_path=None):
+        """
+        The path to write the configuration file to: config_file_path,
+        or the same file in the workspace for every evaluation.
+
+        """
+        if config_file_path:
+            config_dir = os.path.dirname(config_file_path)
+            verify_dir(config_dir or os.curdir, "configuration file")
+            return config_file_path
+        return os.path.join(self.workspace, "rouge_conf.xml")
 
     def __write_summaries(self):
         self.log.info("Writing summaries.")
         self.__process_summaries(self.convert_summaries_to_rouge_format)
 
     @staticmethod
-    def __get_model_filenames_for_id(id, model_dir, model_filenames_pattern):
-        pattern = re.compile(model_filenames_pattern.replace('#ID#', id))
-        model_filenames = [
-            f for f in os.listdir(model_dir) if pattern.match(f)]
+    def __get_model_filenames_for_id(id, model_dir, model_filenames_pattern,
+                                     model_index=None):
+        if model_index is not None:
+            model_filenames = model_index.get_model_filenames(
+                id, model_dir, model_filenames_pattern)
+        else:
+            pattern = re.compile(model_filenames_pattern.replace('#ID#', id))
+            model_filenames = [
+                f for f in os.listdir(model_dir) if pattern.match(f)]
         if not model_filenames:
             raise Exception(
                 "Could not find any model summaries for the system"
@@ -532,7 +1363,7 @@ class Rouge155(object):
                 '-2',
                 '-1',
                 '-U',
-                '-r', 1000,
+                '-r', 1000 if self.confidence_intervals else 1,
                 '-n', 4,
                 '-w', 1.2,
                 '-a',
@@ -9,7 +9,15 @@ Outputs: a CSV file with the ROUGE scores
 '''
 
 import os
+import numpy as np
 from pyrouge import Rouge155
+from pyrouge.rouge_cache import RougeScoreCache
+from rougeJobs import RougeJob, RougeBatchJob, RougeVariantsJob, runRougeJobs, tokenizeSummaries, logger
+from rougePairCounts import getPairCountsVariants, getPairCountsScores
+from rougeTaskScores import newTaskScores, storeTaskScores, getAverageScores, saveTaskScores, MEASURES
+from rougeScores import newScoreStore, storeScores, getScoreStrings, saveScoreStore, MEASURES as SCORE_MEASURES
+from ducCorpusIndex import DucCorpusIndex
+from summaryConversion import SummaryConverter
 import time
 
 
@@ -27,6 +35,11 @@ COMPARE_TO_ONE_LARGER = 9 # comparing a system summary to the model summaries of
 REMOVE_STOP_WORDS = True
 LEAVE_STOP_WORDS = False
 
+# The folder names of the outputs of each stop words mode, for inputs with several modes (cf. INPUTS):
+STOP_WORDS_FOLDERS = {
+    REMOVE_STOP_WORDS:'stop_words_removed',
+    LEAVE_STOP_WORDS:'stop_words_remaining'}
+
 # The rouge types. Keys are internal IDs for this code, and the values
 # are the strings used in the dictioanry returned by the Rouge155 module.
 ROUGE_TYPES = {
@@ -46,8 +59,73 @@ FORMAT_TEXT = 'text'
 
 # The input format to use - CHANGE THIS TO "FORMAT_TEXT" IF THE INPUT SUMMARIES ARE NOT IN SEE FORMAT:
 INPUT_FORMAT = FORMAT_SEE
+
+# The ROUGE implementation to use. Perl runs the original ROUGE-1.5.5.pl script for every evaluation,
+# native computes the same scores in-process (much faster, no Perl needed, but still uses the ROUGE data folder).
+# The native and worker backends are EXPERIMENTAL: their outputs are not yet checked against reference outputs of
+# ROUGE-1.5.5.pl (cf. tests/test_rouge_native.py), so the Perl script stays the default.
+BACKEND_PERL = Rouge155.BACKEND_PERL
+BACKEND_NATIVE = Rouge155.BACKEND_NATIVE
+# worker computes them as native, in a long-lived worker process per ROUGE process (cf. rouge_worker.py), which keeps the
+# stop words, stemming exceptions and tokenized summaries loaded for all its evaluations.
+BACKEND_WORKER = Rouge155.BACKEND_WORKER
+# The ROUGE backend to use - CHANGE THIS TO "BACKEND_NATIVE" TO AVOID RUNNING PERL:
+ROUGE_BACKEND = BACKEND_PERL
+
+# Whether to evaluate all the systems of a summary length in a single ROUGE run (one configuration with all the
+# systems as peers) instead of a separate run for each system and summary length. The scores are the same.
+# ROUGE truncates to one length per run (-l), so there is still one run per summary length.
+BATCH_SYSTEMS = False
+
+# Whether to score every system summary against every single model summary once (always with the native ROUGE), and
+# assemble the scores of the comparison type from these per-pair counts instead of running ROUGE for it. The counts
+# are kept for the following INPUTS with the same folders and stop words mode, so running all the comparison types
+# costs a single pass. The scores are the same, without confidence intervals (which are not output anyway).
+PAIR_COUNTS = False
+
+# The number of processes to run the ROUGE evaluations in parallel. None uses all the CPUs, 1 runs them one by one.
+NUM_WORKERS = None
+
+# A file in which to keep the ROUGE outputs between runs, so that evaluations already done with the same
+# summaries and ROUGE options are not run again (e.g. 'rouge_scores.sqlite'). None to not use a cache.
+SCORE_CACHE_PATH = None
+
+# A file in which to keep the index of the summary filenames of the folders between runs (e.g. 'corpus_index.json'),
+# rebuilt for a folder when it changes. None to index the folders on every run.
+CORPUS_INDEX_PATH = None
+
+# A file in which to keep the tokenized summaries between runs (e.g. 'rouge_tokens.bin'), so that the native ROUGE
+# reads and tokenizes every SEE summary once. Only used with BACKEND_NATIVE or BACKEND_WORKER (or PAIR_COUNTS). None to not keep them.
+TOKEN_CACHE_PATH = None
+
+# A folder in which to keep the temporary files of the ROUGE evaluations (configuration files, converted summaries),
+# e.g. Rouge155.TMPFS_DIR ('/dev/shm') to keep them in memory. None for the default temporary folder. They are removed
+# when the evaluations of an input are done.
+SCRATCH_DIR = None
+
+# The number of seconds after which a run of the Perl ROUGE is stopped, failing its evaluation, so that a hung Perl
+# process does not stall the run. None for no limit. Only used with BACKEND_PERL.
+ROUGE_TIMEOUT = None
+
+# Whether ROUGE computes the bootstrap confidence intervals of the scores. The CSV outputs only have the average
+# scores, so they are skipped by default (much faster with the Perl script, which otherwise draws 1000 resamples).
+CONFIDENCE_INTERVALS = False
+
+# Whether to also keep the ROUGE scores of every task, and not only the averages of the systems, in a NumPy file next
+# to each CSV output (<outputCSV without .csv>.tasks.npz, cf. rougeTaskScores.py). The averages of the CSV, or other
+# aggregations of the scores, can then be computed from the file without running ROUGE again (cf. getDataFromTaskScores).
+TASK_SCORES = False
+
+# Whether to also write the average scores of the CSV output in a NumPy file next to it (<outputCSV without .csv>.npz,
+# cf. rougeScores.saveScoreStore): an array [system, summary length, ROUGE type, measure] with NaN for missing scores,
+# and the labels of its axes. The correlation scripts load it in a single read instead of parsing the CSV.
+SCORES_NPZ = False
+
 # THE INPUTS TO RUN IN A LOOP - CHANGE YOUR INPUTS HERE:
 # Each input: (comparisonType, modelSummariesFolderPath, systemSummariesFolderPath, outputCSVfilepath, DUC year [2001|2002], stopWordsMode)
+# The stopWordsMode can also be a list of modes, all evaluated in the same pass, in which case "{stopWords}" in the
+# outputCSVfilepath is replaced by the folder name of each mode in STOP_WORDS_FOLDERS, e.g.:
+#   (COMPARE_TO_LARGEST, 'data/DUC2001/see.models', 'data/DUC2001/submissions.for.SEE', '{stopWords}/2001_to400.csv', 2001, [REMOVE_STOP_WORDS, LEAVE_STOP_WORDS])
 INPUTS = [
     # EXAMPLES:
     (COMPARE_VARYING_LEN, 'data/DUC2002/SEE.model_edited.abstracts.in.edus', 'data/DUC2002/SEE.peer_abstracts.in.sentences', '2002_diffLens.csv', 2002, LEAVE_STOP_WORDS),
@@ -56,9 +134,10 @@ INPUTS = [
     (COMPARE_TO_ONE_SMALLER, 'data/DUC2001/see.models', 'data/DUC2001/submissions.for.SEE', '2001_toOneShorter_noStops.csv', 2001, REMOVE_STOP_WORDS)
     ]
     
-def getComparisonOptions(folderSystems, folderModels):
+def getComparisonOptions(folderSystems, folderModels, corpusIndex):
     '''
-    Gets all the task names, summary lengths and system names from the system filenames of the Multi-doc summaries.
+    Gets all the task names, summary lengths and system names from the system filenames of the Multi-doc summaries,
+    as parsed in the corpusIndex (a DucCorpusIndex).
     Assuming format <taskName>.<M for Multi/P for Perdoc>.<summLen>.<AssessorId>.<systemId>.<txt/html> for multi-text
         example: D061.M.010.J.16.txt
     or <taskName>.<M for Multi/P for Perdoc>.<summLen>.<AssessorId>.<systemId>.<singleFileName>.<txt/html> for single-text
@@ -66,82 +145,55 @@ def getComparisonOptions(folderSystems, folderModels):
         
     Returns three orderer list of: taskNames, systemNames, summaryLengths
     '''
-    # keep the info for the multi-doc and per-doc separately:
-    taskNames = {'M':{},'P':{}}
-    systemNames = {'M':{},'P':{}}
-    summaryLengths = {'M':{},'P':{}}
-    
-    # iterate through the filenames and keep the info according to the filename parts:
-    for filename in os.listdir(folderSystems):
-        nameParts = filename.split('.')
-        if len(nameParts) < 5:
-            continue
-            
-        taskName = nameParts[0]
-        summaryLength = nameParts[2]
-        systemName = nameParts[4]
-        
-        # MultiDoc (e.g.: D061.M.010.J.16.txt)
-        if nameParts[1] == 'M':
-            taskNames['M'][taskName] = 1
-            summaryLengths['M'][summaryLength] = 1
-            systemNames['M'][systemName] = 1
-            
-        # PerDoc (e.g.: D061.P.100.J.16.AP880916-0060.txt)
-        elif nameParts[1] == 'P':
-            taskNames['P'][taskName] = 1
-            summaryLengths['P'][summaryLength] = 1
-            systemNames['P'][systemName] = 1
+    # take just the multi-doc info (e.g.: D061.M.010.J.16.txt):
+    taskNames, systemNames, summaryLengths = corpusIndex.getFolderIndex(folderSystems).getOptions('M')
             
     # remove the model names from the system names found:
-    for filename in os.listdir(folderModels):
-        nameParts = filename.split('.')
-        if len(nameParts) < 5:
-            continue
-        modelName = nameParts[4]
-        if nameParts[1] == 'M' and modelName in systemNames['M']:
-            del systemNames['M'][modelName]
-        elif nameParts[1] == 'P' and modelName in systemNames['P']:
-            del systemNames['P'][modelName]
-    
-    # take just the multi-doc info and sort it:
-    taskNames = sorted(taskNames['M'].keys())
-    systemNames = sorted(systemNames['M'].keys())
-    summaryLengths = sorted(summaryLengths['M'].keys())
+    modelNames = corpusIndex.getFolderIndex(folderModels).getOptions('M')[1]
+    systemNames = [systemName for systemName in systemNames if systemName not in modelNames]
     
     return taskNames, systemNames, summaryLengths
     
 def initDataStructure(systemNames, summaryLengths):
     '''
-    To initialize a data strucure for all the ROUGE values.
-    In the format of dictionaries:
-    |_  system_name
-        |_  summary_length
-            |_  rouge_type (from ROUGE_TYPES keys)
-                |_  < precision=-1 | recall=-1 | f1=-1 >
+    To initialize a data strucure for all the ROUGE values: a rougeScores.ScoreStore of the scores
+    [system_name, summary_length, rouge_type (from ROUGE_TYPES keys), <recall | precision | f1>], without any values.
     
-    Returns a newly created dictionary.
+    Returns a newly created ScoreStore.
     '''
-    data = {}
-    for sysName in systemNames:
-        data[sysName] = {}
-        for summLen in summaryLengths:
-            data[sysName][summLen] = {}
-            for rougeType in ROUGE_TYPES:
-                data[sysName][summLen][rougeType] = {'precision':-1, 'recall':-1, 'f1':-1}
-    return data
+    return newScoreStore(systemNames, summaryLengths, ROUGE_TYPES)
     
 def storeData(dataStruct, sysName, summLen, newData):
     '''
     Stores the Rouge155 module dictionary information into the dataStruct provided at
     the sysName, summLen entry.
     '''
-    for rougeType, rougeDataStr in ROUGE_TYPES.items():
-        dataStruct[sysName][summLen][rougeType]['recall'] = newData[rougeDataStr+'_recall']
-        dataStruct[sysName][summLen][rougeType]['precision'] = newData[rougeDataStr+'_precision']
-        dataStruct[sysName][summLen][rougeType]['f1'] = newData[rougeDataStr+'_f_score']
+    storeScores(dataStruct, sysName, (summLen,), newData, ROUGE_TYPES)
+
+def getDataFromTaskScores(taskScores):
+    '''
+    Computes the average ROUGE values of the systems from the scores of their tasks (a rougeTaskScores.TaskScores,
+    e.g. loaded from the file saved with TASK_SCORES), without running ROUGE.
+    Example, to write the CSV output again:
+        taskScores = loadTaskScores('2001_sameLen_noStops.tasks.npz')
+        outputToCsv(getDataFromTaskScores(taskScores), '2001_sameLen_noStops.csv', taskScores.systemNames, taskScores.summaryLengths)
+    Returns a data structure as specified in the initDataStructure method.
+    '''
+    allData = initDataStructure(taskScores.systemNames, taskScores.summaryLengths)
+    averages = getAverageScores(taskScores)
+    for sysIdx, sysName in enumerate(taskScores.systemNames):
+        for lenIdx, summLen in enumerate(taskScores.summaryLengths):
+            if np.isnan(averages[sysIdx, lenIdx]).all():
+                continue
+            output_dict = {'{}_{}'.format(rougeType, measure):float(averages[sysIdx, lenIdx, typeIdx, measureIdx]) \
+                for typeIdx, rougeType in enumerate(taskScores.rougeTypes) for measureIdx, measure in enumerate(MEASURES)}
+            try:
+                storeData(allData, sysName, summLen, output_dict)
+            except:
+                pass
+    return allData
 
-def runRougeCombinations(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsRemoval):
+def runRougeCombinations(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsModes, pairCounts=None, taskScores=None):
     '''
     Get the ROUGE values for all the system vs model combinations.
     Measures each system summary against:
@@ -153,20 +205,103 @@ def runRougeCombinations(comparisonType, folderSystems, folderModels, systemName
         - *longest length* model summaries (comparisonType==COMPARE_TO_LARGEST)
         - *one smaller length* model summaries (comparisonType==COMPARE_TO_ONE_SMALLER)
         - *one larger length* model summaries (comparisonType==COMPARE_TO_ONE_LARGER)
-    Returns a dictionary of the format specified in the initDataStructure method.
+    for each of the preprocessing variants in stopWordsModes (a list of stop words modes), in the same pass: the
+    evaluations of all the variants of a system and summary length run together, so that the summaries are read
+    and tokenized once for all of them.
+    The summaries of folderSystems and folderModels are in SEE format (text summaries are converted once in main).
+    The ROUGE evaluations are run in NUM_WORKERS parallel processes, or, if pairCounts (a list with the
+    rougePairCounts.PairCounts of the folders for each variant) are given, the scores are assembled from them.
+    If taskScores (a list with a rougeTaskScores.TaskScores for each variant) is given, the scores of every task are
+    stored in them too.
+    Returns a list with a data structure as specified in the initDataStructure method for each variant.
     '''
     print('Calculating all ROUGE scores...')
     
-    # initialize the ROUGE object:
-    rougeCalculator = Rouge155()
-                
-    # initialize the data structure to hold all the ROUGE results:
-    allData = initDataStructure(systemNames, summaryLengths)
+    # initialize the data structures to hold all the ROUGE results of the variants:
+    allData = [initDataStructure(systemNames, summaryLengths) for _ in stopWordsModes]
+    if taskScores is None:
+        taskScores = [None] * len(stopWordsModes)
+    keepTaskScores = taskScores[0] is not None
+    
+    if pairCounts is not None:
+        # the scores from the counts of each system summary against each single model summary:
+        rougeCalculator = Rouge155(backend=BACKEND_NATIVE)
+        for sysName in systemNames:
+            for summLen in summaryLengths:
+                modelSummLen = getModelSummariesLength(comparisonType, summLen, summaryLengths, ducVersion)
+                for variantIdx in range(len(stopWordsModes)):
+                    try:
+                        output_dict = getPairCountsScores(rougeCalculator, pairCounts[variantIdx], sysName, summLen, modelSummLen, keepTaskScores)
+                    except Exception:
+                        logger.exception("The pair-count scores of system {} at length {} failed".format(sysName, summLen))
+                        output_dict = None
+                    if output_dict is None:
+                        continue
+                    if keepTaskScores:
+                        output_dict, outputDictsByTask = output_dict
+                        storeTaskScores(taskScores[variantIdx], sysName, summLen, outputDictsByTask)
+                    try:
+                        # keep the data in the allData data structure:
+                        storeData(allData[variantIdx], sysName, summLen, output_dict)
+                    except:
+                        pass
+            print('\t--- Done system: {} ---'.format(sysName))
+    elif BATCH_SYSTEMS:
+        # a single ROUGE run per summary length and variant, with the results of all the systems:
+        jobs = getVariantsJobs([getRougeBatchJobs(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsRemoval) \
+            for stopWordsRemoval in stopWordsModes])
+        for summLen, variantsOutputDicts in runRougeJobs(jobs, ROUGE_BACKEND, FORMAT_SEE, NUM_WORKERS, SCORE_CACHE_PATH, CORPUS_INDEX_PATH, TOKEN_CACHE_PATH, CONFIDENCE_INTERVALS, keepTaskScores, scratchDir=SCRATCH_DIR, jobTimeout=ROUGE_TIMEOUT):
+            print('\t--- Done summary length: {} ---'.format(summLen))
+            for variantIdx, outputDictsBySystem in enumerate(variantsOutputDicts):
+                if outputDictsBySystem is None:
+                    continue
+                if keepTaskScores:
+                    outputDictsBySystem, taskOutputDictsBySystem = outputDictsBySystem
+                    for sysName, outputDictsByTask in taskOutputDictsBySystem.items():
+                        storeTaskScores(taskScores[variantIdx], sysName, summLen, outputDictsByTask)
+                # keep the data of each system in the allData data structure:
+                for sysName, output_dict in outputDictsBySystem.items():
+                    try:
+                        storeData(allData[variantIdx], sysName, summLen, output_dict)
+                    except:
+                        pass
+    else:
+        # a ROUGE run per system, summary length and variant:
+        jobs = getVariantsJobs([getRougeJobs(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsRemoval) \
+            for stopWordsRemoval in stopWordsModes])
+        for (sysName, summLen), variantsOutputDicts in runRougeJobs(jobs, ROUGE_BACKEND, FORMAT_SEE, NUM_WORKERS, SCORE_CACHE_PATH, CORPUS_INDEX_PATH, TOKEN_CACHE_PATH, CONFIDENCE_INTERVALS, keepTaskScores, scratchDir=SCRATCH_DIR, jobTimeout=ROUGE_TIMEOUT):
+            if summLen == summaryLengths[-1]:
+                print('\t--- Done system: {} ---'.format(sysName))
+            for variantIdx, output_dict in enumerate(variantsOutputDicts):
+                if output_dict is None:
+                    continue
+                if keepTaskScores:
+                    output_dict, outputDictsByTask = output_dict
+                    storeTaskScores(taskScores[variantIdx], sysName, summLen, outputDictsByTask)
+                try:
+                    # keep the data in the allData data structure:
+                    storeData(allData[variantIdx], sysName, summLen, output_dict)
+                except:
+                    pass
+    
+    print('Current ROUGEing done!')
+    return allData
+    
+def getVariantsJobs(variantsJobs):
+    '''
+    Groups the jobs of the preprocessing variants (a list per variant of the same jobs with the flags of the variant)
+    into a RougeVariantsJob per job, with the key of the job, so that the variants of a job run together.
+    '''
+    return [RougeVariantsJob(jobs[0].key, list(jobs)) for jobs in zip(*variantsJobs)]
     
+def getRougeJobs(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsRemoval):
+    '''
+    Gets the list of ROUGE evaluations (RougeJob) for runRougeCombinations, one per system and summary length,
+    with the key (sysName, summLen).
+    '''
+    jobs = []
     # for each system get the ROUGE results separately:
     for sysName in systemNames:
-        print('\t--- On system: {} ---'.format(sysName))
-        
         # for each summary length get the ROUGE results separately:
         for summLen in summaryLengths:
             # the reference summary files to use for this iteration (regex of filenames for pyrouge):
@@ -176,38 +311,41 @@ def runRougeCombinations(comparisonType, folderSystems, folderModels, systemName
             # for the current length, for the current system:
             sysSummFilenamePattern = '(.*).M.{}.(.*).{}.html'.format(summLen, sysName)
             
-            # set the properties for the ROUGE object:
-            rougeCalculator.system_dir = folderSystems
-            rougeCalculator.model_dir = folderModels
-            rougeCalculator.system_filename_pattern = sysSummFilenamePattern
-            rougeCalculator.model_filename_pattern = refSummFilenamePattern
-            
-            # add the ROUGE flag to truncate the system summaries according to their defined length:
-            rougeAdditionalParams = ['-l', int(summLen)]
-            # possibly add the ROUGE flag to remove stop words:
-            if stopWordsRemoval == REMOVE_STOP_WORDS:
-                rougeAdditionalParams.append('-s')
-            rougeCalculator.add_rouge_args_to_default(rougeAdditionalParams)
-            
-            try:
-                # When using plain text format, run convert_and_evaluate.
-                # For SEE format, use just evaluate(), since convert is for text->SEE conversion.
-                if INPUT_FORMAT == FORMAT_SEE:
-                    output = rougeCalculator.evaluate()
-                elif INPUT_FORMAT == FORMAT_TEXT:
-                    output = rougeCalculator.convert_and_evaluate()
-                    
-                # get the ROUGE output:
-                output_dict = rougeCalculator.output_to_dict(output)
-                # keep the data in the allData data structure:
-                storeData(allData, sysName, summLen, output_dict)
-            except:
-                pass
-        #break ### break here to check just the first system on all tasks
+            # add the ROUGE flags to truncate the summaries and possibly remove stop words:
+            jobs.append(RougeJob((sysName, summLen), folderSystems, folderModels,
+                sysSummFilenamePattern, refSummFilenamePattern, getRougeAdditionalParams(summLen, stopWordsRemoval)))
+    return jobs
     
+def getRougeBatchJobs(comparisonType, folderSystems, folderModels, systemNames, summaryLengths, ducVersion, stopWordsRemoval):
+    '''
+    Gets the list of ROUGE runs (RougeBatchJob) for runRougeCombinations when BATCH_SYSTEMS is set,
+    one per summary length for all the systems together, with the key summLen.
+    '''
+    jobs = []
+    for summLen in summaryLengths:
+        # the reference summary files to use for this length (regex of filenames for pyrouge):
+        refSummFilenamePattern = getModelSummariesPattern(comparisonType, summLen, summaryLengths, ducVersion)
+        
+        # a peer per system, with its multi-doc summaries for the current length, and the system name as the peer ID:
+        peers = [(sysName, '(.*).M.{}.(.*).{}.html'.format(summLen, sysName), refSummFilenamePattern) \
+            for sysName in systemNames]
+        
+        # add the ROUGE flags to truncate the summaries and possibly remove stop words:
+        jobs.append(RougeBatchJob(summLen, folderSystems, folderModels,
+            peers, getRougeAdditionalParams(summLen, stopWordsRemoval)))
+    return jobs
     
-    print('Current ROUGEing done!')
-    return allData
+def getRougeAdditionalParams(summLen, stopWordsRemoval):
+    '''
+    The ROUGE flags to add to the default ones for a summary length: truncating the summaries
+    according to their defined length, possibly removing stop words, and printing the scores of every task if kept.
+    '''
+    rougeAdditionalParams = ['-l', int(summLen)]
+    if stopWordsRemoval == REMOVE_STOP_WORDS:
+        rougeAdditionalParams.append('-s')
+    if TASK_SCORES:
+        rougeAdditionalParams.append('-d')
+    return rougeAdditionalParams
     
 def getModelSummariesPattern(comparisonType, summLen, summaryLengthsOrdered, ducVersion):
     '''
@@ -215,36 +353,58 @@ def getModelSummariesPattern(comparisonType, summLen, summaryLengthsOrdered, duc
     '''
     # Note: The "#ID#" is the pyrouge way of saying to match the task name of the system to the same task for the model.
     
+    modelSummLen = getModelSummariesLength(comparisonType, summLen, summaryLengthsOrdered, ducVersion)
+    if modelSummLen is None:
+        refSummFilenamePattern = '#ID#.M.(.*).(.*).(.*).html' # all summaries
+    else:
+        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(modelSummLen)
+            
+    return refSummFilenamePattern
+    
+def getModelSummariesLength(comparisonType, summLen, summaryLengthsOrdered, ducVersion):
+    '''
+    The summary length of the model summaries to compare the system summaries of length summLen to,
+    according to the comparison type. None means model summaries of all lengths.
+    '''
     if comparisonType == COMPARE_SAME_LEN:
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summLen)
+        summLenToUse = summLen
     elif comparisonType == COMPARE_VARYING_LEN:
-        refSummFilenamePattern = '#ID#.M.(.*).(.*).(.*).html' # all summaries
+        summLenToUse = None # all summaries
     elif comparisonType == COMPARE_TO_SMALLEST:
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summaryLengthsOrdered[0])
+        summLenToUse = summaryLengthsOrdered[0]
     elif comparisonType == COMPARE_TO_SECONDSMALLEST:
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summaryLengthsOrdered[1])
+        summLenToUse = summaryLengthsOrdered[1]
     elif comparisonType == COMPARE_TO_SECONDLARGEST:
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summaryLengthsOrdered[-2])
+        summLenToUse = summaryLengthsOrdered[-2]
     elif comparisonType == COMPARE_TO_LARGEST:
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summaryLengthsOrdered[-1])
+        summLenToUse = summaryLengthsOrdered[-1]
     elif comparisonType == COMPARE_TO_ONE_SMALLER:
         # use the summary length that is one shorter than the system summary's:
         summLenIndexToUse = summaryLengthsOrdered.index(summLen) - 1
         if summLenIndexToUse >= 0:
             summLenToUse = summaryLengthsOrdered[summLenIndexToUse]
         else:
-            summLenToUse = '999' # will do nothing since no filename with the regex will be found
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summLenToUse)
+            summLenToUse = '999' # will do nothing since no model summary of this length will be found
     elif comparisonType == COMPARE_TO_ONE_LARGER:
         # use the summary length that is one longer than the system summary's:
         summLenIndexToUse = summaryLengthsOrdered.index(summLen) + 1
         if summLenIndexToUse < len(summaryLengthsOrdered):
             summLenToUse = summaryLengthsOrdered[summLenIndexToUse]
         else:
-            summLenToUse = '999' # will do nothing since no filename with the regex will be found
-        refSummFilenamePattern = '#ID#.M.{}.(.*).(.*).html'.format(summLenToUse)
+            summLenToUse = '999' # will do nothing since no model summary of this length will be found
             
-    return refSummFilenamePattern
+    return summLenToUse
+    
+def getOutputPath(outputPath, stopWordsRemoval):
+    '''
+    The output CSV path of an input for the stop words mode stopWordsRemoval: "{stopWords}" in the outputPath
+    replaced by the folder name of the mode (cf. STOP_WORDS_FOLDERS). The folder is created if needed.
+    '''
+    outputPath = outputPath.replace('{stopWords}', STOP_WORDS_FOLDERS[stopWordsRemoval])
+    outputFolder = os.path.dirname(outputPath)
+    if outputFolder and not os.path.isdir(outputFolder):
+        os.makedirs(outputFolder)
+    return outputPath
     
 def outputToCsv(analyzedData, outputFilepath, systemNames, summaryLengths):
     '''
@@ -261,27 +421,20 @@ def outputToCsv(analyzedData, outputFilepath, systemNames, summaryLengths):
         outF.write(firstLine+'\n\n')
         
         # the csv is divided into section for each system:
+        lengthIdxs = [(analyzedData.summaryLengths.index(summLen),) for summLen in summaryLengths]
         for sysName in systemNames:
             outF.write(sysName+'\n')
-            if sysName in analyzedData:
+            if sysName in analyzedData.systemNames:
+                sysIdx = analyzedData.systemNames.index(sysName)
                 # each line for the system is a specific rouge type:
                 for rougeType in ROUGE_TYPES:
                     # the first column of the line is the rouge type:
                     lineParts = [rougeType]
                     
                     # the rest of the line is for the columns <sys_len>.<r/p/f>, if there's no value, then '-':
-                    lineParts.extend([str(analyzedData[sysName][summLen][rougeType]['recall']) \
-                        if analyzedData[sysName][summLen][rougeType]['recall'] != -1  \
-                        else '-' \
-                        for summLen in summaryLengths ])
-                    lineParts.extend([str(analyzedData[sysName][summLen][rougeType]['precision']) \
-                        if analyzedData[sysName][summLen][rougeType]['precision'] != -1  \
-                        else '-' \
-                        for summLen in summaryLengths ])
-                    lineParts.extend([str(analyzedData[sysName][summLen][rougeType]['f1']) \
-                        if analyzedData[sysName][summLen][rougeType]['f1'] != -1  \
-                        else '-' \
-                        for summLen in summaryLengths ])
+                    typeIdx = analyzedData.rougeTypes.index(rougeType)
+                    for measureIdx in range(len(SCORE_MEASURES)):
+                        lineParts.extend(getScoreStrings(analyzedData, sysIdx, lengthIdxs, typeIdx, measureIdx))
                             
                     line = ','.join(lineParts)
                     outF.write(line+'\n')
@@ -290,17 +443,61 @@ def outputToCsv(analyzedData, outputFilepath, systemNames, summaryLengths):
 
 def main():
     startTime = time.time()
-    # Go over each input:
-    for compareType, refFolder, sysFolder, outputPath, ducVersion, stopWordsRemoval in INPUTS:
-        print('---- NEXT INPUT')
-        # get the different options:
-        taskNames, systemNames, summaryLengths = getComparisonOptions(sysFolder, refFolder)
-        # get ROUGE scores:
-        allData = runRougeCombinations(compareType, sysFolder, refFolder, systemNames, summaryLengths, ducVersion, stopWordsRemoval)
-        # output scores to CSV:
-        outputToCsv(allData, outputPath, systemNames, summaryLengths)
-        curTime = time.time()
-        print('Current input done! Elapsed time: {} seconds!'.format(curTime - startTime))
+    # the ROUGE score cache, opened here for reporting its statistics:
+    scoreCache = RougeScoreCache(SCORE_CACHE_PATH) if SCORE_CACHE_PATH else None
+    # the index of the summary filenames of the folders:
+    corpusIndex = DucCorpusIndex(CORPUS_INDEX_PATH)
+    # the per-pair counts computed so far (with PAIR_COUNTS), per folders and stop words mode:
+    allPairCounts = {}
+    # text summaries are converted to SEE format once for all the inputs and ROUGE evaluations, and removed at the end:
+    converter = SummaryConverter(SCRATCH_DIR) if INPUT_FORMAT == FORMAT_TEXT else None
+    try:
+        # Go over each input:
+        for compareType, refFolder, sysFolder, outputPath, ducVersion, stopWordsMode in INPUTS:
+            print('---- NEXT INPUT')
+            cacheStats = scoreCache.stats() if scoreCache else None
+            # get the different options:
+            taskNames, systemNames, summaryLengths = getComparisonOptions(sysFolder, refFolder, corpusIndex)
+            # the folders of the summaries in SEE format:
+            sysFolderSee = converter.getConvertedFolder(sysFolder) if converter else sysFolder
+            refFolderSee = converter.getConvertedFolder(refFolder) if converter else refFolder
+            # tokenize the summaries once for all the native ROUGE evaluations:
+            if TOKEN_CACHE_PATH and INPUT_FORMAT == FORMAT_SEE and (ROUGE_BACKEND in (BACKEND_NATIVE, BACKEND_WORKER) or PAIR_COUNTS):
+                tokenizeSummaries([sysFolder, refFolder], TOKEN_CACHE_PATH, corpusIndex)
+            # the preprocessing variants of the input, all evaluated in the same pass:
+            stopWordsModes = stopWordsMode if isinstance(stopWordsMode, (list, tuple)) else [stopWordsMode]
+            # get the per-pair counts, if used and not computed for a previous input:
+            pairCounts = None
+            if PAIR_COUNTS:
+                newModes = [stopWordsRemoval for stopWordsRemoval in stopWordsModes if (sysFolder, refFolder, stopWordsRemoval) not in allPairCounts]
+                if newModes:
+                    print('Counting the matches of all system and model summary pairs...')
+                    variantsParamsPerLength = [{summLen:getRougeAdditionalParams(summLen, stopWordsRemoval) for summLen in summaryLengths} \
+                        for stopWordsRemoval in newModes]
+                    newPairCounts = getPairCountsVariants(sysFolderSee, refFolderSee, systemNames, summaryLengths,
+                        variantsParamsPerLength, FORMAT_SEE, NUM_WORKERS, corpusIndex, TOKEN_CACHE_PATH)
+                    for stopWordsRemoval, variantPairCounts in zip(newModes, newPairCounts):
+                        allPairCounts[(sysFolder, refFolder, stopWordsRemoval)] = variantPairCounts
+                pairCounts = [allPairCounts[(sysFolder, refFolder, stopWordsRemoval)] for stopWordsRemoval in stopWordsModes]
+            # the scores of every task, if kept:
+            taskScores = [newTaskScores(systemNames, taskNames, summaryLengths, list(ROUGE_TYPES.values())) for _ in stopWordsModes] if TASK_SCORES else None
+            # get ROUGE scores:
+            allData = runRougeCombinations(compareType, sysFolderSee, refFolderSee, systemNames, summaryLengths, ducVersion, stopWordsModes, pairCounts, taskScores)
+            # output the scores of each variant to CSV:
+            for variantIdx, stopWordsRemoval in enumerate(stopWordsModes):
+                variantOutputPath = getOutputPath(outputPath, stopWordsRemoval)
+                outputToCsv(allData[variantIdx], variantOutputPath, systemNames, summaryLengths)
+                if SCORES_NPZ:
+                    saveScoreStore(allData[variantIdx], os.path.splitext(variantOutputPath)[0] + '.npz')
+                if taskScores is not None:
+                    saveTaskScores(taskScores[variantIdx], os.path.splitext(variantOutputPath)[0] + '.tasks.npz')
+            if scoreCache:
+                print(scoreCache.report(cacheStats))
+            curTime = time.time()
+            print('Current input done! Elapsed time: {} seconds!'.format(curTime - startTime))
+    finally:
+        if converter:
+            converter.cleanup()
     print('---- DONE WITH ALL INPUTS')
     
 if __name__ == '__main__':
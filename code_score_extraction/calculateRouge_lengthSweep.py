@@ -0,0 +1,156 @@
+'''
+This script is for calculating the ROUGE-N scores of system summaries against reference summaries with the summaries
+truncated to a sweep of word cutoffs (e.g. every 10 words from 10 to 400), instead of to the nominal length of the
+system summaries only (the -l flag of calculateRouge.py), giving a curve of the scores over the cutoff per system.
+The n-grams of every pair of system and model summaries are counted once, in the order of their positions, and the
+counts of every cutoff are read in passing (cf. rougePairCounts.getPairCountsByCutoff), so the whole sweep costs about
+one native ROUGE pass.
+The script can run over several configurations as specified in the INPUTS list, with the comparison types of
+calculateRouge.py.
+
+Change the INPUTS, CUTOFFS and INPUT_FORMAT variables for your inputs.
+
+To run: python calculateRouge_lengthSweep.py
+Outputs: a CSV file with the ROUGE scores of every system and summary length at every cutoff
+'''
+
+from pyrouge import Rouge155
+from rougeJobs import tokenizeSummaries, logger
+from rougePairCounts import getPairCountsByCutoff, getPairCountsScores
+from ducCorpusIndex import DucCorpusIndex
+from summaryConversion import SummaryConverter
+from calculateRouge import COMPARE_SAME_LEN, COMPARE_VARYING_LEN, COMPARE_TO_LARGEST, COMPARE_TO_SMALLEST, \
+    COMPARE_TO_SECONDSMALLEST, COMPARE_TO_SECONDLARGEST, COMPARE_TO_ONE_SMALLER, COMPARE_TO_ONE_LARGER, \
+    REMOVE_STOP_WORDS, LEAVE_STOP_WORDS, ROUGE_TYPES, FORMAT_SEE, FORMAT_TEXT, \
+    getComparisonOptions, getModelSummariesLength
+import time
+
+
+# The word cutoffs to truncate the summaries to (as with the ROUGE -l flag):
+CUTOFFS = list(range(10, 401, 10))
+
+# The rouge types of the sweep (keys of ROUGE_TYPES), the ROUGE-N ones:
+SWEEP_ROUGE_TYPES = ['R1', 'R2', 'R3', 'R4']
+
+# The input format to use - CHANGE THIS TO "FORMAT_TEXT" IF THE INPUT SUMMARIES ARE NOT IN SEE FORMAT:
+INPUT_FORMAT = FORMAT_SEE
+
+# The number of processes to count the matches in parallel. None uses all the CPUs, 1 counts them one by one.
+NUM_WORKERS = None
+
+# A file in which to keep the index of the summary filenames of the folders between runs (e.g. 'corpus_index.json'),
+# rebuilt for a folder when it changes. None to index the folders on every run.
+CORPUS_INDEX_PATH = None
+
+# A file in which to keep the tokenized summaries between runs (e.g. 'rouge_tokens.bin'), so that the native ROUGE
+# reads and tokenizes every SEE summary once. None to not keep them.
+TOKEN_CACHE_PATH = None
+
+# THE INPUTS TO RUN IN A LOOP - CHANGE YOUR INPUTS HERE:
+# Each input: (comparisonType, modelSummariesFolderPath, systemSummariesFolderPath, outputCSVfilepath, DUC year [2001|2002], stopWordsMode)
+INPUTS = [
+    # EXAMPLES:
+    (COMPARE_SAME_LEN, 'data/DUC2001/see.models', 'data/DUC2001/submissions.for.SEE', '2001_sameLen_noStops_lengthSweep.csv', 2001, REMOVE_STOP_WORDS),
+    (COMPARE_VARYING_LEN, 'data/DUC2002/SEE.model_edited.abstracts.in.edus', 'data/DUC2002/SEE.peer_abstracts.in.sentences', '2002_diffLens_lengthSweep.csv', 2002, LEAVE_STOP_WORDS)
+    ]
+
+def getSweepScores(comparisonType, systemNames, summaryLengths, ducVersion, pairCountsByCutoff):
+    '''
+    Assembles the ROUGE scores of every system and summary length at every cutoff from the pairCountsByCutoff (an
+    OrderedDict of cutoff -> rougePairCounts.PairCounts), against the model summaries of the comparison type.
+    Returns a dictionary of the format:
+    |_  system_name
+        |_  summary_length
+            |_  cutoff
+                |_  Rouge155 output dictionary (None if the summaries could not be scored)
+    '''
+    print('Calculating the ROUGE scores of all the cutoffs...')
+    rougeCalculator = Rouge155(backend=Rouge155.BACKEND_NATIVE)
+    data = {}
+    for sysName in systemNames:
+        data[sysName] = {}
+        for summLen in summaryLengths:
+            modelSummLen = getModelSummariesLength(comparisonType, summLen, summaryLengths, ducVersion)
+            data[sysName][summLen] = {}
+            for cutoff, pairCounts in pairCountsByCutoff.items():
+                try:
+                    data[sysName][summLen][cutoff] = getPairCountsScores(rougeCalculator, pairCounts, sysName, summLen,
+                        modelSummLen)
+                except Exception:
+                    logger.exception("The pair-count scores of system {} at length {} and cutoff {} failed".format(
+                        sysName, summLen, cutoff))
+                    data[sysName][summLen][cutoff] = None
+        print('\t--- Done system: {} ---'.format(sysName))
+    return data
+
+def outputToCsv(sweepData, outputFilepath, systemNames, summaryLengths, cutoffs):
+    '''
+    Outputs the sweepData to a CSV file with the format:
+    ROUGE_type,<cutoff1>_r,<cutoffK>_r,<cutoff1>_p,<cutoffK>_p,<cutoff1>_f,<cutoffK>_f
+    where each line is a rougeType, and the systems and their summary lengths are divided into sections.
+    '''
+    with open(outputFilepath, 'w') as outF:
+        # header line
+        # example: ROUGE_type,10_r,20_r,30_r,10_p,20_p,30_p,10_f,20_f,30_f
+        firstLineParts = ['ROUGE_type']
+        firstLineParts.extend(['{}_{}'.format(cutoff, measure_type) for measure_type in ['r', 'p', 'f'] for cutoff in cutoffs])
+        outF.write(','.join(firstLineParts)+'\n\n')
+
+        # the csv is divided into section for each system and summary length:
+        for sysName in systemNames:
+            for summLen in summaryLengths:
+                outF.write('{},{}\n'.format(sysName, summLen))
+                cutoffScores = sweepData.get(sysName, {}).get(summLen, {})
+                for rougeType in SWEEP_ROUGE_TYPES:
+                    # the first column of the line is the rouge type, the rest are the columns <cutoff>.<r/p/f>:
+                    lineParts = [rougeType]
+                    for measure in ['recall', 'precision', 'f_score']:
+                        key = '{}_{}'.format(ROUGE_TYPES[rougeType], measure)
+                        lineParts.extend([str(cutoffScores[cutoff][key]) \
+                            if cutoffScores.get(cutoff) is not None and key in cutoffScores[cutoff] \
+                            else '-' \
+                            for cutoff in cutoffs])
+                    outF.write(','.join(lineParts)+'\n')
+                outF.write('\n')
+            outF.write('\n')
+
+
+def main():
+    startTime = time.time()
+    # the index of the summary filenames of the folders:
+    corpusIndex = DucCorpusIndex(CORPUS_INDEX_PATH)
+    # the per-cutoff counts computed so far, per folders and stop words mode:
+    allPairCounts = {}
+    # text summaries are converted to SEE format once for all the inputs, and removed at the end:
+    converter = SummaryConverter() if INPUT_FORMAT == FORMAT_TEXT else None
+    try:
+        # Go over each input:
+        for compareType, refFolder, sysFolder, outputPath, ducVersion, stopWordsRemoval in INPUTS:
+            print('---- NEXT INPUT')
+            # get the different options:
+            taskNames, systemNames, summaryLengths = getComparisonOptions(sysFolder, refFolder, corpusIndex)
+            # the folders of the summaries in SEE format:
+            sysFolderSee = converter.getConvertedFolder(sysFolder) if converter else sysFolder
+            refFolderSee = converter.getConvertedFolder(refFolder) if converter else refFolder
+            # get the counts of all the cutoffs, if not computed for a previous input:
+            pairCountsKey = (sysFolder, refFolder, stopWordsRemoval)
+            if pairCountsKey not in allPairCounts:
+                if TOKEN_CACHE_PATH and INPUT_FORMAT == FORMAT_SEE:
+                    tokenizeSummaries([sysFolder, refFolder], TOKEN_CACHE_PATH, corpusIndex)
+                print('Counting the matches of all system and model summary pairs at all the cutoffs...')
+                rougeAdditionalParams = ['-s'] if stopWordsRemoval == REMOVE_STOP_WORDS else []
+                allPairCounts[pairCountsKey] = getPairCountsByCutoff(sysFolderSee, refFolderSee, systemNames,
+                    summaryLengths, CUTOFFS, rougeAdditionalParams, FORMAT_SEE, NUM_WORKERS, corpusIndex, TOKEN_CACHE_PATH)
+            # get the ROUGE scores of every cutoff:
+            sweepData = getSweepScores(compareType, systemNames, summaryLengths, ducVersion, allPairCounts[pairCountsKey])
+            # output scores to CSV:
+            outputToCsv(sweepData, outputPath, systemNames, summaryLengths, CUTOFFS)
+            curTime = time.time()
+            print('Current input done! Elapsed time: {} seconds!'.format(curTime - startTime))
+    finally:
+        if converter:
+            converter.cleanup()
+    print('---- DONE WITH ALL INPUTS')
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@
 This script is for calculating the ROUGE scores between *model* summaries, in order to compare
 authors and different length model summaries.
 The script can run over several configurations as specified in the INPUTS list.
+With PAIR_MATRIX, the matches between every two model summaries of a task are counted once, in a matrix per task,
+and the scores of all the comparison types are assembled from these matrices.
 
 Change the INPUTS and INPUT_FORMAT variables for your inputs.
 
@@ -9,7 +11,13 @@ To run: python calculateRouge_modelComparisons.py
 '''
 
 import os
+import numpy as np
 from pyrouge import Rouge155
+from pyrouge.rouge_cache import RougeScoreCache
+from rougeJobs import RougeJob, RougeMatrixJob, runRougeJobs, tokenizeSummaries, logger
+from rougeScores import newScoreStore, storeScores, getScoreStrings, getAverageScores, MEASURES as SCORE_MEASURES
+from ducCorpusIndex import DucCorpusIndex
+from summaryConversion import SummaryConverter
 import time
 
 COMPARE_SAME_AUTHOR = 0 # comparing a model summary to another by the *same* author
@@ -39,6 +47,55 @@ FORMAT_TEXT = 'text'
 
 # The input format to use - CHANGE THIS TO "FORMAT_TEXT" IF THE INPUT SUMMARIES ARE NOT IN SEE FORMAT:
 INPUT_FORMAT = FORMAT_SEE
+
+# The ROUGE implementation to use. Perl runs the original ROUGE-1.5.5.pl script for every evaluation,
+# native computes the same scores in-process (much faster, no Perl needed, but still uses the ROUGE data folder).
+# The native and worker backends are EXPERIMENTAL: their outputs are not yet checked against reference outputs of
+# ROUGE-1.5.5.pl (cf. tests/test_rouge_native.py), so the Perl script stays the default.
+BACKEND_PERL = Rouge155.BACKEND_PERL
+BACKEND_NATIVE = Rouge155.BACKEND_NATIVE
+# worker computes them as native, in a long-lived worker process per ROUGE process (cf. rouge_worker.py), which keeps the
+# stop words, stemming exceptions and tokenized summaries loaded for all its evaluations.
+BACKEND_WORKER = Rouge155.BACKEND_WORKER
+# The ROUGE backend to use - CHANGE THIS TO "BACKEND_NATIVE" TO AVOID RUNNING PERL:
+ROUGE_BACKEND = BACKEND_PERL
+
+# Whether to count the matches between every two model summaries of a task once, in a matrix of all the (author,
+# summary length) summaries of the task, with the native ROUGE (cf. getSummaryMatrices), and to assemble the scores of
+# the comparison types from these matrices, instead of running ROUGE for every author and pair of summary lengths.
+# The matches of a pair of summaries are counted once for both directions, as the recall of A against B is the
+# precision of B against A, except for ROUGE-L, which differs. The matrices are kept for the following INPUTS with the
+# same folder and stop words mode, so all the comparison types cost a single pass. The scores are the same, without
+# confidence intervals (which are not output anyway).
+PAIR_MATRIX = False
+
+# The number of processes to run the ROUGE evaluations in parallel. None uses all the CPUs, 1 runs them one by one.
+NUM_WORKERS = None
+
+# A file in which to keep the ROUGE outputs between runs, so that evaluations already done with the same
+# summaries and ROUGE options are not run again (e.g. 'rouge_scores.sqlite'). None to not use a cache.
+SCORE_CACHE_PATH = None
+
+# A file in which to keep the index of the summary filenames of the folders between runs (e.g. 'corpus_index.json'),
+# rebuilt for a folder when it changes. None to index the folders on every run.
+CORPUS_INDEX_PATH = None
+
+# A file in which to keep the tokenized summaries between runs (e.g. 'rouge_tokens.bin'), so that the native ROUGE
+# reads and tokenizes every SEE summary once. Only used with BACKEND_NATIVE or BACKEND_WORKER. None to not keep them.
+TOKEN_CACHE_PATH = None
+
+# A folder in which to keep the temporary files of the ROUGE evaluations (configuration files, converted summaries),
+# e.g. Rouge155.TMPFS_DIR ('/dev/shm') to keep them in memory. None for the default temporary folder. They are removed
+# when the evaluations of an input are done.
+SCRATCH_DIR = None
+
+# The number of seconds after which a run of the Perl ROUGE is stopped, failing its evaluation, so that a hung Perl
+# process does not stall the run. None for no limit. Only used with BACKEND_PERL.
+ROUGE_TIMEOUT = None
+
+# Whether ROUGE computes the bootstrap confidence intervals of the scores. The CSV outputs only have the average
+# scores, so they are skipped by default (much faster with the Perl script, which otherwise draws 1000 resamples).
+CONFIDENCE_INTERVALS = False
     
 # THE INPUTS TO RUN IN A LOOP - CHANGE YOUR INPUTS HERE:
 # Each input: (modelSummariesFolderPath, outputCSVFolder, comparisonType, stopWordsMode)
@@ -48,9 +105,10 @@ INPUTS = [
     ('data/DUC2002/SEE.model_edited.abstracts.in.edus', '2002_modelRougeComparisonOtherAuthors_noStops', COMPARE_OTHER_AUTHORS, REMOVE_STOP_WORDS)
     ]
     
-def getComparisonOptions(folderModels):
+def getComparisonOptions(folderModels, corpusIndex):
     '''
-    Gets all the task names, summary lengths and system names from the system files.
+    Gets all the task names, summary lengths and system names from the system files, as parsed in the
+    corpusIndex (a DucCorpusIndex).
     Assuming format <taskName>.<M for Multi/P for Perdoc>.<summLen>.<AssessorId>.<systemId>.txt for multi-text
         example: D061.M.010.J.16.txt
     or <taskName>.<M for Multi/P for Perdoc>.<summLen>.<AssessorId>.<systemId>.<singleFileName>.txt for single-text
@@ -58,81 +116,46 @@ def getComparisonOptions(folderModels):
         
     Returns lists: taskNames, summaryLengths, systemNames
     '''
-    taskNames = {}
-    systemNames = {}
-    summaryLengths = {}
-    
-    for filename in os.listdir(folderModels):
-        nameParts = filename.split('.')
-        if len(nameParts) < 5 or nameParts[1] != 'M':
-            continue
-
-        # Format example: D061.M.010.J.16.txt
-        
-        taskName = nameParts[0]
-        summaryLength = nameParts[2]
-        systemName = nameParts[4]
-        
-        taskNames[taskName] = 1
-        summaryLengths[summaryLength] = 1
-        systemNames[systemName] = 1
-        
-            
-    taskNames = sorted(taskNames.keys())
-    systemNames = sorted(systemNames.keys())
-    summaryLengths = sorted(summaryLengths.keys())
+    # Format example: D061.M.010.J.16.txt
+    taskNames, systemNames, summaryLengths = corpusIndex.getFolderIndex(folderModels).getOptions('M')
     
     return taskNames, systemNames, summaryLengths
     
 def initDataStructure(systemNames, summaryLengths):
     '''
-    To initialize a data strucure for all the ROUGE values.
-    In the format of dictionaries:
-    |_  system_name
-        |_  summary_length_of_checked
-            |_  summary_length_of_model
-                |_  rouge_type (from ROUGE_TYPES keys)
-                    |_  <precision|recall|f1> -> -1
+    To initialize a data strucure for all the ROUGE values: a rougeScores.ScoreStore of the scores
+    [system_name, summary_length_of_checked, summary_length_of_model, rouge_type (from ROUGE_TYPES keys),
+    <recall | precision | f1>], without any values.
     
-    Returns a newly created dictionary.
+    Returns a newly created ScoreStore.
     '''
-    data = {}
-    for sysName in systemNames:
-        data[sysName] = {}
-        for summLen in summaryLengths:
-            data[sysName][summLen] = {}
-            for summLen2 in summaryLengths:
-                data[sysName][summLen][summLen2] = {}
-                for rougeType in ROUGE_TYPES:
-                    data[sysName][summLen][summLen2][rougeType] = {'precision':-1, 'recall':-1, 'f1':-1}
-    return data
+    return newScoreStore(systemNames, summaryLengths, ROUGE_TYPES, numLengthAxes=2)
     
 def storeData(dataStruct, sysName, summLenChecked, summLenModel, newData):
     '''
     Stores the Rouge155 module dictionary information into the dataStruct provided at
     the sysName, summLen entry.
     '''
-    for rougeType, rougeDataStr in ROUGE_TYPES.items():
-        dataStruct[sysName][summLenChecked][summLenModel][rougeType]['recall'] = newData[rougeDataStr+'_recall']
-        dataStruct[sysName][summLenChecked][summLenModel][rougeType]['precision'] = newData[rougeDataStr+'_precision']
-        dataStruct[sysName][summLenChecked][summLenModel][rougeType]['f1'] = newData[rougeDataStr+'_f_score']
+    storeScores(dataStruct, sysName, (summLenChecked, summLenModel), newData, ROUGE_TYPES)
 
 def runRougeCombinations(folderModels, systemNames, summaryLengths, comparisonType, stopWordsRemoval):
     '''
     Get the ROUGE values for all the different length combinations.
-    Returns a dictionary of the format specified in the initDataStructure method.
+    The summaries of folderModels are in SEE format (text summaries are converted once in main).
+    The ROUGE evaluations are run in NUM_WORKERS parallel processes.
+    Returns a data structure as specified in the initDataStructure method.
     '''
     print('Calculating all ROUGE scores...')
     
-    # initialize the ROUGE object:
-    rougeCalculator = Rouge155()
     # initialize the data structure to hold all the ROUGE results:
     allData = initDataStructure(systemNames, summaryLengths)
     
+    # possibly add the ROUGE flag to remove stop words:
+    rougeAdditionalParams = ['-s'] if stopWordsRemoval == REMOVE_STOP_WORDS else None
+    
+    jobs = []
     # for each system get the ROUGE results separately:
     for sysName in systemNames:
-        print('\t--- On system: {} ---'.format(sysName))
-        
         # for each summary length of the model summary being checked:
         for summLenChecked in summaryLengths:
             
@@ -145,33 +168,122 @@ def runRougeCombinations(folderModels, systemNames, summaryLengths, comparisonTy
                 # for the the current length, for the current system:
                 sysSummFilenamePattern = '(.*).M.{}.(.*).{}.html'.format(summLenChecked, sysName)
                 
-                # set the properties for the ROUGE object:
-                rougeCalculator.system_dir = folderModels
-                rougeCalculator.model_dir = folderModels
-                rougeCalculator.system_filename_pattern = sysSummFilenamePattern
-                rougeCalculator.model_filename_pattern = refSummFilenamePattern
-                
-                if stopWordsRemoval == REMOVE_STOP_WORDS:
-                    rougeCalculator.add_rouge_args_to_default(['-s'])
-                
-                try:
-                    # When using plain text format, run convert_and_evaluate.
-                    # For SEE format, use just evaluate(), since convert is for text->SEE conversion.
-                    if INPUT_FORMAT == FORMAT_SEE:
-                        output = rougeCalculator.evaluate()
-                    elif INPUT_FORMAT == FORMAT_TEXT:
-                        output = rougeCalculator.convert_and_evaluate()
-                    output = rougeCalculator.evaluate()
-                    output_dict = rougeCalculator.output_to_dict(output)
-                    # keep the data in the allData data structure:
-                    storeData(allData, sysName, summLenChecked, summLenModel, output_dict)
-                except:
-                    pass
+                jobs.append(RougeJob((sysName, summLenChecked, summLenModel), folderModels, folderModels,
+                    sysSummFilenamePattern, refSummFilenamePattern, rougeAdditionalParams))
+    
+    for (sysName, summLenChecked, summLenModel), output_dict in runRougeJobs(jobs, ROUGE_BACKEND, FORMAT_SEE, NUM_WORKERS, SCORE_CACHE_PATH, CORPUS_INDEX_PATH, TOKEN_CACHE_PATH, CONFIDENCE_INTERVALS, scratchDir=SCRATCH_DIR, jobTimeout=ROUGE_TIMEOUT):
+        if summLenChecked == summaryLengths[-1] and summLenModel == summaryLengths[-1]:
+            print('\t--- Done system: {} ---'.format(sysName))
+        if output_dict is None:
+            continue
+        try:
+            # keep the data in the allData data structure:
+            storeData(allData, sysName, summLenChecked, summLenModel, output_dict)
+        except:
+            pass
     
     
     print('Current ROUGEing done!')
     return allData
     
+def getSummaryMatrices(folderModels, taskNames, stopWordsRemoval, corpusIndex):
+    '''
+    Counts the matches of every multi-doc summary of each task in folderModels (in SEE format) against every one of
+    them, in a matrix per task, with the native ROUGE. The matrices of the tasks are counted in NUM_WORKERS parallel
+    processes.
+    Returns a dictionary of taskName -> (summaryKeys, rougeTypes, counts), where summaryKeys is the list of the
+    (sysName, summLen) of the summaries of the task, in the order of their filenames, and counts is the array
+    [checked summary, model summary, rougeType, (hit, modelTotal, peerTotal)] (None if the counting failed).
+    '''
+    print('Counting the matches between all the summaries of each task...')
+    rougeAdditionalParams = ['-s'] if stopWordsRemoval == REMOVE_STOP_WORDS else None
+    folderIndex = corpusIndex.getFolderIndex(folderModels)
+    summaryKeys = {}
+    jobs = []
+    for taskName in taskNames:
+        rows = folderIndex.getRows(taskName, 'M')
+        summaryKeys[taskName] = [(folderIndex.systemNames[row], folderIndex.summaryLengths[row]) for row in rows]
+        jobs.append(RougeMatrixJob(taskName, folderModels, [folderIndex.filenames[row] for row in rows],
+            rougeAdditionalParams))
+
+    matrices = {}
+    for taskName, result in runRougeJobs(jobs, BACKEND_NATIVE, FORMAT_SEE, NUM_WORKERS,
+            corpusIndexPath=CORPUS_INDEX_PATH, tokenCachePath=TOKEN_CACHE_PATH, scratchDir=SCRATCH_DIR):
+        rougeTypes, counts = result if result is not None else (None, None)
+        matrices[taskName] = (summaryKeys[taskName], rougeTypes, counts)
+    return matrices
+
+def runMatrixCombinations(matrices, systemNames, summaryLengths, comparisonType):
+    '''
+    Get the ROUGE values for all the different length combinations, as runRougeCombinations does, from the matrices
+    of getSummaryMatrices: the checked summary of every task is scored against its reference summaries of the
+    comparisonType, as ROUGE scores it against them, from their counts in the matrix of the task.
+    Returns a data structure as specified in the initDataStructure method.
+    '''
+    print('Calculating all ROUGE scores from the match matrices...')
+    allData = initDataStructure(systemNames, summaryLengths)
+    rougeCalculator = Rouge155(backend=BACKEND_NATIVE)
+    for sysName in systemNames:
+        for summLenChecked in summaryLengths:
+            for summLenModel in summaryLengths:
+                # the counts of every checked summary (an EVAL of ROUGE) against its reference summaries:
+                evalCounts = []
+                rougeTypes = None
+                for taskName in sorted(matrices):
+                    summaryKeys, taskRougeTypes, counts = matrices[taskName]
+                    checkedIdxs = [idx for idx, key in enumerate(summaryKeys) if key == (sysName, summLenChecked)]
+                    if not checkedIdxs:
+                        continue
+                    if counts is None:
+                        # the task could not be counted, as ROUGE would fail on it:
+                        evalCounts = None
+                        break
+                    modelIdxs = [idx for idx, (refSysName, summLen) in enumerate(summaryKeys) \
+                        if summLen == summLenModel and isRefAuthor(comparisonType, sysName, refSysName)]
+                    evalCounts.extend(counts[checkedIdx, modelIdxs] for checkedIdx in checkedIdxs)
+                    rougeTypes = taskRougeTypes
+                try:
+                    output_dict = getMatrixScores(rougeCalculator, evalCounts, rougeTypes)
+                except Exception:
+                    logger.exception("The matrix scores of system {} at lengths {} against {} failed".format(sysName,
+                        summLenChecked, summLenModel))
+                    output_dict = None
+                if output_dict is not None:
+                    storeData(allData, sysName, summLenChecked, summLenModel, output_dict)
+        print('\t--- Done system: {} ---'.format(sysName))
+
+    print('Current ROUGEing done!')
+    return allData
+
+def getMatrixScores(rougeCalculator, evalCounts, rougeTypes):
+    '''
+    Scores the evalCounts (a list per EVAL of the counts array [model, rougeType, (hit, modelTotal, peerTotal)]) with
+    the Rouge155 rougeCalculator (cf. Rouge155.pair_count_arrays_to_dict).
+    Returns the Rouge155 output dictionary (without confidence intervals), or None if there are no EVALs or some
+    EVAL has no reference summaries, as ROUGE would fail too.
+    '''
+    if not evalCounts:
+        return None
+    numModels = [len(modelCounts) for modelCounts in evalCounts]
+    if not all(numModels):
+        return None
+    counts = np.zeros((len(evalCounts), max(numModels), len(rougeTypes), 3), dtype=np.float64)
+    for evalIdx, modelCounts in enumerate(evalCounts):
+        counts[evalIdx, :len(modelCounts)] = modelCounts
+    return rougeCalculator.pair_count_arrays_to_dict(counts, numModels, rougeTypes)
+
+def isRefAuthor(comparisonType, sysName, refSysName):
+    '''
+    Whether the summaries of author refSysName are reference summaries of those of author sysName in the
+    comparisonType (as matched by the patterns of getRefSummariesFilenamePattern).
+    '''
+    if comparisonType == COMPARE_SAME_AUTHOR:
+        return refSysName == sysName
+    elif comparisonType == COMPARE_ALL_AUTHORS:
+        return True
+    elif comparisonType == COMPARE_OTHER_AUTHORS:
+        return refSysName != sysName
+
 def getRefSummariesFilenamePattern(comparisonType, summLenModel, sysName, allSystemNames):
     '''
     Defines the model summary filename regex for pyrouge, according to the different parameters requested.
@@ -195,69 +307,23 @@ def getRefSummariesFilenamePattern(comparisonType, summLenModel, sysName, allSys
 
 def getAverageScoresOverAllModels(analyzedData, systemNames, summaryLengths):
     '''
-    Computes the average ROUGE scores per metric, rougeType, summLenChecked and summLenModel.
-    Returns a dictionary of the format:
-    |_  <precision|recall|f1>
-        |_  rouge_type (from ROUGE_TYPES keys)
-            |_  summary_length_of_checked
-                |_  summary_length_of_model -> <avg_score>
+    Computes the average ROUGE scores per metric, rougeType, summLenChecked and summLenModel, over the systems
+    (authors) of analyzedData that have a score for them.
+    Returns an array [summary_length_of_checked, summary_length_of_model, rouge_type, <recall | precision | f1>] of the
+    averages, indexed as the scores of analyzedData, with NaN where no system has a score.
     '''
-    # prepare a dictionary for the sum of scores per metric,rougeType,summLenChecked,summLenModel:
-    sumScoresAllModels = {
-        metric:{rougeType:{summLenChecked:{summLenModel:0 
-        for summLenModel in summaryLengths} 
-        for summLenChecked in summaryLengths} 
-        for rougeType in ROUGE_TYPES} 
-        for metric in ['recall','precision','f1']}
-    # prepare a dictionary for the count of scores per metric,rougeType,summLenChecked,summLenModel:
-    countScoresAllModels = {
-        metric:{rougeType:{summLenChecked:{summLenModel:0 
-        for summLenModel in summaryLengths} 
-        for summLenChecked in summaryLengths} 
-        for rougeType in ROUGE_TYPES} 
-        for metric in ['recall','precision','f1']}
-    # add up the scores per metric,rougeType,summLenChecked,summLenModel, and count how many were considered:
-    for sysName in systemNames:
-        if sysName in analyzedData:
-            for metricType in ['recall','precision','f1']:
-                for rougeType in ROUGE_TYPES:
-                    for summLenChecked in summaryLengths:
-                        for summLenModel in summaryLengths:
-                            if analyzedData[sysName][summLenChecked][summLenModel][rougeType][metricType] != -1:
-                                sumScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] += analyzedData[sysName][summLenChecked][summLenModel][rougeType][metricType]
-                                countScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] += 1
-                                
-    # prepare a dictionary for the averages of scores per metric,rougeType,summLenChecked,summLenModel:
-    avgScoresAllModels = {
-        metric:{rougeType:{summLenChecked:{summLenModel:0 
-        for summLenModel in summaryLengths} 
-        for summLenChecked in summaryLengths} 
-        for rougeType in ROUGE_TYPES} 
-        for metric in ['recall','precision','f1']}
-    # get the averages per metric,rougeType,summLenChecked,summLenModel:                            
-    for sysName in systemNames:
-        for metricType in ['recall','precision','f1']:
-            for rougeType in ROUGE_TYPES:
-                for summLenChecked in summaryLengths:
-                    summLenCheckedVal = int(summLenChecked)
-                    for summLenModel in summaryLengths:
-                        summLenModelVal = int(summLenModel)
-                        if countScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] > 0:
-                            avgScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] = \
-                                sumScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] / countScoresAllModels[metricType][rougeType][summLenChecked][summLenModel]
-                                
-                            # If the model summ len is larger than that of the checked summ, multiply the average by the relative size
-                            # in order to get a clearer number. For example if we compare a 50 summ to a 400 summ, the max recall can 
-                            # be 1/8 = 0.125, so a value of 0.1 is actually a recall of 80% (80% of the 50 summ is contained in the 400 summ).
-                            # Showing 0.8 is clearer than 0.125.
-                            if summLenModelVal > summLenCheckedVal:
-                                mult = float(summLenModelVal / summLenCheckedVal)
-                                avgScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] *= mult
-                                    
-                        else:
-                            avgScoresAllModels[metricType][rougeType][summLenChecked][summLenModel] = 0
+    averages, counts = getAverageScores(analyzedData)
+    
+    # If the model summ len is larger than that of the checked summ, multiply the average by the relative size
+    # in order to get a clearer number. For example if we compare a 50 summ to a 400 summ, the max recall can 
+    # be 1/8 = 0.125, so a value of 0.1 is actually a recall of 80% (80% of the 50 summ is contained in the 400 summ).
+    # Showing 0.8 is clearer than 0.125.
+    summLenVals = np.array([int(summLen) for summLen in analyzedData.summaryLengths])
+    lengthRatios = summLenVals[np.newaxis, :] / summLenVals[:, np.newaxis]
+    mult = np.where(summLenVals[np.newaxis, :] > summLenVals[:, np.newaxis], lengthRatios, 1.0)
+    averages *= mult[:, :, np.newaxis, np.newaxis]
     
-    return avgScoresAllModels
+    return averages
                             
     
 def outputToCsv(analyzedData, outputFolder, systemNames, summaryLengths, avgScoresAllModels):
@@ -274,53 +340,55 @@ def outputToCsv(analyzedData, outputFolder, systemNames, summaryLengths, avgScor
     if not os.path.exists(outputFolder):
         os.makedirs(outputFolder)
     
+    lenIdxs = [analyzedData.summaryLengths.index(summLen) for summLen in summaryLengths]
     # the csv is divided into section for each system:
     for sysName in systemNames:
-        if sysName in analyzedData:
-            for metricType in ['recall','precision','f1']:
+        if sysName in analyzedData.systemNames:
+            sysIdx = analyzedData.systemNames.index(sysName)
+            for measureIdx, metricType in enumerate(SCORE_MEASURES):
                 outputFilepath = os.path.join(outputFolder, '{}_{}.csv'.format(sysName, metricType))
                 with open(outputFilepath, 'w') as outF:
                     outF.write('Rows:CheckedSize,Columns:referencesSize\n\n')
                     for rougeType in ROUGE_TYPES:
+                        typeIdx = analyzedData.rougeTypes.index(rougeType)
         
                         # each rouge type get a table:
                         firstLine = ','.join([rougeType] + [str(summLenModel) for summLenModel in summaryLengths])
                         outF.write(firstLine+'\n')
             
-                        for summLenChecked in summaryLengths:
+                        for summLenChecked, checkedIdx in zip(summaryLengths, lenIdxs):
                         
                             # the first column of the line is the summary length of the summary being checked:
                             lineParts = [summLenChecked]
                             
                             # the rest of the line is for the columns <sys_len>.<r/p/f>, if there's no value, then '-':
-                            lineParts.extend([str(analyzedData[sysName][summLenChecked][summLenModel][rougeType][metricType]) \
-                                if analyzedData[sysName][summLenChecked][summLenModel][rougeType][metricType] != -1  \
-                                else '-' \
-                                for summLenModel in summaryLengths ])
+                            lineParts.extend(getScoreStrings(analyzedData, sysIdx, [(checkedIdx, modelIdx) for modelIdx in lenIdxs], \
+                                typeIdx, measureIdx))
                                     
                             line = ','.join(lineParts)
                             outF.write(line+'\n')
                         outF.write('\n')
                         
     # also write the overall average to three files (recall, precision, f1):
-    for metricType in ['recall','precision','f1']:
+    for measureIdx, metricType in enumerate(SCORE_MEASURES):
         outputFilepath = os.path.join(outputFolder, 'TOTAL_{}.csv'.format(metricType))
         with open(outputFilepath, 'w') as outF:
             outF.write('Rows:CheckedSize,Columns:referencesSize,When refLen>checkedLen the values are multiplies by the relative size\n\n')
             for rougeType in ROUGE_TYPES:
+                typeIdx = analyzedData.rougeTypes.index(rougeType)
 
                 # each rouge type get a table:
                 firstLine = ','.join([rougeType] + [str(summLenModel) for summLenModel in summaryLengths])
                 outF.write(firstLine+'\n')
     
-                for summLenChecked in summaryLengths:
+                for summLenChecked, checkedIdx in zip(summaryLengths, lenIdxs):
                 
                     # the first column of the line is the summary length of the summary being checked:
                     lineParts = [summLenChecked]
                     
-                    # the rest of the line is for the columns <sys_len>.<r/p/f>, if there's no value, then '-':
-                    lineParts.extend([str(avgScoresAllModels[metricType][rougeType][summLenChecked][summLenModel]) \
-                        for summLenModel in summaryLengths ])
+                    # the rest of the line is for the columns <sys_len>.<r/p/f>, if there's no average, then 0:
+                    averages = avgScoresAllModels[checkedIdx, lenIdxs, typeIdx, measureIdx]
+                    lineParts.extend([str(float(average)) if not np.isnan(average) else '0' for average in averages])
                             
                     line = ','.join(lineParts)
                     outF.write(line+'\n')
@@ -329,19 +397,46 @@ def outputToCsv(analyzedData, outputFolder, systemNames, summaryLengths, avgScor
 
 def main():
     startTime = time.time()
-    # iterate over the inputs:
-    for modelSummariesFolderPath, outputCSVFolder, comparisonType, stopWordsRemoval in INPUTS:
-        print('---- NEXT INPUT')
-        # get the task names, system names and summary lengths from the model summaries filenames:
-        taskNames, systemNames, summaryLengths = getComparisonOptions(modelSummariesFolderPath)
-        # get the ROUGE scores between the model authors:
-        allData = runRougeCombinations(modelSummariesFolderPath, systemNames, summaryLengths, comparisonType, stopWordsRemoval)
-        # get also the averages over all models:
-        avgScoresAllModels = getAverageScoresOverAllModels(allData, systemNames, summaryLengths)
-        # output to CSV files:
-        outputToCsv(allData, outputCSVFolder, systemNames, summaryLengths, avgScoresAllModels)
-        curTime = time.time()
-        print('Current input done! Elapsed time: {} seconds!'.format(curTime - startTime))
+    # the ROUGE score cache, opened here for reporting its statistics:
+    scoreCache = RougeScoreCache(SCORE_CACHE_PATH) if SCORE_CACHE_PATH else None
+    # the index of the summary filenames of the folders:
+    corpusIndex = DucCorpusIndex(CORPUS_INDEX_PATH)
+    # the match matrices computed so far, per folder and stop words mode:
+    allMatrices = {}
+    # text summaries are converted to SEE format once for all the inputs and ROUGE evaluations, and removed at the end:
+    converter = SummaryConverter(SCRATCH_DIR) if INPUT_FORMAT == FORMAT_TEXT else None
+    try:
+        # iterate over the inputs:
+        for modelSummariesFolderPath, outputCSVFolder, comparisonType, stopWordsRemoval in INPUTS:
+            print('---- NEXT INPUT')
+            cacheStats = scoreCache.stats() if scoreCache else None
+            # get the task names, system names and summary lengths from the model summaries filenames:
+            taskNames, systemNames, summaryLengths = getComparisonOptions(modelSummariesFolderPath, corpusIndex)
+            # the folder of the model summaries in SEE format:
+            modelSummariesFolderSee = converter.getConvertedFolder(modelSummariesFolderPath) if converter else modelSummariesFolderPath
+            # tokenize the summaries once for all the native ROUGE evaluations:
+            if TOKEN_CACHE_PATH and INPUT_FORMAT == FORMAT_SEE and (ROUGE_BACKEND in (BACKEND_NATIVE, BACKEND_WORKER) or PAIR_MATRIX):
+                tokenizeSummaries([modelSummariesFolderPath], TOKEN_CACHE_PATH, corpusIndex)
+            # get the ROUGE scores between the model authors:
+            if PAIR_MATRIX:
+                # from the match matrices of the tasks, if not computed for a previous input:
+                matricesKey = (modelSummariesFolderPath, stopWordsRemoval)
+                if matricesKey not in allMatrices:
+                    allMatrices[matricesKey] = getSummaryMatrices(modelSummariesFolderSee, taskNames, stopWordsRemoval, corpusIndex)
+                allData = runMatrixCombinations(allMatrices[matricesKey], systemNames, summaryLengths, comparisonType)
+            else:
+                allData = runRougeCombinations(modelSummariesFolderSee, systemNames, summaryLengths, comparisonType, stopWordsRemoval)
+            # get also the averages over all models:
+            avgScoresAllModels = getAverageScoresOverAllModels(allData, systemNames, summaryLengths)
+            # output to CSV files:
+            outputToCsv(allData, outputCSVFolder, systemNames, summaryLengths, avgScoresAllModels)
+            if scoreCache:
+                print(scoreCache.report(cacheStats))
+            curTime = time.time()
+            print('Current input done! Elapsed time: {} seconds!'.format(curTime - startTime))
+    finally:
+        if converter:
+            converter.cleanup()
     print('---- DONE WITH ALL INPUTS')
     
 if __name__ == '__main__':
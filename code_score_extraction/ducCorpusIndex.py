@@ -0,0 +1,187 @@
+'''
+This module indexes the summary filenames of the DUC folders, so that they are listed and parsed once instead
+of on every query. The filenames are assumed to be in the format
+<taskName>.<M for Multi/P for Perdoc>.<summLen>.<AssessorId>.<systemId>[.<singleFileName>].<txt/html>
+    examples: D061.M.010.J.16.html, D061.P.100.J.16.AP880916-0060.html
+
+The index of a folder can be kept in a JSON file between runs, and is rebuilt when the modification time of
+the folder changes (i.e. when files are added, removed or renamed).
+
+A DucCorpusIndex can be set as the model_index of a Rouge155 object, which then finds the model summaries
+of each system summary in the index instead of listing and scanning the model folder:
+    rougeCalculator.model_index = DucCorpusIndex()
+'''
+
+import os
+import re
+import json
+import tempfile
+
+
+# os.replace is missing in Python 2, where os.rename replaces the file as well (on POSIX systems):
+_replaceFile = getattr(os, 'replace', os.rename)
+
+
+class DucFolderIndex(object):
+    '''
+    The summary filenames of a folder parsed into columns: filenames, taskNames, docTypes ('M' or 'P'),
+    summaryLengths, assessorIds and systemNames, where row i of every column is for filenames[i].
+    Filenames not in the DUC format have None in all columns except their task name, which is the part
+    before the first dot.
+    '''
+    COLUMNS = ['filenames', 'taskNames', 'docTypes', 'summaryLengths', 'assessorIds', 'systemNames']
+
+    def __init__(self, folder, mtime, columns):
+        self.folder = folder
+        self.mtime = mtime
+        for columnName in self.COLUMNS:
+            setattr(self, columnName, columns[columnName])
+
+        # the rows per task name, and per (taskName, docType) -> summLen -> rows:
+        self._rowsByTask = {}
+        self._rowsByTaskAndType = {}
+        for row, (taskName, docType, summLen) in enumerate(zip(self.taskNames, self.docTypes, self.summaryLengths)):
+            self._rowsByTask.setdefault(taskName, []).append(row)
+            if docType is not None:
+                self._rowsByTaskAndType.setdefault((taskName, docType), {}).setdefault(summLen, []).append(row)
+        # (model filename pattern, ID) -> matching filenames, as queried by Rouge155:
+        self._modelFilenames = {}
+
+    @staticmethod
+    def fromFilenames(folder, mtime, filenames):
+        '''
+        Parses the filenames of the folder into a new DucFolderIndex.
+        '''
+        columns = {columnName:[] for columnName in DucFolderIndex.COLUMNS}
+        for filename in sorted(filenames):
+            nameParts = filename.split('.')
+            if len(nameParts) < 5:
+                nameParts = nameParts[:1] + [None] * 4
+            columns['filenames'].append(filename)
+            for columnName, namePart in zip(DucFolderIndex.COLUMNS[1:], nameParts):
+                columns[columnName].append(namePart)
+        return DucFolderIndex(folder, mtime, columns)
+
+    def getColumns(self):
+        '''
+        Returns a dictionary of column name -> column (list), as kept in the JSON file.
+        '''
+        return {columnName:getattr(self, columnName) for columnName in self.COLUMNS}
+
+    def getOptions(self, docType='M'):
+        '''
+        Returns the sorted lists: taskNames, systemNames, summaryLengths of the summaries of the docType.
+        '''
+        rows = [row for row, rowDocType in enumerate(self.docTypes) if rowDocType == docType]
+        taskNames = sorted(set(self.taskNames[row] for row in rows))
+        systemNames = sorted(set(self.systemNames[row] for row in rows))
+        summaryLengths = sorted(set(self.summaryLengths[row] for row in rows))
+        return taskNames, systemNames, summaryLengths
+
+    def getRows(self, taskName, docType='M', summLen=None, systemNames=None):
+        '''
+        Returns the rows of the summaries of the task and docType, of length summLen (all lengths if None),
+        by the systems (or authors) in systemNames (all systems if None), in the order of their filenames.
+        '''
+        rowsByLength = self._rowsByTaskAndType.get((taskName, docType), {})
+        if summLen is None:
+            rows = sorted(row for lengthRows in rowsByLength.values() for row in lengthRows)
+        else:
+            rows = rowsByLength.get(summLen, [])
+        return [row for row in rows if systemNames is None or self.systemNames[row] in systemNames]
+
+    def getFilenames(self, taskName, docType='M', summLen=None, systemNames=None):
+        '''
+        Returns the sorted filenames of the summaries of the task and docType, of length summLen (all lengths if
+        None), by the systems (or authors) in systemNames (all systems if None).
+        '''
+        return [self.filenames[row] for row in self.getRows(taskName, docType, summLen, systemNames)]
+
+    def getFilenameFields(self):
+        '''
+        Returns a dictionary of filename -> dictionary of the fields parsed from the filename (column name without
+        the plural "s" -> value, e.g. {'taskName':'D061', 'docType':'M', 'summaryLength':'010', ...}).
+        '''
+        fieldNames = [columnName[:-1] for columnName in self.COLUMNS[1:]]
+        return {filename:dict(zip(fieldNames, values)) \
+            for filename, values in zip(self.filenames, zip(*[getattr(self, columnName) for columnName in self.COLUMNS[1:]]))}
+
+    def getModelFilenamesForId(self, id, modelFilenamePattern):
+        '''
+        Returns the filenames matching the Rouge155 modelFilenamePattern, with its '#ID#' placeholder replaced by
+        the id. The filenames are looked for among those of the task named id, so every filename is matched
+        once per pattern (all the filenames are matched if id is not a task name of the folder).
+        '''
+        key = (modelFilenamePattern, id)
+        if key not in self._modelFilenames:
+            pattern = re.compile(modelFilenamePattern.replace('#ID#', id))
+            if id in self._rowsByTask:
+                candidates = [self.filenames[row] for row in self._rowsByTask[id]]
+            else:
+                candidates = self.filenames
+            self._modelFilenames[key] = [filename for filename in candidates if pattern.match(filename)]
+        return list(self._modelFilenames[key])
+
+
+class DucCorpusIndex(object):
+    '''
+    The DucFolderIndex of every folder queried, kept in the JSON file at indexPath (if given) between runs.
+    '''
+    def __init__(self, indexPath=None):
+        self.indexPath = indexPath
+        # absolute folder path -> DucFolderIndex:
+        self._folderIndexes = {}
+
+    def getFolderIndex(self, folder):
+        '''
+        Returns the DucFolderIndex of the folder, (re)built if the folder was modified since it was indexed.
+        '''
+        folder = os.path.abspath(folder)
+        mtime = os.stat(folder).st_mtime
+        folderIndex = self._folderIndexes.get(folder)
+        if folderIndex is None or folderIndex.mtime != mtime:
+            folderIndex = self.__loadFolderIndex(folder, mtime)
+            self._folderIndexes[folder] = folderIndex
+        return folderIndex
+
+    def get_model_filenames(self, id, model_dir, model_filename_pattern):
+        '''
+        The query of Rouge155 when set as its model_index (cf. DucFolderIndex.getModelFilenamesForId).
+        '''
+        return self.getFolderIndex(model_dir).getModelFilenamesForId(id, model_filename_pattern)
+
+    def __loadFolderIndex(self, folder, mtime):
+        '''
+        Takes the index of the folder from the JSON file if it is up to date, or else lists and parses the folder
+        (and updates the JSON file).
+        '''
+        savedIndexes = self.__readIndexFile()
+        savedIndex = savedIndexes.get(folder)
+        if savedIndex is not None and savedIndex['mtime'] == mtime:
+            return DucFolderIndex(folder, mtime, savedIndex['columns'])
+
+        folderIndex = DucFolderIndex.fromFilenames(folder, mtime, os.listdir(folder))
+        if self.indexPath:
+            savedIndexes[folder] = {'mtime':mtime, 'columns':folderIndex.getColumns()}
+            self.__writeIndexFile(savedIndexes)
+        return folderIndex
+
+    def __readIndexFile(self):
+        if not self.indexPath or not os.path.exists(self.indexPath):
+            return {}
+        try:
+            with open(self.indexPath, 'r') as inF:
+                return json.load(inF)
+        except ValueError:
+            # a corrupt index file is rebuilt:
+            return {}
+
+    def __writeIndexFile(self, savedIndexes):
+        # forget the folders that do not exist anymore (e.g. temporary converted summaries):
+        savedIndexes = {folder:savedIndex for folder, savedIndex in savedIndexes.items() if os.path.isdir(folder)}
+        # write to a temporary file first, so that processes reading the index never see a partial file:
+        indexFolder = os.path.dirname(os.path.abspath(self.indexPath))
+        fd, tempPath = tempfile.mkstemp(prefix='.duc_index_', dir=indexFolder)
+        with os.fdopen(fd, 'w') as outF:
+            json.dump(savedIndexes, outF)
+        _replaceFile(tempPath, self.indexPath)
@@ -0,0 +1,337 @@
+'''
+This module runs the ROUGE evaluations of calculateRouge.py and calculateRouge_modelComparisons.py
+as independent jobs, either one after the other or distributed over a pool of worker processes.
+
+Each worker process has its own Rouge155 object, and keeps all of its temporary files (ROUGE
+configuration files, converted summaries) in a private directory, which is removed when all the
+jobs are done.
+
+With the ROUGE worker backend, the worker processes are kept for all the runs with the same settings, so that each
+of them starts its ROUGE worker (cf. pyrouge.rouge_worker) once for the whole run. They are stopped at exit.
+
+With the Perl ROUGE and SEE summaries, the worker processes would only wait for their Perl processes,
+so the jobs instead run as concurrent Perl subprocesses of the current process, with asyncio (cf.
+pyrouge.rouge_async.evaluate_in_order, imported only for them), and a Perl process running longer than the job timeout
+is stopped.
+'''
+
+import os
+import re
+import atexit
+import shutil
+import tempfile
+from functools import partial
+from collections import namedtuple
+from multiprocessing import Pool, cpu_count
+from pyrouge import Rouge155
+from pyrouge.rouge_cache import RougeScoreCache
+from pyrouge.rouge_tokens import RougeTokenCache
+from pyrouge.utils import log
+from ducCorpusIndex import DucCorpusIndex
+
+
+# The input formats of the summaries (same values as in the calling scripts):
+FORMAT_SEE = 'SEE'
+FORMAT_TEXT = 'text'
+
+# A single ROUGE evaluation of the system summaries matching systemPattern against the model summaries
+# matching modelPattern. Its result is the Rouge155 output dictionary.
+RougeJob = namedtuple('RougeJob',
+    ['key', 'systemDir', 'modelDir', 'systemPattern', 'modelPattern', 'rougeAdditionalParams'])
+
+# A single ROUGE run for several systems, where peers is a list of (systemId, systemPattern, modelPattern).
+# Its result is a dictionary of systemId -> Rouge155 output dictionary.
+RougeBatchJob = namedtuple('RougeBatchJob',
+    ['key', 'systemDir', 'modelDir', 'peers', 'rougeAdditionalParams'])
+
+# The match counts of single (systemFilename, modelFilename) pairs, always with the native ROUGE (cf. rougePairCounts.py).
+# Its result is the list of the Rouge155.evaluate_pairs counts of the pairs, truncated to each of the lengths if
+# lengths is not None (cf. rougePairCounts.getPairCountsByCutoff).
+RougePairsJob = namedtuple('RougePairsJob',
+    ['key', 'systemDir', 'modelDir', 'pairs', 'rougeAdditionalParams', 'lengths'])
+
+# The match counts of every summary of a folder in filenames against every one of them, always with the native ROUGE
+# (cf. calculateRouge_modelComparisons.py). Its result is the Rouge155.evaluate_matrix tuple (rouge types, counts array).
+RougeMatrixJob = namedtuple('RougeMatrixJob', ['key', 'modelDir', 'filenames', 'rougeAdditionalParams'])
+
+# Several jobs over the same summaries (e.g. with and without stop words), run one after the other in the same process,
+# so that the summaries are read and tokenized once for all of them (with the native ROUGE). Its result is the list of
+# the results of the jobs (None for the jobs that failed).
+RougeVariantsJob = namedtuple('RougeVariantsJob', ['key', 'jobs'])
+
+# The logger of the jobs that failed:
+logger = log.get_global_console_logger()
+
+# The ROUGE object and input format of the current (worker) process, and whether its jobs return the task scores:
+_rougeCalculator = None
+_inputFormat = None
+_taskScores = False
+
+# The pool of worker processes kept for the runs of the ROUGE worker backend, as (settings, pool, its common folder):
+_workerPool = None
+
+
+def _initProcess(backend, inputFormat, scoreCachePath=None, corpusIndexPath=None, tokenCachePath=None,
+                 confidenceIntervals=True, taskScores=False, workFolder=None, scratchDir=None):
+    '''
+    Prepares the current process for running jobs.
+    With a scoreCachePath, ROUGE outputs are looked up in (and added to) the score cache at that path.
+    The model summaries are found with a DucCorpusIndex, kept in the file at corpusIndexPath if given.
+    With a tokenCachePath, the native ROUGE starts from the tokenized summaries in the token cache at that path.
+    Without confidenceIntervals, ROUGE skips the bootstrap resampling of the confidence intervals.
+    With taskScores, the jobs also return the scores of every task (cf. runRougeJobs).
+    A worker process (workFolder given) keeps its temporary files in its own subfolder of workFolder, and the
+    current process in a workspace of its ROUGE object in scratchDir (cf. Rouge155.workspace) if given.
+    '''
+    global _rougeCalculator, _inputFormat, _taskScores
+    if workFolder:
+        tempfile.tempdir = tempfile.mkdtemp(prefix='worker_', dir=workFolder)
+    _rougeCalculator = Rouge155(backend=backend)
+    if not workFolder:
+        _rougeCalculator.scratch_dir = scratchDir
+    _rougeCalculator.model_index = DucCorpusIndex(corpusIndexPath)
+    if tokenCachePath:
+        _rougeCalculator.token_cache = RougeTokenCache(tokenCachePath)
+    _rougeCalculator.confidence_intervals = confidenceIntervals
+    if scoreCachePath:
+        _rougeCalculator.score_cache = RougeScoreCache(scoreCachePath)
+    _inputFormat = inputFormat
+    _taskScores = taskScores
+
+
+def _runJob(job):
+    '''
+    Runs a single RougeJob, RougeBatchJob, RougePairsJob, RougeMatrixJob or RougeVariantsJob with the ROUGE object of
+    the current process. Returns a tuple (job key, result), where the result is None if the evaluation failed.
+    '''
+    if isinstance(job, RougeVariantsJob):
+        return job.key, [_runJob(variantJob)[1] for variantJob in job.jobs]
+
+    rougeCalculator = _rougeCalculator
+    try:
+        if isinstance(job, RougeMatrixJob):
+            rougeCalculator.model_dir = job.modelDir
+            rougeCalculator.add_rouge_args_to_default(job.rougeAdditionalParams)
+            return job.key, rougeCalculator.evaluate_matrix(job.filenames)
+
+        _setJobSummaries(rougeCalculator, job)
+
+        if isinstance(job, RougePairsJob):
+            return job.key, rougeCalculator.evaluate_pairs(job.pairs, lengths=job.lengths)
+
+        if isinstance(job, RougeBatchJob):
+            if _inputFormat == FORMAT_SEE:
+                output = rougeCalculator.evaluate_batch(job.peers)
+            elif _inputFormat == FORMAT_TEXT:
+                output = rougeCalculator.convert_and_evaluate_batch(job.peers)
+            return job.key, _getJobResult(rougeCalculator, job, output)
+
+        # When using plain text format, run convert_and_evaluate.
+        # For SEE format, use just evaluate(), since convert is for text->SEE conversion.
+        if _inputFormat == FORMAT_SEE:
+            output = rougeCalculator.evaluate()
+        elif _inputFormat == FORMAT_TEXT:
+            output = rougeCalculator.convert_and_evaluate()
+        return job.key, _getJobResult(rougeCalculator, job, output)
+    except Exception:
+        logger.exception("ROUGE job {} failed".format(job.key))
+        return job.key, None
+
+
+def _setUpPerlJob(job):
+    '''
+    Sets up the Perl ROUGE run of a RougeJob or RougeBatchJob of SEE summaries with the ROUGE object of the current
+    process (cf. pyrouge.rouge_async.evaluate_in_order). Returns the tuple (jobs, getResult) of the run.
+    '''
+    _setJobSummaries(_rougeCalculator, job)
+    return job.peers if isinstance(job, RougeBatchJob) else None, partial(_getJobResult, _rougeCalculator, job)
+
+
+def _setJobSummaries(rougeCalculator, job):
+    '''
+    Sets the summary folders, filename patterns and additional parameters of the job on the ROUGE object.
+    '''
+    rougeCalculator.system_dir = job.systemDir
+    rougeCalculator.model_dir = job.modelDir
+    rougeCalculator.add_rouge_args_to_default(job.rougeAdditionalParams)
+    if isinstance(job, RougeJob):
+        rougeCalculator.system_filename_pattern = job.systemPattern
+        rougeCalculator.model_filename_pattern = job.modelPattern
+
+
+def _getJobResult(rougeCalculator, job, output, configFile=None, results=None):
+    '''
+    The result of a RougeJob or RougeBatchJob from its ROUGE output (cf. runRougeJobs), where configFile is the
+    ROUGE configuration file of the run if it is not the last one written by the ROUGE object, and results are the
+    average scores already parsed from the output, by system (as output_to_dict(output, by_system=True)), if any.
+    '''
+    if results is None:
+        results = rougeCalculator.output_to_dict(output, by_system=True)
+    if isinstance(job, RougeBatchJob):
+        result = results
+        if _taskScores:
+            systemPatterns = {systemId:systemPattern for systemId, systemPattern, _ in job.peers}
+            result = (result, _getTaskOutputDicts(rougeCalculator, output, systemPatterns, configFile))
+        return result
+
+    # the scores of all the systems in a single dictionary, as output_to_dict(output) gives them:
+    result = {}
+    for systemResults in results.values():
+        result.update(systemResults)
+    if _taskScores:
+        # evaluate() runs with the default system ID (1):
+        taskOutputDicts = _getTaskOutputDicts(rougeCalculator, output, {'1':job.systemPattern}, configFile)
+        result = (result, taskOutputDicts.get('1', {}))
+    return result
+
+
+def _getTaskOutputDicts(rougeCalculator, output, systemPatterns, configFile=None):
+    '''
+    The scores of every task in the ROUGE output of a job run with the -d flag, where the task of an EVAL is the
+    ID of its system summary (the first group of the system filename pattern, as matched by Rouge155).
+    systemPatterns is a dictionary of system ID -> system filename pattern.
+    Returns a dictionary of system ID -> task name -> Rouge155 output dictionary of the task.
+    '''
+    evalPeers = rougeCalculator.get_config_peers(configFile)
+    taskOutputDicts = {}
+    for systemId, evalOutputDicts in rougeCalculator.output_to_eval_dict(output, by_system=True).items():
+        for evalId, outputDict in evalOutputDicts.items():
+            for peerId, systemFilename in evalPeers.get(evalId, []):
+                if peerId == systemId:
+                    taskName = re.match(systemPatterns[systemId], systemFilename).groups(0)[0]
+                    taskOutputDicts.setdefault(systemId, {})[taskName] = outputDict
+    return taskOutputDicts
+
+
+def tokenizeSummaries(folders, tokenCachePath, corpusIndex=None):
+    '''
+    Tokenizes the summaries of the folders (in SEE format) once into the token cache file at tokenCachePath,
+    before running the jobs, so that the worker processes of the native ROUGE all start from the tokenized
+    summaries instead of each tokenizing them again. Summaries already in the token cache are not read again.
+    The token cache file packs all the summaries into a single file, which the worker processes memory-map.
+    With a corpusIndex (a DucCorpusIndex), the fields of the DUC filename of every summary are kept with it in the
+    token cache (cf. RougeTokenCache.summary_metadata).
+    '''
+    rougeCalculator = Rouge155(backend=Rouge155.BACKEND_NATIVE)
+    rougeCalculator.token_cache = RougeTokenCache(tokenCachePath)
+    metadata = None
+    if corpusIndex is not None:
+        filenameFields = {folder:corpusIndex.getFolderIndex(folder).getFilenameFields() for folder in folders}
+        metadata = lambda folder, filename: filenameFields[folder].get(filename)
+    rougeCalculator.tokenize_summaries(folders, metadata)
+
+
+def getNumWorkers(numWorkers):
+    '''
+    The number of worker processes to use: all the CPUs if numWorkers is None.
+    '''
+    if numWorkers is None:
+        return cpu_count()
+    return max(1, int(numWorkers))
+
+
+def runRougeJobs(jobs, backend, inputFormat, numWorkers=None, scoreCachePath=None, corpusIndexPath=None,
+                 tokenCachePath=None, confidenceIntervals=True, taskScores=False, scratchDir=None, jobTimeout=None):
+    '''
+    Runs all the jobs (RougeJob, RougeBatchJob, RougePairsJob, RougeMatrixJob or RougeVariantsJob), with numWorkers processes (all CPUs if None).
+    With a single worker, the jobs run in the current process.
+    With the Perl ROUGE and SEE summaries, the jobs run in the current process as numWorkers concurrent Perl processes,
+    and a Perl process running more than jobTimeout seconds (if given) is stopped, failing its job.
+    With a scoreCachePath, jobs already evaluated before are taken from the score cache at that path.
+    With a corpusIndexPath, the index of the summary filenames is kept in that file (cf. ducCorpusIndex.py).
+    With a tokenCachePath, the native ROUGE loads the tokenized summaries from that file (cf. tokenizeSummaries).
+    Without confidenceIntervals, the results only have meaningful average scores (no bootstrap resampling).
+    With taskScores, the jobs must run ROUGE with the -d flag, and the result of a RougeJob or RougeBatchJob is a
+    tuple of its usual result and the scores of every task: a dictionary of task name -> Rouge155 output dictionary
+    (per system ID for a RougeBatchJob). The task scores ROUGE prints are rounded to 5 decimals.
+    The temporary files of the evaluations (ROUGE configurations, converted summaries) are written in scratchDir
+    (e.g. Rouge155.TMPFS_DIR to keep them in memory) if given, else in the default temporary folder, and removed
+    when the jobs are done (at exit for the processes of the ROUGE worker backend, kept for the following runs).
+    Yields (job key, result) tuples in the order of the jobs, so that results are stored the same
+    way whatever the number of workers. The result is None for jobs that failed.
+    '''
+    poolSize = getNumWorkers(numWorkers)
+    numWorkers = min(poolSize, max(1, len(jobs)))
+
+    if backend == Rouge155.BACKEND_PERL and inputFormat == FORMAT_SEE:
+        _initProcess(backend, inputFormat, scoreCachePath, corpusIndexPath, tokenCachePath, confidenceIntervals,
+            taskScores, scratchDir=scratchDir)
+        # the Perl runs of every job (or of each of its variants), each set up when its process starts:
+        from pyrouge.rouge_async import evaluate_in_order
+        evaluations = [[(variantJob.key, partial(_setUpPerlJob, variantJob)) \
+            for variantJob in (job.jobs if isinstance(job, RougeVariantsJob) else [job])] for job in jobs]
+        try:
+            for job, results in zip(jobs, evaluate_in_order(_rougeCalculator, evaluations, numWorkers, jobTimeout)):
+                yield job.key, results if isinstance(job, RougeVariantsJob) else results[0]
+        finally:
+            _rougeCalculator.cleanup()
+        return
+
+    if backend == Rouge155.BACKEND_WORKER and poolSize > 1:
+        pool = _getWorkerPool(poolSize, (backend, inputFormat, scoreCachePath, corpusIndexPath, tokenCachePath,
+            confidenceIntervals, taskScores), scratchDir)
+        for jobKey, result in pool.imap(_runJob, jobs):
+            yield jobKey, result
+        return
+
+    if numWorkers == 1:
+        _initProcess(backend, inputFormat, scoreCachePath, corpusIndexPath, tokenCachePath, confidenceIntervals,
+            taskScores, scratchDir=scratchDir)
+        try:
+            for job in jobs:
+                yield _runJob(job)
+        finally:
+            _rougeCalculator.cleanup()
+        return
+
+    # the private folders of the workers are created in a common folder, removed at the end:
+    if scratchDir and not os.path.isdir(scratchDir):
+        scratchDir = None
+    workFolder = tempfile.mkdtemp(prefix='rouge_jobs_', dir=scratchDir)
+    pool = Pool(numWorkers, initializer=_initProcess, initargs=(backend, inputFormat, scoreCachePath, corpusIndexPath,
+        tokenCachePath, confidenceIntervals, taskScores, workFolder))
+    try:
+        for jobKey, result in pool.imap(_runJob, jobs):
+            yield jobKey, result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(workFolder, ignore_errors=True)
+
+
+def _getWorkerPool(numWorkers, initArgs, scratchDir=None):
+    '''
+    Returns the pool of numWorkers processes prepared with the _initProcess arguments initArgs (without workFolder),
+    created on the first call and returned by the following ones with the same arguments, so that every process keeps
+    its ROUGE object, and its ROUGE worker, for the whole run. A pool with other arguments replaces it.
+    '''
+    global _workerPool
+    settings = (numWorkers, initArgs, scratchDir)
+    if _workerPool is not None and _workerPool[0] == settings:
+        return _workerPool[1]
+    _stopWorkerPool()
+    # the private folders of the workers are created in a common folder, removed with the pool:
+    if scratchDir and not os.path.isdir(scratchDir):
+        scratchDir = None
+    workFolder = tempfile.mkdtemp(prefix='rouge_jobs_', dir=scratchDir)
+    pool = Pool(numWorkers, initializer=_initProcess, initargs=initArgs + (workFolder,))
+    _workerPool = (settings, pool, workFolder)
+    return pool
+
+
+def _stopWorkerPool():
+    '''
+    Stops the pool of _getWorkerPool, if any, with the ROUGE workers of its processes, and removes its folder.
+    '''
+    global _workerPool
+    if _workerPool is None:
+        return
+    _, pool, workFolder = _workerPool
+    _workerPool = None
+    pool.terminate()
+    pool.join()
+    shutil.rmtree(workFolder, ignore_errors=True)
+
+
+atexit.register(_stopWorkerPool)
@@ -0,0 +1,211 @@
+'''
+This module scores every system summary against every single model summary of its task once, with the
+native ROUGE implementation, and keeps the per-pair match counts in an array. The scores of a system
+against any set of model summaries (e.g. the model summaries of the length chosen by a comparison type
+of calculateRouge.py) are then assembled from these counts, as ROUGE would compute them, without
+running ROUGE again for every set.
+
+The summary filenames are assumed to be in the DUC format (cf. ducCorpusIndex.py), with a single multi-doc
+summary per system, task and summary length.
+'''
+
+import numpy as np
+from collections import namedtuple, OrderedDict
+from pyrouge import Rouge155
+from rougeJobs import RougePairsJob, RougeVariantsJob, runRougeJobs, FORMAT_SEE, FORMAT_TEXT, logger
+from ducCorpusIndex import DucCorpusIndex
+from summaryConversion import SummaryConverter
+
+
+# The match counts of all the system summaries against all the model summaries of their task:
+#   counts:         array [summaryLength, system, task, model, rougeType, (hit, modelTotal, peerTotal)], where the
+#                   summary length is the one the summaries are truncated to (ROUGE -l), and the models are
+#                   indexed as in modelFilenames. The counts of a system and summary length whose job failed are NaN.
+#   peerFilenames:  a dictionary of (summLen, sysName) -> list of (task index, system summary filename).
+#   modelFilenames: a list per task of its model summary filenames (sorted, as in the ROUGE configurations).
+#   modelLengths:   a list per task of the summary lengths of its model summaries.
+PairCounts = namedtuple('PairCounts',
+    ['summaryLengths', 'systemNames', 'taskNames', 'rougeTypes', 'counts', 'peerFilenames', 'modelFilenames',
+     'modelLengths'])
+
+
+def getPairCounts(folderSystems, folderModels, systemNames, summaryLengths, rougeAdditionalParamsPerLength,
+                  inputFormat, numWorkers=None, corpusIndex=None, tokenCachePath=None):
+    '''
+    Counts the matches of the multi-doc summaries of the systems against each of the multi-doc model summaries
+    of the same task, one pair at a time. The summaries of each length are truncated with the ROUGE flags
+    rougeAdditionalParamsPerLength[summLen] (summLen -> list of ROUGE flags), and the counting is run in
+    numWorkers parallel processes (cf. rougeJobs.runRougeJobs).
+    The summaries are found with the corpusIndex (a DucCorpusIndex), or a new one if not given, and the tokenized
+    summaries are loaded from the token cache at tokenCachePath if given.
+    Returns a PairCounts.
+    '''
+    return getPairCountsVariants(folderSystems, folderModels, systemNames, summaryLengths,
+        [rougeAdditionalParamsPerLength], inputFormat, numWorkers, corpusIndex, tokenCachePath)[0]
+
+
+def getPairCountsVariants(folderSystems, folderModels, systemNames, summaryLengths, variantsParamsPerLength,
+                          inputFormat, numWorkers=None, corpusIndex=None, tokenCachePath=None):
+    '''
+    Counts the matches of the summaries as getPairCounts does, for several preprocessing variants of the summaries
+    (e.g. with and without stop words) in a single pass: the pairs of a system and summary length are counted for all
+    the variants by the same job, so every summary is read and tokenized once.
+    variantsParamsPerLength is a list with the rougeAdditionalParamsPerLength of each variant.
+    Returns a list with the PairCounts of each variant.
+    '''
+    taskNames, modelFilenames, modelLengths, peerFilenames = _getPairFilenames(folderSystems, folderModels,
+        systemNames, summaryLengths, corpusIndex)
+    variantsCounts = _countPairs(folderSystems, folderModels, systemNames, summaryLengths, taskNames, modelFilenames,
+        peerFilenames, variantsParamsPerLength, None, inputFormat, numWorkers, tokenCachePath)
+    return [PairCounts(summaryLengths, systemNames, taskNames, rougeTypes, counts, peerFilenames, modelFilenames,
+        modelLengths) for [(counts, rougeTypes)] in variantsCounts]
+
+
+def getPairCountsByCutoff(folderSystems, folderModels, systemNames, summaryLengths, cutoffs, rougeAdditionalParams,
+                          inputFormat, numWorkers=None, corpusIndex=None, tokenCachePath=None):
+    '''
+    Counts the ROUGE-N matches of the summaries as getPairCounts does, with the summaries (of every length) truncated
+    to each of the word cutoffs instead of a single ROUGE -l length. The n-grams of each pair of summaries are
+    counted once, in the order of their positions, and the counts of every cutoff are read in passing (cf.
+    Rouge155.evaluate_pairs), so that a cutoff costs almost nothing more than the n-grams it adds.
+    rougeAdditionalParams are the ROUGE flags of all the counts (any -l flag in them is ignored).
+    Returns an OrderedDict of cutoff -> PairCounts of the summaries truncated to the cutoff, where the summary
+    lengths are still the lengths of the system summaries.
+    '''
+    taskNames, modelFilenames, modelLengths, peerFilenames = _getPairFilenames(folderSystems, folderModels,
+        systemNames, summaryLengths, corpusIndex)
+    cutoffs = list(cutoffs)
+    cutoffCounts = _countPairs(folderSystems, folderModels, systemNames, summaryLengths, taskNames, modelFilenames,
+        peerFilenames, [{summLen:rougeAdditionalParams for summLen in summaryLengths}], cutoffs, inputFormat,
+        numWorkers, tokenCachePath)[0]
+    return OrderedDict((cutoff, PairCounts(summaryLengths, systemNames, taskNames, rougeTypes, counts, peerFilenames,
+        modelFilenames, modelLengths)) for cutoff, (counts, rougeTypes) in zip(cutoffs, cutoffCounts))
+
+
+def _getPairFilenames(folderSystems, folderModels, systemNames, summaryLengths, corpusIndex):
+    '''
+    The summaries to count the matches of (cf. PairCounts): the task names, the model summary filenames and
+    lengths of each task, and the system summary filenames of each (summLen, sysName).
+    '''
+    if corpusIndex is None:
+        corpusIndex = DucCorpusIndex()
+    systemsIndex = corpusIndex.getFolderIndex(folderSystems)
+    modelsIndex = corpusIndex.getFolderIndex(folderModels)
+
+    # the model summaries of each task:
+    taskNames = modelsIndex.getOptions('M')[0]
+    modelRows = [modelsIndex.getRows(taskName, 'M') for taskName in taskNames]
+    modelFilenames = [[modelsIndex.filenames[row] for row in rows] for rows in modelRows]
+    modelLengths = [[modelsIndex.summaryLengths[row] for row in rows] for rows in modelRows]
+
+    # the system summaries of each length and system, with their task index:
+    peerFilenames = {}
+    for summLen in summaryLengths:
+        for sysName in systemNames:
+            peerFilenames[(summLen, sysName)] = [(taskIdx, filename) \
+                for taskIdx, taskName in enumerate(taskNames) \
+                for filename in systemsIndex.getFilenames(taskName, 'M', summLen, [sysName])]
+    return taskNames, modelFilenames, modelLengths, peerFilenames
+
+
+def _countPairs(folderSystems, folderModels, systemNames, summaryLengths, taskNames, modelFilenames, peerFilenames,
+                variantsParamsPerLength, cutoffs, inputFormat, numWorkers, tokenCachePath):
+    '''
+    Runs the RougePairsJob of every summary length and system, for every variant with its ROUGE flags
+    variantsParamsPerLength[variant][summLen], truncated to each of the cutoffs if not None.
+    Returns a list per variant of (counts array, rouge types), one per cutoff or a single one without cutoffs.
+    The counts of the jobs that failed are NaN.
+    '''
+    converter = None
+    if inputFormat == FORMAT_TEXT:
+        # convert the summaries once for all the jobs:
+        converter = SummaryConverter()
+        folderSystems = converter.getConvertedFolder(folderSystems)
+        folderModels = converter.getConvertedFolder(folderModels)
+
+    # a job per summary length and system, with the pairs of each of its summaries with the models of its task:
+    jobs = []
+    for lenIdx, summLen in enumerate(summaryLengths):
+        for sysIdx, sysName in enumerate(systemNames):
+            pairs = [(peerFilename, modelFilename) \
+                for taskIdx, peerFilename in peerFilenames.get((summLen, sysName), []) \
+                for modelFilename in modelFilenames[taskIdx]]
+            if pairs:
+                jobs.append(RougeVariantsJob((lenIdx, sysIdx), [RougePairsJob((lenIdx, sysIdx), folderSystems,
+                    folderModels, pairs, paramsPerLength[summLen], cutoffs) for paramsPerLength in variantsParamsPerLength]))
+
+    numCutoffs = 1 if cutoffs is None else len(cutoffs)
+    counts = [None] * len(variantsParamsPerLength)
+    rougeTypes = [[] for _ in variantsParamsPerLength]
+    maxModels = max([len(filenames) for filenames in modelFilenames] + [0])
+    failedKeys = [[] for _ in variantsParamsPerLength]
+    try:
+        for (lenIdx, sysIdx), variantsPairsCounts in runRougeJobs(jobs, Rouge155.BACKEND_NATIVE, FORMAT_SEE,
+                numWorkers, tokenCachePath=tokenCachePath):
+            for variantIdx, pairsCounts in enumerate(variantsPairsCounts):
+                if pairsCounts is None:
+                    logger.error("Missing pair counts of system {} at length {}: its scores are left out".format(
+                        systemNames[sysIdx], summaryLengths[lenIdx]))
+                    failedKeys[variantIdx].append((lenIdx, sysIdx))
+                    continue
+                if cutoffs is None:
+                    pairsCounts = [[pairCounts] for pairCounts in pairsCounts]
+                if counts[variantIdx] is None:
+                    rougeTypes[variantIdx] = list(pairsCounts[0][0].keys())
+                    counts[variantIdx] = np.zeros((numCutoffs, len(summaryLengths), len(systemNames), len(taskNames),
+                        maxModels, len(rougeTypes[variantIdx]), 3), dtype=np.float64)
+                pairsCounts = iter(pairsCounts)
+                for taskIdx, _ in peerFilenames[(summaryLengths[lenIdx], systemNames[sysIdx])]:
+                    for modelIdx in range(len(modelFilenames[taskIdx])):
+                        counts[variantIdx][:, lenIdx, sysIdx, taskIdx, modelIdx] = \
+                            [list(cutoffCounts.values()) for cutoffCounts in next(pairsCounts)]
+    finally:
+        if converter:
+            converter.cleanup()
+
+    for variantIdx in range(len(counts)):
+        if counts[variantIdx] is None:
+            counts[variantIdx] = np.zeros((numCutoffs, len(summaryLengths), len(systemNames), len(taskNames),
+                maxModels, 0, 3), dtype=np.float64)
+        for lenIdx, sysIdx in failedKeys[variantIdx]:
+            counts[variantIdx][:, lenIdx, sysIdx] = np.nan
+    return [[(cutoffCounts, variantRougeTypes) for cutoffCounts in variantCounts] \
+        for variantCounts, variantRougeTypes in zip(counts, rougeTypes)]
+
+
+def getPairCountsScores(rougeCalculator, pairCounts, sysName, summLen, modelSummLen=None, byTask=False):
+    '''
+    Assembles the ROUGE scores of the summaries of system sysName of length summLen against the model summaries
+    of length modelSummLen (all the model summaries if None), from the pairCounts.
+    rougeCalculator is the Rouge155 object used to score the counts (with its ROUGE options), the jackknifed scores
+    of all the tasks at once (cf. Rouge155.pair_count_arrays_to_dict), so any set of model summaries is scored from
+    the same counts.
+    Returns the Rouge155 output dictionary (without confidence intervals), or None if some summary has no
+    model summaries to be compared to, as ROUGE would fail too, or if the counting job of the summaries failed. With byTask, returns a tuple of it and a dictionary
+    of task name -> Rouge155 output dictionary of the (unrounded) scores of the task.
+    '''
+    lenIdx = pairCounts.summaryLengths.index(summLen)
+    sysIdx = pairCounts.systemNames.index(sysName)
+    taskIdxs = [taskIdx for taskIdx, _ in pairCounts.peerFilenames.get((summLen, sysName), [])]
+    # the models of each task to compare to, first in the counts of the task (cf. Rouge155.pair_count_arrays_to_dict):
+    maxModels = pairCounts.counts.shape[3]
+    modelIdxs = np.zeros((len(taskIdxs), maxModels), dtype=np.int64)
+    numModels = np.zeros(len(taskIdxs), dtype=np.int64)
+    for evalIdx, taskIdx in enumerate(taskIdxs):
+        taskModelIdxs = [modelIdx for modelIdx, modelLength in enumerate(pairCounts.modelLengths[taskIdx]) \
+            if modelSummLen is None or modelLength == modelSummLen]
+        modelIdxs[evalIdx, :len(taskModelIdxs)] = taskModelIdxs
+        numModels[evalIdx] = len(taskModelIdxs)
+    # no summaries, or a summary without model summaries (ROUGE would fail):
+    if not taskIdxs or not numModels.all():
+        return None
+    evalCounts = pairCounts.counts[lenIdx, sysIdx][np.array(taskIdxs, dtype=np.int64)[:, None], modelIdxs]
+    if np.isnan(evalCounts).any():
+        # the counting job failed (already logged):
+        return None
+    evalTaskNames = [pairCounts.taskNames[taskIdx] for taskIdx in taskIdxs]
+    if byTask:
+        outputDict, evalOutputDicts = rougeCalculator.pair_count_arrays_to_dict(evalCounts, numModels,
+            pairCounts.rougeTypes, by_eval=True)
+        return outputDict, dict(zip(evalTaskNames, evalOutputDicts))
+    return rougeCalculator.pair_count_arrays_to_dict(evalCounts, numModels, pairCounts.rougeTypes)
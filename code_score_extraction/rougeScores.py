@@ -0,0 +1,95 @@
+'''
+This module keeps the average ROUGE scores of the systems (or of the model authors) of calculateRouge.py and
+calculateRouge_modelComparisons.py in a single labeled array, instead of nested dictionaries of every system,
+summary length and rouge type pre-filled with -1, so that they are aggregated with array operations.
+
+The scores are kept in an array [system, summaryLength, ..., rougeType, measure], with a summary length axis per
+length of the comparison (the length of the system summaries, or the lengths of the checked and of the model
+summaries), and NaN where a system has no score:
+    scoreStore = newScoreStore(systemNames, summaryLengths, ['R1', 'R2'], numLengthAxes=2)
+    storeScores(scoreStore, sysName, (summLenChecked, summLenModel), outputDict, {'R1':'rouge_1', 'R2':'rouge_2'})
+    averages, counts = getAverageScores(scoreStore)
+'''
+
+import numpy as np
+from collections import namedtuple
+
+
+# The measures of every ROUGE type, as in the outputs of the scripts, and their keys in the Rouge155 output dictionaries:
+MEASURES = ['recall', 'precision', 'f1']
+OUTPUT_DICT_MEASURES = ['recall', 'precision', 'f_score']
+
+# The ROUGE scores of all the systems:
+#   scores:     float array [system, summaryLength (numLengthAxes axes), rougeType, measure], where the rouge types are
+#               the keys of the ROUGE_TYPES of the scripts (e.g. 'RSU') and the measures are as in MEASURES.
+ScoreStore = namedtuple('ScoreStore', ['systemNames', 'summaryLengths', 'rougeTypes', 'scores'])
+
+
+def newScoreStore(systemNames, summaryLengths, rougeTypes, numLengthAxes=1):
+    '''
+    Returns a ScoreStore without any scores (all NaN), with numLengthAxes summary length axes.
+    '''
+    scores = np.full((len(systemNames),) + (len(summaryLengths),) * numLengthAxes + (len(rougeTypes), len(MEASURES)),
+        np.nan)
+    return ScoreStore(list(systemNames), list(summaryLengths), list(rougeTypes), scores)
+
+
+def storeScores(scoreStore, sysName, summLens, outputDict, rougeTypeNames):
+    '''
+    Stores the scores of system sysName for the summary lengths summLens (a tuple with a length per length axis),
+    given as a Rouge155 output dictionary. rougeTypeNames is a dictionary of rouge type -> its name in the Rouge155
+    output dictionary (e.g. ROUGE_TYPES). Raises a KeyError if a score is missing from outputDict, where the rouge
+    types before it are stored.
+    '''
+    index = (scoreStore.systemNames.index(sysName),) + \
+        tuple(scoreStore.summaryLengths.index(summLen) for summLen in summLens)
+    for typeIdx, rougeType in enumerate(scoreStore.rougeTypes):
+        scoreStore.scores[index + (typeIdx,)] = [outputDict['{}_{}'.format(rougeTypeNames[rougeType], measure)] \
+            for measure in OUTPUT_DICT_MEASURES]
+
+
+def getScoreStrings(scoreStore, sysIdx, lengthIdxs, typeIdx, measureIdx, missing='-'):
+    '''
+    The scores of the system at index sysIdx for each of the lengthIdxs (a list of tuples of indices on the length
+    axes) of a rouge type and measure, as strings for the CSV outputs: as Python prints them, or missing where the
+    system has no score.
+    '''
+    return [str(float(score)) if not np.isnan(score) else missing \
+        for score in (scoreStore.scores[(sysIdx,) + lengthIdx + (typeIdx, measureIdx)] for lengthIdx in lengthIdxs)]
+
+
+def getAverageScores(scoreStore):
+    '''
+    The average scores over the systems, of every summary length (on each length axis), rouge type and measure, over
+    the systems that have a score for it.
+    Returns the arrays (averages, counts) [summaryLength (numLengthAxes axes), rougeType, measure], where the counts are
+    the numbers of systems averaged, and the averages are NaN where there are none.
+    '''
+    scores = scoreStore.scores
+    counts = np.sum(~np.isnan(scores), axis=0)
+    # a sum over the first axis adds the systems one by one (no pairwise summation), as a loop over them does:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.nansum(scores, axis=0) / counts
+    averages[counts == 0] = np.nan
+    return averages, counts
+
+
+def saveScoreStore(scoreStore, path):
+    '''
+    Saves the scoreStore to a compressed NumPy file at path, as the labels of its axes and the array of scores (NaN for
+    missing), so that it is read back in a single call (np.load) instead of parsing a CSV output.
+    '''
+    with open(path, 'wb') as outF:
+        np.savez_compressed(outF, systemNames=np.array(scoreStore.systemNames, dtype=str),
+            summaryLengths=np.array(scoreStore.summaryLengths, dtype=str),
+            rougeTypes=np.array(scoreStore.rougeTypes, dtype=str), measures=np.array(MEASURES, dtype=str),
+            scores=scoreStore.scores)
+
+
+def loadScoreStore(path):
+    '''
+    Returns the ScoreStore saved at path by saveScoreStore.
+    '''
+    with np.load(path) as saved:
+        return ScoreStore(saved['systemNames'].tolist(), saved['summaryLengths'].tolist(),
+            saved['rougeTypes'].tolist(), saved['scores'])
@@ -0,0 +1,85 @@
+'''
+This module keeps the ROUGE scores of every task, and not only the average scores of every system, so that the
+averages (or any other aggregation of the scores over the tasks) can be computed again without running ROUGE.
+ROUGE prints the scores of every task (EVAL) when run with the -d flag (cf. Rouge155.output_to_eval_dict).
+
+The scores are kept in an array [system, task, summaryLength, rougeType, measure], with NaN where a system has
+no score for a task and length, and saved in a compressed NumPy file:
+    taskScores = newTaskScores(systemNames, taskNames, summaryLengths, ['rouge_1', 'rouge_2'])
+    storeTaskScores(taskScores, sysName, summLen, outputDictsByTask)
+    saveTaskScores(taskScores, 'scores.tasks.npz')
+    averages = getAverageScores(loadTaskScores('scores.tasks.npz'))
+'''
+
+import numpy as np
+from collections import namedtuple
+
+
+# The measures of every ROUGE type, as in the keys of the Rouge155 output dictionaries:
+MEASURES = ['recall', 'precision', 'f_score']
+
+# The ROUGE scores of all the tasks:
+#   scores:     float array [system, task, summaryLength, rougeType, measure], where the rouge types are the names
+#               used in the Rouge155 output dictionaries (e.g. 'rouge_su*') and the measures are as in MEASURES.
+TaskScores = namedtuple('TaskScores', ['systemNames', 'taskNames', 'summaryLengths', 'rougeTypes', 'scores'])
+
+
+def newTaskScores(systemNames, taskNames, summaryLengths, rougeTypes):
+    '''
+    Returns a TaskScores without any scores (all NaN).
+    '''
+    scores = np.full((len(systemNames), len(taskNames), len(summaryLengths), len(rougeTypes), len(MEASURES)),
+        np.nan)
+    return TaskScores(list(systemNames), list(taskNames), list(summaryLengths), list(rougeTypes), scores)
+
+
+def storeTaskScores(taskScores, sysName, summLen, outputDictsByTask):
+    '''
+    Stores the scores of system sysName for summary length summLen, given as a dictionary of task name -> Rouge155
+    output dictionary (with the keys <rougeType>_<measure>). Tasks and scores unknown to the taskScores are skipped.
+    '''
+    sysIdx = taskScores.systemNames.index(sysName)
+    lenIdx = taskScores.summaryLengths.index(summLen)
+    for taskName, outputDict in outputDictsByTask.items():
+        if taskName not in taskScores.taskNames:
+            continue
+        taskIdx = taskScores.taskNames.index(taskName)
+        taskScores.scores[sysIdx, taskIdx, lenIdx] = [[outputDict.get('{}_{}'.format(rougeType, measure), np.nan) \
+            for measure in MEASURES] for rougeType in taskScores.rougeTypes]
+
+
+def getAverageScores(taskScores):
+    '''
+    The average scores of every system and summary length over its tasks, rounded to 5 decimals as ROUGE prints
+    them. The tasks are summed in order, as ROUGE does, so the averages of unrounded task scores (as from
+    rougePairCounts.getPairCountsScores) are the ones ROUGE outputs. The task scores ROUGE prints are rounded,
+    so averages computed from them may differ from ROUGE's in the last decimal.
+    Returns an array [system, summaryLength, rougeType, measure], with NaN where a system has no task scores.
+    '''
+    scores = taskScores.scores
+    numTasks = np.sum(~np.isnan(scores), axis=1)
+    # a sum over a non-contiguous axis adds the tasks one by one (no pairwise summation):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.nansum(scores, axis=1) / numTasks
+    averages[numTasks == 0] = np.nan
+    return np.array([float('{:.5f}'.format(average)) for average in averages.ravel()]).reshape(averages.shape)
+
+
+def saveTaskScores(taskScores, path):
+    '''
+    Saves the taskScores to a compressed NumPy file at path.
+    '''
+    with open(path, 'wb') as outF:
+        np.savez_compressed(outF, systemNames=np.array(taskScores.systemNames, dtype=str),
+            taskNames=np.array(taskScores.taskNames, dtype=str),
+            summaryLengths=np.array(taskScores.summaryLengths, dtype=str),
+            rougeTypes=np.array(taskScores.rougeTypes, dtype=str), scores=taskScores.scores)
+
+
+def loadTaskScores(path):
+    '''
+    Returns the TaskScores saved at path by saveTaskScores.
+    '''
+    with np.load(path) as saved:
+        return TaskScores(saved['systemNames'].tolist(), saved['taskNames'].tolist(),
+            saved['summaryLengths'].tolist(), saved['rougeTypes'].tolist(), saved['scores'])
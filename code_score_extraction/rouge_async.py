@@ -0,0 +1,263 @@
+from __future__ import print_function, unicode_literals, division
+
+import os
+import asyncio
+
+from subprocess import CalledProcessError
+from collections import OrderedDict
+
+from pyrouge import Rouge155
+from pyrouge.utils import log
+
+
+def evaluate_in_order(rouge, evaluations, max_processes=None,
+                      timeout=None):
+    """
+    Run the ROUGE-1.5.5.pl runs of a list of evaluations with rouge, as
+    concurrent processes of a RougeProcessPool in a new event loop, and
+    yield the results of each evaluation in order, as soon as they are
+    done. Closing the generator early cancels the runs left, which
+    stops their Perl processes.
+
+        evaluations:    List of evaluations, each a list of runs, each
+                        a tuple (key, set_up): set_up() is called when
+                        the run starts, sets up rouge for it (e.g. its
+                        summaries) and returns a tuple (jobs,
+                        get_result), where jobs are passed to
+                        rouge.prepare_run() (None for a single system),
+                        and get_result(output, config_file, results)
+                        returns the result of the run, from its output
+                        (and the results parsed from it, or None).
+        max_processes:  As for RougeProcessPool.
+        timeout:        As for RougeProcessPool.
+
+    Yields: The list of the results of the runs of every evaluation,
+            where the result of a run that failed or timed out is None
+            (and its error is logged with its key).
+
+    """
+    pool = RougeProcessPool(max_processes, timeout)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tasks = []
+    try:
+        tasks = [loop.create_task(_evaluate_runs(pool, rouge, runs))
+                 for runs in evaluations]
+        # the loop runs all the runs while waiting for the next one in
+        # order:
+        for task in tasks:
+            yield loop.run_until_complete(task)
+    finally:
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(
+            asyncio.gather(*tasks, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def _evaluate_runs(pool, rouge, runs):
+    return await asyncio.gather(
+        *[_evaluate_run(pool, rouge, key, set_up) for key, set_up in runs])
+
+
+async def _evaluate_run(pool, rouge, key, set_up):
+    """
+    Run a run of evaluate_in_order() as soon as a slot of the pool is
+    free.
+
+    Returns: The result of the run, or None if it failed.
+
+    """
+    logger = log.get_global_console_logger()
+    try:
+        async with pool.slot:
+            # the run is set up, and its configuration file written,
+            # before any other run starts:
+            jobs, get_result = set_up()
+            run = rouge.prepare_run(jobs=jobs)
+            output = run.cached_output
+            results = None
+            try:
+                if output is None:
+                    output, results = await pool.run(run.command)
+                return get_result(output, run.config_file, results)
+            finally:
+                rouge.finish_run(run, output)
+    except RougeTimeoutError as e:
+        logger.error("ROUGE job {} timed out: {}".format(key, e))
+        return None
+    except Exception:
+        logger.exception("ROUGE job {} failed".format(key))
+        return None
+
+
+class RougeTimeoutError(Exception):
+    """
+    A ROUGE run stopped after running longer than the timeout of its
+    RougeProcessPool. The output and results it printed before it was
+    stopped are kept.
+
+    """
+
+    def __init__(self, command, timeout, output, results):
+        super(RougeTimeoutError, self).__init__(
+            "ROUGE run stopped after {} seconds: {}".format(
+                timeout, " ".join(command)))
+        self.command = command
+        self.timeout = timeout
+        self.output = output
+        self.results = results
+
+
+class RougeProcessPool(object):
+    """
+    Runs ROUGE-1.5.5.pl evaluations as asyncio subprocesses, at most
+    max_processes of them at the same time, instead of blocking on one
+    Perl process after the other. The average scores are parsed from
+    the output of every run line by line, as ROUGE prints them, and a
+    run that takes longer than timeout seconds is killed, so that a
+    hung Perl process does not stall a long series of evaluations.
+
+    rouge = Rouge155()
+    pool = RougeProcessPool(max_processes=8, timeout=600)
+
+    async def evaluate_systems(system_ids):
+        runs = []
+        for system_id in system_ids:
+            rouge.system_filename_pattern = ...
+            runs.append(pool.evaluate(rouge, system_id))
+        return await asyncio.gather(*runs)
+
+    The settings of the Rouge155 object (directories, filename
+    patterns, arguments) are read when evaluate() is called, so they
+    can be changed for the next evaluation right after. The pool must
+    be used in a single event loop at a time.
+
+    """
+
+    def __init__(self, max_processes=None, timeout=None):
+        """
+        Create a pool.
+
+            max_processes:  Maximal number of ROUGE processes running
+                            at the same time (the number of CPUs if
+                            None).
+            timeout:        Number of seconds after which a ROUGE run
+                            is killed (None for no limit).
+
+        """
+        self.log = log.get_global_console_logger()
+        self.max_processes = max_processes or os.cpu_count() or 1
+        self.timeout = timeout
+        self._slot = None
+        self._slot_loop = None
+
+    @property
+    def slot(self):
+        """
+        The semaphore bounding the number of ROUGE processes of the
+        pool. evaluate() holds it while its run is going on; callers of
+        run() hold it themselves (async with pool.slot).
+
+        """
+        loop = asyncio.get_running_loop()
+        if self._slot is None or self._slot_loop is not loop:
+            self._slot = asyncio.Semaphore(self.max_processes)
+            self._slot_loop = loop
+        return self._slot
+
+    async def evaluate(self, rouge, system_id=1, rouge_args=None,
+                       jobs=None):
+        """
+        Run ROUGE as rouge.evaluate() (or rouge.evaluate_batch(jobs))
+        would, as soon as a slot of the pool is free. The output is
+        taken from the score cache of rouge, if it has one, as
+        evaluate() would.
+
+        Returns: A tuple (ROUGE output as string, results), where the
+                 results are those of
+                 rouge.output_to_dict(output, by_system=True).
+
+        Raises: RougeTimeoutError if the run took too long, or
+                CalledProcessError if ROUGE failed.
+
+        """
+        async with self.slot:
+            run = rouge.prepare_run(system_id, rouge_args, jobs)
+            output = None
+            try:
+                if run.cached_output is not None:
+                    output = run.cached_output
+                    results = rouge.output_to_dict(output, by_system=True)
+                else:
+                    output, results = await self.run(run.command)
+            finally:
+                rouge.finish_run(run, output)
+        return output, results
+
+    async def run(self, command):
+        """
+        Run a ROUGE command line (e.g. the command of a RougeRun),
+        parsing its average scores as they are printed. The number of
+        processes is not bounded by the pool (cf. slot).
+
+        Returns: A tuple (ROUGE output as string, results), as for
+                 evaluate().
+
+        """
+        self.log.info(
+            "Running ROUGE with command {}".format(" ".join(command)))
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE)
+        lines = []
+        results = OrderedDict()
+        try:
+            await asyncio.wait_for(
+                self.__read_output(process, lines, results), self.timeout)
+        except asyncio.TimeoutError:
+            await self.__kill(process)
+            self.log.warning(
+                "Killed ROUGE after {} seconds: {}".format(
+                    self.timeout, " ".join(command)))
+            raise RougeTimeoutError(
+                command, self.timeout, b"".join(lines).decode("UTF-8"),
+                results)
+        except BaseException:
+            # e.g. the run was cancelled:
+            await self.__kill(process)
+            raise
+        output = b"".join(lines).decode("UTF-8")
+        if process.returncode:
+            raise CalledProcessError(process.returncode, command, output)
+        return output, results
+
+    @staticmethod
+    async def __read_output(process, lines, results):
+        """
+        Read the output of a ROUGE process into lines until it ends,
+        adding its average scores to results as they are printed.
+
+        """
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            lines.append(line)
+            average = Rouge155.parse_average_line(line.decode("UTF-8"))
+            if average:
+                sys_id, key, result, conf_begin, conf_end = average
+                system_results = results.setdefault(sys_id, {})
+                system_results[key] = result
+                system_results["{}_cb".format(key)] = conf_begin
+                system_results["{}_ce".format(key)] = conf_end
+        await process.wait()
+
+    @staticmethod
+    async def __kill(process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
@@ -0,0 +1,189 @@
+from __future__ import print_function, unicode_literals, division
+
+import os
+import time
+import sqlite3
+import hashlib
+
+
+class RougeScoreCache(object):
+    """
+    A persistent cache of ROUGE outputs, stored in an SQLite file, so
+    that reruns over the same summaries with the same options do not
+    evaluate again. Rouge155 consults it before every evaluation when
+    it is set as its score_cache:
+
+    rouge = Rouge155()
+    rouge.score_cache = RougeScoreCache('rouge_scores.sqlite')
+
+    The cache is content-addressed: a key is built from the hashes of
+    the system summary files, the sorted hashes of the model summary
+    files and the full ROUGE option list, so renamed or copied folders
+    (e.g. converted text summaries) still hit the cache.
+
+    The total size of the stored outputs is bounded by max_bytes; the
+    least recently used entries are evicted first. The cache file can
+    be shared by several processes.
+
+    """
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Open (or create) the cache.
+
+            path:       Path of the SQLite cache file.
+            max_bytes:  Maximal total size of the cached outputs.
+
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file_hashes = {}
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "key TEXT PRIMARY KEY, output TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS scores_last_access "
+                "ON scores (last_access)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            for name in ('hits', 'misses', 'evictions'):
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO stats VALUES (?, 0)", (name,))
+
+    def file_hash(self, path):
+        """
+        The SHA-1 hash of the content of the file at path. Hashes are
+        remembered as long as the file's size and modification time do
+        not change.
+
+        """
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        cached = self._file_hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self._file_hashes[path] = (signature, digest)
+        return digest
+
+    def dir_hashes(self, path):
+        """
+        The content hashes (cf. file_hash()) of all the files under the
+        directory at path, as a sorted list of "<relative path>:<hash>"
+        strings.
+
+        """
+        hashes = []
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                hashes.append("{}:{}".format(
+                    os.path.relpath(file_path, path),
+                    self.file_hash(file_path)))
+        return sorted(hashes)
+
+    @staticmethod
+    def make_key(parts):
+        """
+        Combine the given strings (summary hashes, options) into a
+        cache key.
+
+        """
+        return hashlib.sha1(
+            "\n".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns: The cached ROUGE output for key, or None.
+
+        """
+        with self._connection:
+            row = self._connection.execute(
+                "SELECT output FROM scores WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.__count('misses')
+                return None
+            self._connection.execute(
+                "UPDATE scores SET last_access = ? WHERE key = ?",
+                (time.time(), key))
+            self.__count('hits')
+        return row[0]
+
+    def put(self, key, output):
+        """
+        Store the ROUGE output for key, evicting the least recently
+        used entries if the cache grows over max_bytes.
+
+        """
+        size = len(output.encode('utf-8'))
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                (key, output, size, time.time()))
+            self.__evict()
+
+    def stats(self):
+        """
+        Returns: dictionary with the numbers of hits, misses and
+                 evictions so far, and the current number of entries
+                 and their total size in bytes.
+
+        """
+        stats = dict(self._connection.execute(
+            "SELECT name, value FROM stats").fetchall())
+        entries, total_size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM scores").fetchone()
+        stats['entries'] = entries
+        stats['bytes'] = total_size
+        return stats
+
+    def report(self, since=None):
+        """
+        A one line summary of the cache statistics, counting hits and
+        misses after the stats() snapshot since, if given.
+
+        """
+        stats = self.stats()
+        hits, misses = stats['hits'], stats['misses']
+        if since:
+            hits -= since['hits']
+            misses -= since['misses']
+        lookups = hits + misses
+        hit_rate = 100.0 * hits / lookups if lookups else 0.0
+        return (
+            "ROUGE score cache: {} hits, {} misses (hit rate {:.1f}%), "
+            "{} entries, {:.1f} MB".format(
+                hits, misses, hit_rate, stats['entries'],
+                stats['bytes'] / (1024.0 * 1024.0)))
+
+    def close(self):
+        self._connection.close()
+
+    def __count(self, name):
+        self._connection.execute(
+            "UPDATE stats SET value = value + 1 WHERE name = ?", (name,))
+
+    def __evict(self):
+        total_size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM scores").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._connection.execute(
+                "SELECT key, size FROM scores ORDER BY last_access"):
+            if total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total_size -= size
+        self._connection.executemany(
+            "DELETE FROM scores WHERE key = ?", evicted)
+        self._connection.execute(
+            "UPDATE stats SET value = value + ? WHERE name = 'evictions'",
+            (len(evicted),))
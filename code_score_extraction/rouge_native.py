@@ -0,0 +1,1481 @@
+from __future__ import print_function, unicode_literals, division
+
+import os
+import re
+import codecs
+
+import numpy as np
+from scipy import sparse
+
+from collections import Counter, OrderedDict, namedtuple
+
+
+class RougeSettings(namedtuple('RougeSettings', [
+        'data_dir', 'config_file', 'peer_id', 'all_peers', 'max_ngram',
+        'use_stemmer', 'remove_stopwords', 'length_limit', 'score_mode',
+        'alpha', 'confidence', 'resamples', 'skip_distance',
+        'skip_unigrams', 'wlcs_weight', 'compute_lcs', 'per_eval'])):
+    """
+    The ROUGE-1.5.5 command line options that affect the scores,
+    parsed from the same argument list that is passed to the Perl
+    script.
+
+    """
+
+    @staticmethod
+    def from_options(options):
+        """
+        Parse a ROUGE-1.5.5 argument list (as built by
+        Rouge155.__get_options) into a RougeSettings object.
+
+        Options that change the evaluation in a way the native
+        implementation does not reproduce raise an exception rather
+        than being silently ignored.
+
+        """
+        options = [str(o) for o in options]
+        values = {
+            'data_dir': None, 'config_file': None, 'peer_id': None,
+            'all_peers': False, 'max_ngram': 1, 'use_stemmer': False,
+            'remove_stopwords': False, 'length_limit': 0,
+            'score_mode': 'A', 'alpha': 0.5, 'confidence': 95,
+            'resamples': 1000, 'skip_distance': None,
+            'skip_unigrams': False, 'wlcs_weight': None,
+            'compute_lcs': True, 'per_eval': False}
+        valued = {
+            '-e': ('data_dir', str),
+            '-n': ('max_ngram', int),
+            '-l': ('length_limit', int),
+            '-f': ('score_mode', str),
+            '-p': ('alpha', float),
+            '-c': ('confidence', int),
+            '-r': ('resamples', int),
+            '-2': ('skip_distance', int),
+            '-w': ('wlcs_weight', float),
+            }
+        flags = {
+            '-a': 'all_peers',
+            '-m': 'use_stemmer',
+            '-s': 'remove_stopwords',
+            '-U': 'skip_unigrams',
+            '-d': 'per_eval',
+            }
+        ignored_flags = ['-v', '-M']
+        positional = []
+        i = 0
+        while i < len(options):
+            option = options[i]
+            if option in valued:
+                name, cast = valued[option]
+                if i + 1 >= len(options):
+                    raise Exception(
+                        "Missing value for ROUGE option {}.".format(option))
+                values[name] = cast(options[i + 1])
+                i += 2
+                continue
+            if option in flags:
+                values[flags[option]] = True
+            elif option == '-x':
+                values['compute_lcs'] = False
+            elif option in ignored_flags:
+                pass
+            elif option.startswith('-') and len(option) > 1:
+                raise Exception(
+                    "ROUGE option {} is not supported by the native "
+                    "ROUGE backend.".format(option))
+            else:
+                positional.append(option)
+            i += 1
+
+        if not positional:
+            raise Exception("No ROUGE configuration file given.")
+        values['config_file'] = positional[0]
+        if len(positional) > 1:
+            values['peer_id'] = positional[1]
+        if values['score_mode'] not in ('A', 'B'):
+            raise Exception(
+                "Unknown ROUGE scoring formula {}. Use A or B.".format(
+                    values['score_mode']))
+        return RougeSettings(**values)
+
+
+# The seed of the bootstrap resampling of the confidence intervals:
+DEFAULT_BOOTSTRAP_SEED = 0
+
+EvalSpec = namedtuple('EvalSpec', [
+    'eval_id', 'peer_root', 'model_root', 'input_format', 'peers', 'models'])
+
+
+class RougeNative(object):
+    """
+    An in-process implementation of the ROUGE 1.5.5 summary evaluation
+    package. It reads the same ROUGE-EVAL configuration file and the
+    same argument list as ROUGE-1.5.5.pl, and returns the same textual
+    output, so that Rouge155.output_to_dict() can be used unchanged:
+
+    native = RougeNative()
+    output = native.evaluate(
+        ['-e', data_dir, '-n', 4, '-w', 1.2, '-2', -1, '-U', '-a',
+         '-m', 'rouge_conf.xml'])
+
+    The supported measures are ROUGE-N, ROUGE-L (union LCS over the
+    model sentences), ROUGE-W (weighted LCS), ROUGE-S and ROUGE-SU.
+    Tokenization, Porter stemming (-m), stop word removal (-s), word
+    truncation (-l) and multiple model scoring (-f A|B) with
+    jackknifing follow the Perl script, so the average scores are those
+    it prints. The bootstrap confidence intervals are computed from
+    other random resamples than those of the Perl script (cf.
+    bootstrap_intervals()), so they differ from its intervals.
+
+    The summaries are tokenized once into integer token IDs by a token
+    cache (cf. pyrouge.rouge_tokens), which can be shared and saved to
+    a file so that later runs start from the tokenized summaries:
+
+    native = RougeNative(data_dir, RougeTokenCache('rouge_tokens.bin'))
+
+    """
+
+    # the number of summaries whose skip-bigram tables are kept:
+    SKIP_BIGRAM_CACHE_SIZE = 256
+
+    SEE_LINE_PATTERNS = [
+        re.compile(
+            r'^<a size="[0-9]+" name="[0-9]+">\[([0-9]+)\]</a>\s+'
+            r'<a href="#[0-9]+" id=[0-9]+>([^<]+)'),
+        re.compile(
+            r'^<a name="[0-9]+">\[([0-9]+)\]</a>\s+'
+            r'<a href="#[0-9]+" id=[0-9]+>([^<]+)'),
+        ]
+
+    def __init__(self, data_dir=None, token_cache=None):
+        """
+        Create a RougeNative object.
+
+            data_dir:       The ROUGE 'data' directory, containing the
+                            stop word list and the WordNet exceptions.
+                            Can also be given with the -e option on
+                            evaluate().
+            token_cache:    Optional RougeTokenCache of the tokenized
+                            summaries. A new (in-memory) one is used if
+                            not given.
+
+        """
+        if token_cache is None:
+            from pyrouge.rouge_tokens import RougeTokenCache
+            token_cache = RougeTokenCache()
+        self.token_cache = token_cache
+        self._data_dir = None
+        self._stopwords = None
+        self._stopwords_signature = None
+        self._exceptions = None
+        self._exceptions_signature = None
+        self._stems = {}
+        self._sentences = {}
+        self._skip_bigram_tables = OrderedDict()
+        if data_dir:
+            self.set_data_dir(data_dir)
+
+    def set_data_dir(self, data_dir):
+        """
+        Set the ROUGE data directory. The stop words and stemming
+        exceptions are (re)loaded lazily on their first use.
+
+        """
+        if data_dir != self._data_dir:
+            self._data_dir = data_dir
+            self._stopwords = None
+            self._exceptions = None
+            self._stems = {}
+            self._sentences = {}
+
+    def evaluate(self, options, confidence_intervals=True,
+                 bootstrap_seed=DEFAULT_BOOTSTRAP_SEED):
+        """
+        Run the evaluation described by the ROUGE argument list
+        options (which includes the configuration file path).
+
+            confidence_intervals:   If False, the bootstrap resampling
+                                    is skipped and the confidence
+                                    intervals are reported as the
+                                    averages themselves.
+            bootstrap_seed:         Seed of the bootstrap resampling,
+                                    so that the confidence intervals of
+                                    an evaluation are reproducible.
+
+        Returns: ROUGE output as string, in the format of
+                 ROUGE-1.5.5.pl.
+
+        """
+        settings = RougeSettings.from_options(options)
+        if not confidence_intervals:
+            settings = settings._replace(resamples=0)
+        if settings.data_dir:
+            self.set_data_dir(settings.data_dir)
+        evals = self.read_config(settings.config_file)
+        peer_results = self.score_evals(evals, settings)
+        return self.format_output(
+            peer_results, settings, np.random.default_rng(bootstrap_seed))
+
+    ###################################################################
+    # Configuration and summary reading
+
+    @staticmethod
+    def read_config(config_file_path):
+        """
+        Read a ROUGE-EVAL configuration file, as written by
+        Rouge155.write_config_static().
+
+        Returns: list of EvalSpec, where peers and models are lists of
+                 (id, filename) tuples.
+
+        """
+        with codecs.open(config_file_path, 'r', encoding='utf-8') as f:
+            config = f.read()
+
+        eval_pattern = re.compile(
+            r'<EVAL ID="([^"]*)">(.*?)</EVAL>', re.DOTALL)
+        tag_pattern = lambda tag: re.compile(
+            r'<{0}>\s*(.*?)\s*</{0}>'.format(tag), re.DOTALL)
+        model_root_pattern = tag_pattern('MODEL-ROOT')
+        peer_root_pattern = tag_pattern('PEER-ROOT')
+        format_pattern = re.compile(r'<INPUT-FORMAT TYPE="([^"]*)">')
+        peer_pattern = re.compile(r'<P ID="([^"]*)">\s*(.*?)\s*</P>')
+        model_pattern = re.compile(r'<M ID="([^"]*)">\s*(.*?)\s*</M>')
+
+        evals = []
+        for eval_id, body in eval_pattern.findall(config):
+            input_format = format_pattern.search(body)
+            input_format = input_format.group(1) if input_format else 'SEE'
+            if input_format.upper() != 'SEE':
+                raise Exception(
+                    "Input format {} is not supported by the native ROUGE "
+                    "backend.".format(input_format))
+            evals.append(EvalSpec(
+                eval_id,
+                peer_root_pattern.search(body).group(1),
+                model_root_pattern.search(body).group(1),
+                input_format,
+                peer_pattern.findall(body),
+                model_pattern.findall(body)))
+        return evals
+
+    @staticmethod
+    def read_see_sentences(path):
+        """
+        Read the sentences of a summary in SEE format, i.e. the text of
+        the lines ROUGE-1.5.5.pl recognizes as sentence elements.
+
+        """
+        sentences = []
+        with codecs.open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                for pattern in RougeNative.SEE_LINE_PATTERNS:
+                    match = pattern.match(line)
+                    if match:
+                        sentences.append(match.group(2))
+                        break
+        return sentences
+
+    @staticmethod
+    def tokenize(text):
+        """
+        Tokenize a text the way ROUGE-1.5.5.pl does: lowercase, split
+        off hyphens and replace anything that is not alphanumeric with
+        whitespace.
+
+        """
+        text = text.lower()
+        text = text.replace('-', ' - ')
+        text = re.sub(r'[^a-z0-9\-]', ' ', text)
+        return text.split()
+
+    def summary_sentences(self, path, settings):
+        """
+        Get the tokenized sentences of the summary at path as they are
+        counted for the given settings: truncated to the first -l
+        tokens, without stop words if -s is on and stemmed if -m is on.
+        The summary is taken from the token cache.
+
+        Returns: list of sentences, each a list of token IDs.
+
+        """
+        key = (path, settings.length_limit, settings.remove_stopwords,
+               settings.use_stemmer)
+        if key in self._sentences:
+            return self._sentences[key]
+
+        token_ids, sentence_lengths = self.token_cache.summary_tokens(path)
+        # views of the arrays, also for those mapped from a token cache
+        # file, from which the counted tokens are selected at once:
+        token_ids = np.asarray(token_ids)
+        sentence_lengths = np.asarray(sentence_lengths, dtype=np.int64)
+        if settings.length_limit:
+            # the first L tokens, in the sentences starting before them:
+            limit = settings.length_limit
+            starts = np.cumsum(sentence_lengths) - sentence_lengths
+            sentence_lengths = np.minimum(
+                sentence_lengths, limit - starts)[starts < limit]
+        ends = np.cumsum(sentence_lengths)
+        counted_ids, counted = self.__counted_tokens(
+            token_ids[:ends[-1] if len(ends) else 0], settings)
+
+        # the number of counted tokens before the end of each sentence:
+        bounds = np.concatenate(([0], np.cumsum(counted)))[
+            np.concatenate(([0], ends)).astype(np.int64)].tolist()
+        counted_ids = counted_ids.tolist()
+        sentences = [counted_ids[start:end]
+                     for start, end in zip(bounds[:-1], bounds[1:])]
+
+        self._sentences[key] = sentences
+        return sentences
+
+    def summary_token_positions(self, path, settings):
+        """
+        Get the tokens of the summary at path as they are counted for
+        the given settings (cf. summary_sentences()), without the
+        truncation: the truncation to the first L tokens (-l L) keeps
+        the tokens at positions below L, so the tokens of any
+        truncation length are a prefix of them.
+
+        Returns: (token IDs, positions), where positions[i] is the
+                 position of token i among all the tokens of the
+                 summary (including those ROUGE does not count).
+
+        """
+        key = (path, 'positions', settings.remove_stopwords,
+               settings.use_stemmer)
+        if key in self._sentences:
+            return self._sentences[key]
+
+        token_ids = np.asarray(self.token_cache.summary_tokens(path)[0])
+        counted_ids, counted = self.__counted_tokens(token_ids, settings)
+        tokens = counted_ids.tolist()
+        positions = np.flatnonzero(counted).tolist()
+
+        self._sentences[key] = (tokens, positions)
+        return tokens, positions
+
+    def __counted_tokens(self, token_ids, settings):
+        """
+        Select the tokens ROUGE counts among token_ids (an int32 array,
+        e.g. a view into the token cache file) for the given settings,
+        with array operations on the flags and stems of the token
+        cache: without stop words if -s is on and stemmed if -m is on.
+
+        Returns: (array of the IDs of the counted tokens, stemmed,
+                  bool array of whether each token is counted)
+
+        """
+        token_cache = self.token_cache
+        # the flags and stems are completed for new tokens first (which
+        # can add tokens), and are then only read, through views:
+        stopword_flags = stem_ids = None
+        if settings.remove_stopwords:
+            stopword_flags = token_cache.stopword_flags(
+                self.__require_data_dir(), self.stopwords,
+                self.stopwords_signature)
+        if settings.use_stemmer:
+            stem_ids = token_cache.stem_ids(
+                self.__require_data_dir(), self.stem,
+                self.exceptions_signature)
+        counted = np.frombuffer(
+            token_cache.counted_flags(), dtype=np.uint8)[token_ids] != 0
+        if stopword_flags is not None:
+            counted &= np.frombuffer(
+                stopword_flags, dtype=np.uint8)[token_ids] == 0
+        counted_ids = token_ids[counted]
+        if stem_ids is not None:
+            counted_ids = np.frombuffer(
+                stem_ids, dtype=np.int32)[counted_ids]
+        return counted_ids, counted
+
+    ###################################################################
+    # Stop words and stemming
+
+    @property
+    def stopwords(self):
+        """
+        The stop word list of ROUGE (smart_common_words.txt in the
+        data directory).
+
+        """
+        if self._stopwords is None:
+            path = os.path.join(self.__require_data_dir(),
+                                'smart_common_words.txt')
+            with codecs.open(path, 'r', encoding='utf-8') as f:
+                self._stopwords = frozenset(
+                    line.strip().lower() for line in f if line.strip())
+            self._stopwords_signature = files_signature([path])
+        return self._stopwords
+
+    @property
+    def stopwords_signature(self):
+        """
+        The signature of the stop word list that stopwords was read
+        from (cf. files_signature()).
+
+        """
+        # the signature is taken when the files are read:
+        self.stopwords
+        return self._stopwords_signature
+
+    @property
+    def exceptions(self):
+        """
+        The WordNet morphological exceptions that ROUGE-1.5.5.pl
+        consults before Porter stemming. They are read from the plain
+        text WordNet-2.0-Exceptions/*.exc files that the Berkeley DB
+        used by the Perl script is built from.
+
+        """
+        if self._exceptions is None:
+            self._exceptions = {}
+            exc_dir = os.path.join(self.__require_data_dir(),
+                                   'WordNet-2.0-Exceptions')
+            paths = []
+            if os.path.isdir(exc_dir):
+                paths = [os.path.join(exc_dir, filename)
+                         for filename in sorted(os.listdir(exc_dir))
+                         if filename.endswith('.exc')]
+            for path in paths:
+                with codecs.open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) >= 2:
+                            self._exceptions[parts[0]] = parts[1]
+            self._exceptions_signature = files_signature(paths)
+        return self._exceptions
+
+    @property
+    def exceptions_signature(self):
+        """
+        The signature of the exception files that exceptions was read
+        from (cf. files_signature()).
+
+        """
+        # the signature is taken when the files are read:
+        self.exceptions
+        return self._exceptions_signature
+
+    def stem(self, token):
+        """
+        Stem a token like ROUGE-1.5.5.pl's MorphStem: WordNet exceptions
+        first, the Porter stemmer otherwise.
+
+        """
+        stem = self._stems.get(token)
+        if stem is None:
+            stem = self.exceptions.get(token)
+            if stem is None:
+                stem = porter_stem(token)
+            self._stems[token] = stem
+        return stem
+
+    def __require_data_dir(self):
+        if not self._data_dir:
+            raise Exception(
+                "ROUGE data directory not set. Please pass it with the "
+                "-e option or on construction.")
+        return self._data_dir
+
+    ###################################################################
+    # Scoring
+
+    def rouge_types(self, settings):
+        """
+        The ROUGE measures computed for the settings, in output order.
+
+        """
+        types = ['ROUGE-{}'.format(n)
+                 for n in range(1, settings.max_ngram + 1)]
+        if settings.compute_lcs:
+            types.append('ROUGE-L')
+        if settings.wlcs_weight:
+            types.append('ROUGE-W-{}'.format(settings.wlcs_weight))
+        if settings.skip_distance is not None:
+            distance = ('*' if settings.skip_distance < 0
+                        else settings.skip_distance)
+            types.append('ROUGE-S{}'.format(distance))
+            if settings.skip_unigrams:
+                types.append('ROUGE-SU{}'.format(distance))
+        return types
+
+    def pair_counts(self, peer_sentences, model_sentences, settings,
+                    ngram_counts=None):
+        """
+        Count the matches of one peer summary against one model
+        summary, for each ROUGE measure of the settings.
+
+            ngram_counts:   The ROUGE-N counts of the pair, if already
+                            counted (cf. ngram_pair_counts()), as an
+                            OrderedDict of rouge type -> counts.
+
+        Returns: OrderedDict of rouge type -> (hit, model_total,
+                 peer_total).
+
+        """
+        peer_tokens = [t for s in peer_sentences for t in s]
+        model_tokens = [t for s in model_sentences for t in s]
+        counts = OrderedDict()
+        if ngram_counts is not None:
+            counts.update(ngram_counts)
+        else:
+            for n in range(1, settings.max_ngram + 1):
+                counts['ROUGE-{}'.format(n)] = ngram_match_counts(
+                    peer_tokens, model_tokens, n)
+        if settings.compute_lcs:
+            counts['ROUGE-L'] = lcs_union_counts(
+                peer_sentences, model_sentences)
+        if settings.wlcs_weight:
+            counts['ROUGE-W-{}'.format(settings.wlcs_weight)] = \
+                wlcs_counts(peer_tokens, model_tokens, settings.wlcs_weight)
+        if settings.skip_distance is not None:
+            distance = ('*' if settings.skip_distance < 0
+                        else settings.skip_distance)
+            skip_counts = skip_bigram_table_counts(
+                self.skip_bigram_table(peer_tokens, settings.skip_distance),
+                self.skip_bigram_table(model_tokens, settings.skip_distance))
+            counts['ROUGE-S{}'.format(distance)] = skip_counts
+            if settings.skip_unigrams:
+                # the unigrams are counted as for ROUGE-1:
+                unigram_counts = counts.get('ROUGE-1') or \
+                    ngram_match_counts(peer_tokens, model_tokens, 1)
+                counts['ROUGE-SU{}'.format(distance)] = tuple(
+                    s + u for s, u in zip(skip_counts, unigram_counts))
+        return counts
+
+    def ngram_pair_counts(self, peer_summaries, model_summaries, settings):
+        """
+        Count the ROUGE-N matches of every peer summary against every
+        model summary at once, from the n-gram count matrices of the
+        summaries (cf. ngram_count_matrices() and clipped_overlaps()).
+
+            peer_summaries, model_summaries:    Lists of summaries, as
+                                                returned by
+                                                summary_sentences().
+
+        Returns: OrderedDict of rouge type -> (hit array [peer, model],
+                 model_total array, peer_total array).
+
+        """
+        summaries = [[t for s in summary for t in s]
+                     for summary in peer_summaries + model_summaries]
+        counts = OrderedDict()
+        for n, matrix in enumerate(
+                ngram_count_matrices(summaries, settings.max_ngram), 1):
+            peer_matrix = matrix[:len(peer_summaries)]
+            model_matrix = matrix[len(peer_summaries):]
+            counts['ROUGE-{}'.format(n)] = (
+                clipped_overlaps(peer_matrix, model_matrix),
+                np.asarray(model_matrix.sum(axis=1)).ravel(),
+                np.asarray(peer_matrix.sum(axis=1)).ravel())
+        return counts
+
+    def matrix_pair_counts(self, summaries, settings):
+        """
+        Count the matches of every summary of a list against every one
+        of them (itself included), as pair_counts() counts a peer
+        against a model. The matches of a pair and of its reverse are
+        the same for every measure but ROUGE-L (whose LCS union is
+        taken over the model sentences), with the model and peer
+        totals swapped, so they are counted once for these measures.
+
+            summaries:  List of summaries, as returned by
+                        summary_sentences().
+
+        Returns: (list of rouge types, array [peer, model, rouge type,
+                 (hit, model_total, peer_total)]).
+
+        """
+        rouge_types = self.rouge_types(settings)
+        type_index = dict((rouge_type, index)
+                          for index, rouge_type in enumerate(rouge_types))
+        counts = np.zeros((len(summaries), len(summaries),
+                           len(rouge_types), 3))
+        ngram_counts = self.ngram_pair_counts(summaries, summaries, settings)
+        symmetric_settings = settings._replace(compute_lcs=False)
+        for i in range(len(summaries)):
+            for j in range(i, len(summaries)):
+                pair_ngram_counts = OrderedDict(
+                    (rouge_type, (int(hits[i, j]), int(model_totals[j]),
+                                  int(peer_totals[i])))
+                    for rouge_type, (hits, model_totals, peer_totals)
+                    in ngram_counts.items())
+                pair_counts = self.pair_counts(
+                    summaries[i], summaries[j], symmetric_settings,
+                    pair_ngram_counts)
+                for rouge_type, (hit, model_total, peer_total) in \
+                        pair_counts.items():
+                    index = type_index[rouge_type]
+                    counts[i, j, index] = (hit, model_total, peer_total)
+                    counts[j, i, index] = (hit, peer_total, model_total)
+        if settings.compute_lcs:
+            index = type_index['ROUGE-L']
+            for i in range(len(summaries)):
+                for j in range(len(summaries)):
+                    counts[i, j, index] = lcs_union_counts(
+                        summaries[i], summaries[j])
+        return rouge_types, counts
+
+    def pair_counts_by_length(self, peer, model, settings, lengths):
+        """
+        Count the ROUGE-N matches of one peer summary against one model
+        summary, both truncated to each of the lengths (as with -l),
+        in a single pass over the summaries.
+
+            peer, model:    The summary_token_positions() of the
+                            summaries.
+            lengths:        Increasing list of truncation lengths.
+
+        Returns: list with an OrderedDict of rouge type -> (hit,
+                 model_total, peer_total) for each length.
+
+        """
+        counts = [OrderedDict() for _ in lengths]
+        for n in range(1, settings.max_ngram + 1):
+            rouge_type = 'ROUGE-{}'.format(n)
+            for length_counts, ngram_counts in zip(
+                    counts, ngram_match_counts_by_length(
+                        peer[0], peer[1], model[0], model[1], n, lengths)):
+                length_counts[rouge_type] = ngram_counts
+        return counts
+
+    def skip_bigram_table(self, tokens, skip_distance):
+        """
+        The skip_bigram_table() of a token list, kept for the next
+        pairs of the summary (the SKIP_BIGRAM_CACHE_SIZE last ones).
+
+        """
+        key = (tuple(tokens), skip_distance)
+        table = self._skip_bigram_tables.pop(key, None)
+        if table is None:
+            table = skip_bigram_table(tokens, skip_distance)
+            if len(self._skip_bigram_tables) >= self.SKIP_BIGRAM_CACHE_SIZE:
+                self._skip_bigram_tables.popitem(last=False)
+        self._skip_bigram_tables[key] = table
+        return table
+
+    def score_evals(self, evals, settings):
+        """
+        Score every peer of every EVAL against the EVAL's models.
+
+        Returns: OrderedDict of peer id -> list of (eval id, scores),
+                 where scores is an OrderedDict of rouge type ->
+                 (recall, precision, f_score).
+
+        """
+        peer_results = OrderedDict()
+        for spec in evals:
+            models = [
+                self.summary_sentences(
+                    os.path.join(spec.model_root, name), settings)
+                for _, name in spec.models]
+            for peer_id, peer_name in spec.peers:
+                if not settings.all_peers and settings.peer_id is not None \
+                        and peer_id != settings.peer_id:
+                    continue
+                peer = self.summary_sentences(
+                    os.path.join(spec.peer_root, peer_name), settings)
+                per_model = [self.pair_counts(peer, model, settings)
+                             for model in models]
+                scores = OrderedDict()
+                for rouge_type in self.rouge_types(settings):
+                    scores[rouge_type] = jackknife_scores(
+                        [counts[rouge_type] for counts in per_model],
+                        settings.score_mode, settings.alpha,
+                        weight=wlcs_weight_of(rouge_type))
+                peer_results.setdefault(peer_id, []).append(
+                    (spec.eval_id, scores))
+        return peer_results
+
+    def format_output(self, peer_results, settings, rng=None):
+        """
+        Render scores in the output format of ROUGE-1.5.5.pl. The
+        bootstrap resamples are drawn from rng (a numpy Generator), or
+        from a generator with the default seed.
+
+        """
+        if rng is None:
+            rng = np.random.default_rng(DEFAULT_BOOTSTRAP_SEED)
+        lines = []
+        separator = '-' * 45
+        measures = [('R', 0), ('P', 1), ('F', 2)]
+        rouge_types = self.rouge_types(settings)
+        for peer_id, results in peer_results.items():
+            # the confidence intervals of all the rouge types and
+            # measures of the peer, from the same resamples of its EVALs:
+            per_eval_values = [
+                [value for rouge_type in rouge_types
+                 for value in scores[rouge_type]]
+                for _, scores in results]
+            conf_begins, conf_ends = bootstrap_intervals(
+                per_eval_values, settings.confidence, settings.resamples,
+                rng)
+            for type_index, rouge_type in enumerate(rouge_types):
+                lines.append(separator)
+                per_eval = [scores[rouge_type] for _, scores in results]
+                for label, index in measures:
+                    values = [s[index] for s in per_eval]
+                    average = sum(values) / len(values) if values else 0.0
+                    column = 3 * type_index + index
+                    conf_begin = conf_begins[column]
+                    conf_end = conf_ends[column]
+                    lines.append(
+                        "{} {} Average_{}: {:.5f} ({}%-conf.int. {:.5f} - "
+                        "{:.5f})".format(
+                            peer_id, rouge_type, label, average,
+                            settings.confidence, conf_begin, conf_end))
+                lines.append(separator)
+                if settings.per_eval:
+                    for eval_id, scores in results:
+                        r, p, f = scores[rouge_type]
+                        lines.append(
+                            "{} {} Eval {} R:{:.5f} P:{:.5f} "
+                            "F:{:.5f}".format(
+                                peer_id, rouge_type, eval_id, r, p, f))
+        return "\n".join(lines) + "\n"
+
+
+def files_signature(paths):
+    """
+    The names, sizes and modification times of the files at paths, as
+    a list of [name, size, mtime] lists (of JSON values), which changes
+    when any of the files is modified, added or removed.
+
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append(
+            [os.path.basename(path), stat.st_size, stat.st_mtime])
+    return signature
+
+
+###################################################################
+# Counting functions
+
+def ngram_match_counts(peer_tokens, model_tokens, n):
+    """
+    Clipped n-gram matches between a peer and a model token list.
+
+    Returns: (hit, model_total, peer_total)
+
+    """
+    peer_grams = Counter(
+        tuple(peer_tokens[i:i + n]) for i in range(len(peer_tokens) - n + 1))
+    model_grams = Counter(
+        tuple(model_tokens[i:i + n])
+        for i in range(len(model_tokens) - n + 1))
+    hit = sum(min(count, peer_grams[gram])
+              for gram, count in model_grams.items() if gram in peer_grams)
+    return (hit, sum(model_grams.values()), sum(peer_grams.values()))
+
+
+def ngram_count_matrices(token_lists, max_ngram):
+    """
+    The n-gram count matrices of the token lists, for n from 1 to
+    max_ngram: a sparse matrix [token list, n-gram] per n, over the
+    n-grams of all the token lists. The n-grams are numbered one
+    token at a time, each (n+1)-gram from the number of its first n
+    tokens and its last token, so they are never built as tuples.
+
+    Returns: list of scipy.sparse.csr_matrix, for n = 1..max_ngram.
+
+    """
+    lengths = np.array([len(tokens) for tokens in token_lists],
+                       dtype=np.int64)
+    rows = np.repeat(np.arange(len(token_lists)), lengths)
+    # the position of every token in its token list:
+    starts = np.cumsum(lengths) - lengths
+    positions = np.arange(len(rows)) - np.repeat(starts, lengths)
+    remaining = np.repeat(lengths, lengths) - positions
+
+    token_numbers, codes = np.unique(
+        np.array([t for tokens in token_lists for t in tokens],
+                 dtype=np.int64), return_inverse=True)
+    codes = codes.ravel()
+    num_tokens = len(token_numbers)
+    num_codes = num_tokens
+    token_codes = codes
+    matrices = []
+    for n in range(1, max_ngram + 1):
+        if n > 1:
+            # the n-gram starting at i: its first n-1 tokens and token
+            # i+n-1 (n-grams across token lists are dropped below):
+            gram_codes, codes = np.unique(
+                codes[:-1] * num_tokens + token_codes[n - 1:],
+                return_inverse=True)
+            codes = codes.ravel()
+            num_codes = len(gram_codes)
+        valid = remaining[:len(codes)] >= n
+        matrix = sparse.csr_matrix(
+            (np.ones(np.count_nonzero(valid), dtype=np.int64),
+             (rows[:len(codes)][valid], codes[valid])),
+            shape=(len(token_lists), num_codes))
+        matrix.sum_duplicates()
+        matrices.append(matrix)
+    return matrices
+
+
+def clipped_overlaps(peer_matrix, model_matrix):
+    """
+    The clipped n-gram matches (sum of the minimum counts of every
+    n-gram) of every row of peer_matrix against every row of
+    model_matrix, count matrices over the same n-grams. The minimum of
+    two counts is the number of thresholds t >= 1 both reach, so the
+    matches are a sum of sparse products of the 0/1 matrices of the
+    counts reaching each threshold, one per threshold up to the
+    highest count (a handful for summaries).
+
+    Returns: int array [peer, model].
+
+    """
+    overlaps = np.zeros((peer_matrix.shape[0], model_matrix.shape[0]),
+                        dtype=np.int64)
+    if not peer_matrix.nnz or not model_matrix.nnz:
+        return overlaps
+    max_count = min(peer_matrix.data.max(), model_matrix.data.max())
+    for threshold in range(1, max_count + 1):
+        peer_layer = (peer_matrix >= threshold).astype(np.int64)
+        model_layer = (model_matrix >= threshold).astype(np.int64)
+        overlaps += peer_layer.dot(model_layer.T).toarray()
+    return overlaps
+
+
+def ngram_match_counts_by_length(peer_tokens, peer_positions, model_tokens,
+                                 model_positions, n, lengths):
+    """
+    ROUGE-N matches between a peer and a model truncated to each of the
+    lengths. The n-grams of a summary are added one by one, in the
+    order of the positions they end at, and the clipped hit count is
+    updated as each n-gram is added: an n-gram of the peer adds a hit
+    if the peer has fewer of it than the model so far, and the other
+    way round. The counts of every length are read in passing, so a
+    length costs O(1) besides the n-grams it adds.
+
+        peer_positions, model_positions:    The position of every token
+                                            in its summary (cf.
+                                            RougeNative.
+                                            summary_token_positions()).
+        lengths:                            Increasing list of
+                                            truncation lengths.
+
+    Returns: list of (hit, model_total, peer_total), for each length.
+
+    """
+    peer_grams = [tuple(peer_tokens[i:i + n])
+                  for i in range(len(peer_tokens) - n + 1)]
+    model_grams = [tuple(model_tokens[i:i + n])
+                   for i in range(len(model_tokens) - n + 1)]
+    peer_counts = Counter()
+    model_counts = Counter()
+    hit = 0
+    peer_total = model_total = 0
+    counts = []
+    for length in lengths:
+        # the n-grams whose last token is below the length:
+        while peer_total < len(peer_grams) and \
+                peer_positions[peer_total + n - 1] < length:
+            gram = peer_grams[peer_total]
+            if peer_counts[gram] < model_counts[gram]:
+                hit += 1
+            peer_counts[gram] += 1
+            peer_total += 1
+        while model_total < len(model_grams) and \
+                model_positions[model_total + n - 1] < length:
+            gram = model_grams[model_total]
+            if model_counts[gram] < peer_counts[gram]:
+                hit += 1
+            model_counts[gram] += 1
+            model_total += 1
+        counts.append((hit, model_total, peer_total))
+    return counts
+
+
+def lcs_match_masks(sentence):
+    """
+    The bit masks of the positions of the tokens of a sentence, as used
+    by lcs_positions().
+
+    Returns: dict of token -> int, with bit i set if sentence[i] is the
+             token.
+
+    """
+    masks = {}
+    for position, token in enumerate(sentence):
+        masks[token] = masks.get(token, 0) | (1 << position)
+    return masks
+
+
+def bit_count(value):
+    """
+    The number of bits set in a non-negative int.
+
+    """
+    return bin(value).count('1')
+
+
+if hasattr(int, 'bit_count'):
+    bit_count = int.bit_count
+
+
+def lcs_positions(model_sentence, peer_sentence, model_masks=None):
+    """
+    The positions in model_sentence that take part in the longest
+    common subsequence with peer_sentence, using the same backtracking
+    preferences as ROUGE-1.5.5.pl.
+
+    The LCS table is computed bit-parallel (Hyyro, 2004): the column
+    of the table after each peer token is an int over the model
+    positions, whose zero bits mark where the LCS length increases, so
+    a peer token updates a whole column with a few int operations. The
+    columns are kept for the backtracking, where the table value at
+    (i, j) is the number of zero bits among the first i bits of column
+    j.
+
+        model_masks:    Optional lcs_match_masks() of model_sentence,
+                        computed once for all the peer sentences.
+
+    """
+    m, n = len(model_sentence), len(peer_sentence)
+    if not m or not n:
+        return set()
+    if model_masks is None:
+        model_masks = lcs_match_masks(model_sentence)
+    full = (1 << m) - 1
+    column = full
+    columns = [column]
+    for token in peer_sentence:
+        matches = column & model_masks.get(token, 0)
+        column = ((column + matches) | (column - matches)) & full
+        columns.append(column)
+    positions = set()
+    if column == full:
+        # no common token
+        return positions
+    i, j = m, n
+    while i > 0 and j > 0:
+        if model_sentence[i - 1] == peer_sentence[j - 1]:
+            positions.add(i - 1)
+            i -= 1
+            j -= 1
+        elif (i - 1 - bit_count(columns[j] & ((1 << (i - 1)) - 1)) >=
+              i - bit_count(columns[j - 1] & ((1 << i) - 1))):
+            i -= 1
+        else:
+            j -= 1
+    return positions
+
+
+def lcs_union_counts(peer_sentences, model_sentences):
+    """
+    Summary level ROUGE-L matches: for every model sentence, the union
+    of its LCS positions with all peer sentences, where each matched
+    token is counted at most as often as it occurs in both summaries.
+
+    Returns: (hit, model_total, peer_total)
+
+    """
+    model_left = Counter(t for s in model_sentences for t in s)
+    peer_left = Counter(t for s in peer_sentences for t in s)
+    model_total = sum(model_left.values())
+    peer_total = sum(peer_left.values())
+    hit = 0
+    for model_sentence in model_sentences:
+        model_masks = lcs_match_masks(model_sentence)
+        union = set()
+        for peer_sentence in peer_sentences:
+            union |= lcs_positions(model_sentence, peer_sentence, model_masks)
+        for position in sorted(union):
+            token = model_sentence[position]
+            if model_left[token] > 0 and peer_left[token] > 0:
+                hit += 1
+                model_left[token] -= 1
+                peer_left[token] -= 1
+    return (hit, model_total, peer_total)
+
+
+# Above this number of table cells per anti-diagonal, wlcs_counts()
+# fills the table with NumPy, an anti-diagonal at a time:
+WLCS_VECTORIZED_MIN_CELLS = 200
+
+
+def wlcs_counts(peer_tokens, model_tokens, weight):
+    """
+    ROUGE-W matches: the weighted LCS of the two token lists with the
+    weighting function f(k) = k^weight, and the weighted lengths of the
+    model and the peer.
+
+    Returns: (hit, model_total, peer_total)
+
+    """
+    m, n = len(model_tokens), len(peer_tokens)
+    # the weights f(k) of the runs of k matches:
+    powers = [k ** weight for k in range(min(m, n) + 1)]
+    if m * n > WLCS_VECTORIZED_MIN_CELLS * (m + n):
+        hit = wlcs_diagonals(peer_tokens, model_tokens, powers)
+    else:
+        hit = wlcs_rows(peer_tokens, model_tokens, powers)
+    return (hit, m ** weight, n ** weight)
+
+
+def wlcs_rows(peer_tokens, model_tokens, powers):
+    """
+    The weighted LCS table of ROUGE-1.5.5.pl, filled a row (model
+    token) at a time, keeping only the previous row. A match extending
+    a run of k matches adds powers[k + 1] - powers[k].
+
+    Returns: the weighted LCS.
+
+    """
+    n = len(peer_tokens)
+    prev_c = [0.0] * (n + 1)
+    prev_w = [0] * (n + 1)
+    for token in model_tokens:
+        row_c = [0.0] * (n + 1)
+        row_w = [0] * (n + 1)
+        left = 0.0
+        for j, peer_token in enumerate(peer_tokens, start=1):
+            if token == peer_token:
+                k = prev_w[j - 1]
+                left = prev_c[j - 1] + powers[k + 1] - powers[k]
+                row_w[j] = k + 1
+            elif prev_c[j] > left:
+                left = prev_c[j]
+            row_c[j] = left
+        prev_c, prev_w = row_c, row_w
+    return prev_c[n]
+
+
+def wlcs_diagonals(peer_tokens, model_tokens, powers):
+    """
+    The same table as wlcs_rows(), filled an anti-diagonal (i + j = d)
+    at a time with NumPy: the cells of an anti-diagonal only depend on
+    the two previous ones. The anti-diagonals are indexed by the model
+    position i, so the neighbours of the cells are slices of them.
+
+    Returns: the weighted LCS.
+
+    """
+    m, n = len(model_tokens), len(peer_tokens)
+    if not m or not n:
+        return 0.0
+    powers = np.array(powers)
+    model = np.asarray(model_tokens)
+    # peer_reversed[n - d + i] is the peer token of cell (i, d - i):
+    peer_reversed = np.asarray(peer_tokens)[::-1].copy()
+    # the values and run lengths of the anti-diagonals d - 2, d - 1, d:
+    c2, c1, c0 = np.zeros(m + 1), np.zeros(m + 1), np.zeros(m + 1)
+    w2, w1, w0 = [np.zeros(m + 1, dtype=np.intp) for _ in range(3)]
+    for d in range(2, m + n + 1):
+        lo, hi = max(1, d - n), min(m, d - 1)
+        match = model[lo - 1:hi] == peer_reversed[n - d + lo:n - d + hi + 1]
+        k = w2[lo - 1:hi]
+        c0[lo:hi + 1] = np.where(
+            match, c2[lo - 1:hi] + powers[k + 1] - powers[k],
+            np.maximum(c1[lo - 1:hi], c1[lo:hi + 1]))
+        w0[lo:hi + 1] = np.where(match, k + 1, 0)
+        # the border cells (0, d) and (d, 0):
+        c0[0], w0[0] = 0.0, 0
+        if d <= m:
+            c0[d], w0[d] = 0.0, 0
+        c2, c1, c0 = c1, c0, c2
+        w2, w1, w0 = w1, w0, w2
+    return float(c1[m])
+
+
+def skip_bigram_table(tokens, skip_distance):
+    """
+    Count the skip-bigrams of a token list, i.e. the ordered token
+    pairs at most skip_distance tokens apart (any distance if
+    skip_distance is negative), from prefix counts instead of
+    enumerating the pairs: with one column per distinct token, the
+    cumulative counts of the tokens give, for every position, the
+    counts of the tokens in the positions before it (within the skip
+    distance), i.e. of the skip-bigrams ending at that position. Adding
+    them up per token at that position gives all the counts.
+
+    Returns: (codes, counts), int64 arrays sorted by code, where the
+             code of the skip-bigram (a, b) of token IDs is
+             (a << 32) | b.
+
+    """
+    n = len(tokens)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    vocabulary, local_ids = np.unique(
+        np.asarray(tokens, dtype=np.int64), return_inverse=True)
+    occurrences = np.zeros((n, len(vocabulary)), dtype=np.int64)
+    occurrences[np.arange(n), local_ids] = 1
+    cumulative = np.cumsum(occurrences, axis=0)
+    # the counts of the tokens before each position, within the distance:
+    before = np.zeros_like(cumulative)
+    before[1:] = cumulative[:-1]
+    if 0 <= skip_distance < n - 2:
+        before[skip_distance + 2:] -= cumulative[:n - skip_distance - 2]
+    # [second token, first token] -> count, summing the positions per token:
+    order = np.argsort(local_ids, kind='stable')
+    seconds, starts = np.unique(local_ids[order], return_index=True)
+    pair_counts = np.add.reduceat(before[order], starts, axis=0)
+    second_index, first_index = np.nonzero(pair_counts)
+    codes = (vocabulary[first_index] << 32) | vocabulary[seconds[second_index]]
+    counts = pair_counts[second_index, first_index]
+    order = np.argsort(codes)
+    return codes[order], counts[order]
+
+
+def skip_bigram_table_counts(peer_table, model_table):
+    """
+    ROUGE-S matches between the skip_bigram_table() of a peer and of a
+    model.
+
+    Returns: (hit, model_total, peer_total)
+
+    """
+    peer_codes, peer_counts = peer_table
+    model_codes, model_counts = model_table
+    _, peer_index, model_index = np.intersect1d(
+        peer_codes, model_codes, assume_unique=True, return_indices=True)
+    hit = np.minimum(peer_counts[peer_index], model_counts[model_index])
+    return (int(hit.sum()), int(model_counts.sum()), int(peer_counts.sum()))
+
+
+def skip_bigram_counts(peer_tokens, model_tokens, skip_distance,
+                       with_unigrams):
+    """
+    ROUGE-S (or ROUGE-SU, with_unigrams) matches between a peer and a
+    model token list.
+
+    Returns: (hit, model_total, peer_total)
+
+    """
+    counts = skip_bigram_table_counts(
+        skip_bigram_table(peer_tokens, skip_distance),
+        skip_bigram_table(model_tokens, skip_distance))
+    if with_unigrams:
+        counts = tuple(s + u for s, u in zip(
+            counts, ngram_match_counts(peer_tokens, model_tokens, 1)))
+    return counts
+
+
+###################################################################
+# Score aggregation
+
+def wlcs_weight_of(rouge_type):
+    """
+    The weight of a ROUGE-W type name (e.g. 1.2 for ROUGE-W-1.2), or
+    None for other types.
+
+    """
+    if rouge_type.startswith('ROUGE-W-'):
+        return float(rouge_type[len('ROUGE-W-'):])
+    return None
+
+
+def round_score(score):
+    """
+    ROUGE-1.5.5.pl keeps its scores as "%7.5f" formatted strings.
+
+    """
+    return float("{:.5f}".format(score))
+
+
+def f_score(recall, precision, alpha):
+    if (1 - alpha) * precision + alpha * recall > 0:
+        return round_score(
+            precision * recall / ((1 - alpha) * precision + alpha * recall))
+    return 0.0
+
+
+def multi_model_scores(counts, score_mode, alpha, weight=None):
+    """
+    Score a peer against several models from the (hit, model_total,
+    peer_total) counts of each model. With score_mode 'A' the counts of
+    all models are summed, with 'B' the model with the best recall is
+    used. For ROUGE-W (weight given), the weighting is inverted on the
+    resulting ratios.
+
+    Returns: (recall, precision, f_score)
+
+    """
+    if score_mode == 'B':
+        best = None
+        for hit, model_total, peer_total in counts:
+            recall = hit / model_total if model_total else 0.0
+            if best is None or recall > best[0]:
+                best = (recall, (hit, model_total, peer_total))
+        counts = [best[1]] if best else []
+    hit = sum(c[0] for c in counts)
+    model_total = sum(c[1] for c in counts)
+    peer_total = sum(c[2] for c in counts)
+    recall = hit / model_total if model_total else 0.0
+    precision = hit / peer_total if peer_total else 0.0
+    if weight:
+        recall = recall ** (1.0 / weight)
+        precision = precision ** (1.0 / weight)
+    recall, precision = round_score(recall), round_score(precision)
+    return (recall, precision, f_score(recall, precision, alpha))
+
+
+def jackknife_scores(counts, score_mode, alpha, weight=None):
+    """
+    With more than one model, ROUGE-1.5.5.pl averages the scores over
+    all the subsets of models leaving one model out.
+
+    Returns: (recall, precision, f_score)
+
+    """
+    if len(counts) < 2:
+        return multi_model_scores(counts, score_mode, alpha, weight)
+    subsets = [
+        multi_model_scores(counts[:i] + counts[i + 1:],
+                           score_mode, alpha, weight)
+        for i in range(len(counts))]
+    return tuple(sum(s[k] for s in subsets) / len(subsets)
+                 for k in range(3))
+
+
+def round_scores(scores):
+    """
+    round_score() of every score of an array. np.round() scales the
+    scores by 10^5 before rounding, which may round a score the other
+    way than the "%7.5f" formatting when it is within the scaling
+    error of a tie, so these few scores are formatted one by one.
+
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    rounded = np.round(scores, 5)
+    scaled = scores * 1e5
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round_score(s) for s in scores[near_tie]]
+    return rounded
+
+
+def f_scores(recall, precision, alpha):
+    """
+    f_score() of arrays of recalls and precisions.
+
+    """
+    denominator = (1 - alpha) * precision + alpha * recall
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(denominator > 0,
+                          precision * recall / denominator, 0.0)
+    return round_scores(scores)
+
+
+def jackknife_score_arrays(counts, num_models, score_mode, alpha,
+                           weight=None):
+    """
+    jackknife_scores() of many peers at once, from arrays of their
+    counts against their models, with the same results: the counts of
+    the models of every subset (and for score_mode 'B', the model with
+    the best recall in the subset) are summed in the models' order.
+
+        counts:     Array [peer, model, (hit, model_total,
+                    peer_total)], with the models of each peer first
+                    (the counts after them are ignored).
+        num_models: Array of the number of models of each peer.
+
+    Returns: float array [peer, (recall, precision, f_score)]
+
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    num_models = np.asarray(num_models)
+    num_peers, max_models = counts.shape[:2]
+    models = np.arange(max_models)
+    present = models[None, :] < num_models[:, None]
+    jackknifed = num_models >= 2
+    # the subsets of each peer: without model i for every model i, or
+    # all its models (subset 0) if it has less than two models:
+    subsets = np.where(jackknifed[:, None], present, models[None, :] == 0)
+    in_subset = present[:, None, :] & ~(
+        jackknifed[:, None, None] & (models[:, None] == models[None, :]))
+
+    if score_mode == 'B':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            recalls = np.where(counts[:, :, 1] > 0,
+                               counts[:, :, 0] / counts[:, :, 1], 0.0)
+        candidates = np.where(in_subset, recalls[:, None, :], -np.inf)
+        if max_models:
+            # the first model with the best recall:
+            best = np.argmax(candidates, axis=2)
+            in_subset = (models[None, None, :] == best[:, :, None]) & \
+                in_subset.any(axis=2)[:, :, None]
+
+    totals = np.zeros((num_peers, max_models, 3))
+    for model in range(max_models):
+        totals += np.where(in_subset[:, :, model, None],
+                           counts[:, None, model, :], 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = np.where(totals[:, :, 1] > 0,
+                          totals[:, :, 0] / totals[:, :, 1], 0.0)
+        precision = np.where(totals[:, :, 2] > 0,
+                             totals[:, :, 0] / totals[:, :, 2], 0.0)
+    if weight:
+        recall = recall ** (1.0 / weight)
+        precision = precision ** (1.0 / weight)
+    recall, precision = round_scores(recall), round_scores(precision)
+    scores = np.stack(
+        [recall, precision, f_scores(recall, precision, alpha)], axis=2)
+
+    # the average over the subsets, summed in order:
+    average = np.zeros((num_peers, 3))
+    for subset in range(max_models):
+        average += np.where(subsets[:, subset, None],
+                            scores[:, subset, :], 0.0)
+    return average / np.maximum(subsets.sum(axis=1), 1)[:, None]
+
+
+def bootstrap_intervals(values, confidence, resamples, rng):
+    """
+    Bootstrap confidence intervals of the means of the columns of
+    values (a row per EVAL), as reported by ROUGE-1.5.5.pl's
+    "95%-conf.int." columns. All the resamples are drawn at once from
+    rng: a resample is the vector of the number of times each EVAL is
+    drawn, so the means of all the resamples and columns are a single
+    matrix product. The resamples are shared by the columns.
+
+    This is not the resampling of ROUGE-1.5.5.pl, which draws the EVALs
+    of each resample one by one with Perl's rand(), seeded differently
+    at every run. The resamples have the same distribution (the EVALs
+    drawn with replacement), but not the same draws, so the intervals
+    differ from those of the Perl script (as those of two runs of the
+    Perl script differ), and only the averages of the two outputs can
+    be compared.
+
+    Returns: (lower bounds, upper bounds), with a value per column.
+
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        columns = values.shape[1] if values.ndim == 2 else 0
+        return (np.zeros(columns), np.zeros(columns))
+    count = values.shape[0]
+    if resamples < 1 or count == 1:
+        mean = values.sum(axis=0) / count
+        return (mean, mean)
+    draws = rng.multinomial(count, np.full(count, 1.0 / count),
+                            size=resamples)
+    means = np.sort(draws.dot(values) / count, axis=0)
+    tail = (1 - confidence / 100.0) / 2
+    lower = int(resamples * tail)
+    upper = min(resamples - 1, int(resamples * (1 - tail)))
+    return (means[lower], means[upper])
+
+
+###################################################################
+# Porter stemmer, as embedded in ROUGE-1.5.5.pl
+
+_c = "[^aeiou]"
+_v = "[aeiouy]"
+_C = _c + "[^aeiouy]*"
+_V = _v + "[aeiou]*"
+_MGR0 = re.compile("^(" + _C + ")?" + _V + _C)
+_MEQ1 = re.compile("^(" + _C + ")?" + _V + _C + "(" + _V + ")?$")
+_MGR1 = re.compile("^(" + _C + ")?" + _V + _C + _V + _C)
+_VOWEL_IN_STEM = re.compile("^(" + _C + ")?" + _v)
+_CVC = re.compile("^" + _C + _v + "[^aeiouwxy]$")
+
+_STEP2 = {
+    'ational': 'ate', 'tional': 'tion', 'enci': 'ence', 'anci': 'ance',
+    'izer': 'ize', 'bli': 'ble', 'alli': 'al', 'entli': 'ent', 'eli': 'e',
+    'ousli': 'ous', 'ization': 'ize', 'ation': 'ate', 'ator': 'ate',
+    'alism': 'al', 'iveness': 'ive', 'fulness': 'ful', 'ousness': 'ous',
+    'aliti': 'al', 'iviti': 'ive', 'biliti': 'ble', 'logi': 'log'}
+_STEP3 = {
+    'icate': 'ic', 'ative': '', 'alize': 'al', 'iciti': 'ic', 'ical': 'ic',
+    'ful': '', 'ness': ''}
+_STEP2_PATTERN = re.compile(
+    "(ational|tional|enci|anci|izer|bli|alli|entli|eli|ousli|ization|"
+    "ation|ator|alism|iveness|fulness|ousness|aliti|iviti|biliti|logi)$")
+_STEP3_PATTERN = re.compile("(icate|ative|alize|iciti|ical|ful|ness)$")
+_STEP4_PATTERN = re.compile(
+    "(al|ance|ence|er|ic|able|ible|ant|ement|ment|ent|ou|ism|ate|iti|ous|"
+    "ive|ize)$")
+
+
+def porter_stem(word):
+    """
+    The Porter (1980) stemmer, ported from the Perl implementation that
+    ROUGE-1.5.5.pl uses.
+
+    """
+    if len(word) < 3:
+        return word
+    initial_y = word[0] == 'y'
+    if initial_y:
+        word = 'Y' + word[1:]
+
+    # Step 1a
+    match = re.search("(ss|i)es$", word)
+    if match:
+        word = word[:match.start()] + match.group(1)
+    else:
+        match = re.search("([^s])s$", word)
+        if match:
+            word = word[:match.start()] + match.group(1)
+
+    # Step 1b
+    match = re.search("eed$", word)
+    if match:
+        if _MGR0.search(word[:match.start()]):
+            word = word[:-1]
+    else:
+        match = re.search("(ed|ing)$", word)
+        if match:
+            stem = word[:match.start()]
+            if _VOWEL_IN_STEM.search(stem):
+                word = stem
+                if re.search("(at|bl|iz)$", word):
+                    word += 'e'
+                elif re.search(r"([^aeiouylsz])\1$", word):
+                    word = word[:-1]
+                elif _CVC.search(word):
+                    word += 'e'
+
+    # Step 1c
+    if word.endswith('y'):
+        stem = word[:-1]
+        if _VOWEL_IN_STEM.search(stem):
+            word = stem + 'i'
+
+    # Step 2
+    match = _STEP2_PATTERN.search(word)
+    if match:
+        stem = word[:match.start()]
+        if _MGR0.search(stem):
+            word = stem + _STEP2[match.group(1)]
+
+    # Step 3
+    match = _STEP3_PATTERN.search(word)
+    if match:
+        stem = word[:match.start()]
+        if _MGR0.search(stem):
+            word = stem + _STEP3[match.group(1)]
+
+    # Step 4
+    match = _STEP4_PATTERN.search(word)
+    if match:
+        stem = word[:match.start()]
+        if _MGR1.search(stem):
+            word = stem
+    else:
+        match = re.search("(s|t)(ion)$", word)
+        if match:
+            stem = word[:match.start()] + match.group(1)
+            if _MGR1.search(stem):
+                word = stem
+
+    # Step 5
+    if word.endswith('e'):
+        stem = word[:-1]
+        if _MGR1.search(stem) or (
+                _MEQ1.search(stem) and not _CVC.search(stem)):
+            word = stem
+    if word.endswith('ll') and _MGR1.search(word):
+        word = word[:-1]
+
+    if initial_y:
+        word = 'y' + word[1:]
+    return word
@@ -0,0 +1,384 @@
+from __future__ import print_function, unicode_literals, division
+
+import os
+import re
+import json
+import struct
+import tempfile
+
+from array import array
+
+import numpy as np
+
+from pyrouge.rouge_native import RougeNative
+
+# os.replace() is missing in Python 2, where os.rename() replaces the
+# file as well (on POSIX systems):
+_replace_file = getattr(os, 'replace', os.rename)
+
+
+# The start of a token cache file, followed by the length of its JSON
+# header:
+TOKEN_FILE_MAGIC = b'ROUGETOK'
+# The arrays of a token cache file start at multiples of:
+TOKEN_FILE_ALIGNMENT = 64
+
+
+class RougeTokenCache(object):
+    """
+    The tokenized summaries used by the native ROUGE implementation,
+    kept so that every summary file is read and tokenized once, for
+    all the ROUGE configurations (lengths, stop word modes) it is
+    evaluated in:
+
+    token_cache = RougeTokenCache('rouge_tokens.bin')
+    token_cache.add_dir('models')
+    token_cache.save()
+
+    Tokens are interned into integer IDs. A summary is kept as the
+    array of the IDs of its tokens, before truncation, stop word removal
+    and stemming, and the array of its sentence lengths. The stemmed
+    form and the stop word flag of every token are kept in arrays
+    indexed by token ID, for each ROUGE data directory (which holds the
+    stop word list and the stemming exceptions), with the signature of
+    the files they were computed from: they are computed again when the
+    files are modified.
+
+    With a path, the cache is loaded from and saved to a file, so that
+    later runs start from the tokenized summaries. A summary is
+    tokenized again when its size or modification time changed. The
+    file packs all the summaries into a few arrays (cf.
+    write_token_file()), which are memory-mapped when it is loaded: the
+    token IDs of a cached summary, and the flags and stems of the
+    tokens, are views into the file, read from disk only when used. The
+    flags and stems are copied into memory only when tokens are added
+    to the cache.
+
+    """
+
+    VERSION = 3
+
+    # only tokens starting with these characters are counted by ROUGE:
+    COUNTED_TOKEN_PATTERN = re.compile(r'[a-z0-9$]')
+
+    def __init__(self, path=None):
+        """
+        Create a token cache, loading it from path if the file exists.
+
+            path:   Optional path of the cache file.
+
+        """
+        self.path = path
+        self.tokens = []
+        self._token_ids = {}
+        self._counted = bytearray()
+        self._files = {}
+        self._metadata = {}
+        self._stem_ids = {}
+        self._stopword_flags = {}
+        # whether summaries were tokenized since the cache was loaded:
+        self.modified = False
+        if path and os.path.exists(path):
+            self.load()
+
+    def intern(self, token):
+        """
+        Returns: The integer ID of token.
+
+        """
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.tokens.append(token)
+            self._token_ids[token] = token_id
+            if not isinstance(self._counted, bytearray):
+                # the flags mapped from the file, completed in memory:
+                self._counted = bytearray(self._counted)
+            self._counted.append(
+                1 if self.COUNTED_TOKEN_PATTERN.match(token) else 0)
+        return token_id
+
+    def summary_tokens(self, path):
+        """
+        The tokens of the summary (in SEE format) at path, read and
+        tokenized if it is not in the cache or was modified.
+
+        Returns: (token IDs, sentence lengths), both array('i'), or
+                 int32 arrays for summaries loaded from the file.
+
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+        token_ids = array('i')
+        sentence_lengths = array('i')
+        for sentence in RougeNative.read_see_sentences(path):
+            tokens = RougeNative.tokenize(sentence)
+            token_ids.extend(self.intern(token) for token in tokens)
+            sentence_lengths.append(len(tokens))
+        self._files[path] = (signature, token_ids, sentence_lengths)
+        self.modified = True
+        return token_ids, sentence_lengths
+
+    def summary_metadata(self, path):
+        """
+        Returns: The metadata dictionary kept with the summary at path
+                 (cf. add_dir()), or None.
+
+        """
+        return self._metadata.get(os.path.abspath(path))
+
+    def add_dir(self, dir_path, metadata=None):
+        """
+        Tokenize all the summaries in dir_path that are not in the cache.
+
+            metadata:   Optional function of a filename, returning a
+                        dictionary (of JSON values) to keep with the
+                        summary, e.g. the fields of its filename.
+
+        """
+        for filename in sorted(os.listdir(dir_path)):
+            path = os.path.join(dir_path, filename)
+            if os.path.isfile(path):
+                self.summary_tokens(path)
+                if metadata is not None:
+                    summary_metadata = metadata(filename)
+                    path = os.path.abspath(path)
+                    if summary_metadata != self._metadata.get(path):
+                        self._metadata[path] = summary_metadata
+                        self.modified = True
+
+    def counted_flags(self):
+        """
+        Returns: bytearray of whether ROUGE counts each token ID, or
+                 a uint8 array mapped from the file.
+
+        """
+        return self._counted
+
+    def stem_ids(self, data_dir, stem, signature=None):
+        """
+        The token ID of the stemmed form of every token ID (the token
+        itself for tokens of at most 3 characters, which ROUGE does not
+        stem), completed with stem(token) for the tokens added since.
+
+            signature:  The signature of the stemming exception files
+                        of data_dir (cf. rouge_native.files_signature()).
+                        The stems of another signature are dropped.
+
+        Returns: array('i') indexed by token ID, or an int32 array
+                 mapped from the file.
+
+        """
+        cached = self._stem_ids.get(data_dir)
+        if cached is None or cached[0] != signature:
+            cached = self._stem_ids[data_dir] = (signature, array('i'))
+            self.modified = True
+        stem_ids = cached[1]
+        # interning stems adds tokens, which are stemmed in turn:
+        if len(stem_ids) < len(self.tokens):
+            self.modified = True
+            if not isinstance(stem_ids, array):
+                stem_ids = array('i', stem_ids.tolist())
+                self._stem_ids[data_dir] = (signature, stem_ids)
+        while len(stem_ids) < len(self.tokens):
+            token_id = len(stem_ids)
+            token = self.tokens[token_id]
+            stem_ids.append(
+                self.intern(stem(token)) if len(token) > 3 else token_id)
+        return stem_ids
+
+    def stopword_flags(self, data_dir, stopwords, signature=None):
+        """
+        Whether every token ID is in stopwords, completed for the
+        tokens added since.
+
+            signature:  The signature of the stop word list of data_dir
+                        (cf. rouge_native.files_signature()). The flags
+                        of another signature are dropped.
+
+        Returns: bytearray indexed by token ID, or a uint8 array
+                 mapped from the file.
+
+        """
+        cached = self._stopword_flags.get(data_dir)
+        if cached is None or cached[0] != signature:
+            cached = self._stopword_flags[data_dir] = (signature, bytearray())
+            self.modified = True
+        flags = cached[1]
+        if len(flags) < len(self.tokens):
+            self.modified = True
+            if not isinstance(flags, bytearray):
+                flags = bytearray(flags)
+                self._stopword_flags[data_dir] = (signature, flags)
+            flags.extend(1 if token in stopwords else 0
+                         for token in self.tokens[len(flags):])
+        return flags
+
+    def load(self):
+        """
+        Load the cache from its file, replacing the cached summaries.
+        An unreadable or outdated file leaves the cache empty.
+
+        """
+        try:
+            header, arrays = read_token_file(self.path)
+        except Exception:
+            return
+        if header.get('version') != self.VERSION:
+            return
+        self.tokens = header['tokens']
+        self._token_ids = dict(
+            (token, token_id) for token_id, token in enumerate(self.tokens))
+        # the arrays are kept as views into the mapped file:
+        self._counted = arrays['counted']
+        token_ids = arrays['token_ids']
+        sentence_lengths = arrays['sentence_lengths']
+        token_offsets = arrays['token_offsets']
+        sentence_offsets = arrays['sentence_offsets']
+        self._files = {}
+        self._metadata = {}
+        for index, (path, size, mtime, metadata) in enumerate(
+                header['files']):
+            self._files[path] = (
+                (size, mtime),
+                token_ids[token_offsets[index]:token_offsets[index + 1]],
+                sentence_lengths[
+                    sentence_offsets[index]:sentence_offsets[index + 1]])
+            if metadata is not None:
+                self._metadata[path] = metadata
+        self._stem_ids = dict(
+            (data_dir, (signature, arrays['stem_ids_{}'.format(index)]))
+            for index, (data_dir, signature)
+            in enumerate(header['stem_dirs']))
+        self._stopword_flags = dict(
+            (data_dir,
+             (signature, arrays['stopword_flags_{}'.format(index)]))
+            for index, (data_dir, signature)
+            in enumerate(header['stopword_dirs']))
+        self.modified = False
+
+    def save(self):
+        """
+        Save the cache to its file, through a temporary file so that
+        processes loading the cache never read a partial file.
+
+        """
+        paths = sorted(self._files)
+        token_lengths = [len(self._files[path][1]) for path in paths]
+        sentence_counts = [len(self._files[path][2]) for path in paths]
+        arrays = [
+            ('counted', np.frombuffer(bytes(self._counted), dtype=np.uint8)),
+            ('token_ids', _concatenate(
+                [self._files[path][1] for path in paths], np.int32)),
+            ('sentence_lengths', _concatenate(
+                [self._files[path][2] for path in paths], np.int32)),
+            ('token_offsets', np.concatenate(
+                [[0], np.cumsum(token_lengths, dtype=np.int64)])),
+            ('sentence_offsets', np.concatenate(
+                [[0], np.cumsum(sentence_counts, dtype=np.int64)])),
+            ]
+        stem_dirs = sorted(self._stem_ids)
+        stopword_dirs = sorted(self._stopword_flags)
+        for index, data_dir in enumerate(stem_dirs):
+            arrays.append(('stem_ids_{}'.format(index), np.asarray(
+                self._stem_ids[data_dir][1], dtype=np.int32)))
+        for index, data_dir in enumerate(stopword_dirs):
+            arrays.append(('stopword_flags_{}'.format(index), np.frombuffer(
+                bytes(self._stopword_flags[data_dir][1]), dtype=np.uint8)))
+        header = {
+            'version': self.VERSION,
+            'tokens': self.tokens,
+            'files': [
+                [path, self._files[path][0][0], self._files[path][0][1],
+                 self._metadata.get(path)] for path in paths],
+            'stem_dirs': [[data_dir, self._stem_ids[data_dir][0]]
+                          for data_dir in stem_dirs],
+            'stopword_dirs': [
+                [data_dir, self._stopword_flags[data_dir][0]]
+                for data_dir in stopword_dirs],
+            }
+        cache_dir = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix='.rouge_tokens_', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            write_token_file(f, header, arrays)
+        _replace_file(temp_path, self.path)
+        self.modified = False
+
+
+def write_token_file(f, header, arrays):
+    """
+    Write a token cache file: TOKEN_FILE_MAGIC, the length of the JSON
+    header (8 bytes, little-endian) and the header, and then the
+    arrays, each at a multiple of TOKEN_FILE_ALIGNMENT from the start
+    of the file. The name, dtype, offset and length of every array are
+    added to the header.
+
+        f:      File object open for writing in binary mode.
+        arrays: List of (name, numpy array) tuples.
+
+    """
+    header = dict(header)
+    header['arrays'] = {}
+    offset = 0
+    for name, values in arrays:
+        header['arrays'][name] = [values.dtype.str, offset, len(values)]
+        offset = _aligned(offset + values.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    f.write(TOKEN_FILE_MAGIC)
+    f.write(struct.pack('<Q', len(header_bytes)))
+    f.write(header_bytes)
+    position = len(TOKEN_FILE_MAGIC) + 8 + len(header_bytes)
+    data_start = _aligned(position)
+    f.write(b'\0' * (data_start - position))
+    position = 0
+    for name, values in arrays:
+        _, offset, _ = header['arrays'][name]
+        f.write(b'\0' * (offset - position))
+        f.write(values.tobytes())
+        position = offset + values.nbytes
+
+
+def read_token_file(path):
+    """
+    Read the header of a token cache file and memory-map its arrays
+    (cf. write_token_file()). The arrays are read-only views into the
+    mapped file, so nothing but the header is read until they are used.
+
+    Returns: (header dictionary, dictionary of array name -> array)
+
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(TOKEN_FILE_MAGIC)) != TOKEN_FILE_MAGIC:
+            raise Exception("Not a token cache file: {}".format(path))
+        header_length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    data_start = _aligned(len(TOKEN_FILE_MAGIC) + 8 + header_length)
+    mapped = None
+    if os.path.getsize(path) > data_start:
+        mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, (dtype, offset, length) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        if length == 0:
+            arrays[name] = np.zeros(0, dtype=dtype)
+            continue
+        start = data_start + offset
+        arrays[name] = mapped[start:start + length * dtype.itemsize].view(
+            dtype)
+    return header, arrays
+
+
+def _aligned(offset):
+    return -(-offset // TOKEN_FILE_ALIGNMENT) * TOKEN_FILE_ALIGNMENT
+
+
+def _concatenate(arrays, dtype):
+    if not arrays:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(
+        [np.asarray(values, dtype=dtype) for values in arrays])
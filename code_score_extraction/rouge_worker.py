@@ -0,0 +1,211 @@
+from __future__ import print_function, unicode_literals, division
+
+import os
+import sys
+import json
+import atexit
+import subprocess
+
+
+class RougeWorker(object):
+    """
+    A long-lived process running the native ROUGE implementation (cf.
+    pyrouge.rouge_native), which keeps the stop words, the stemming
+    exceptions, the stems and the tokenized summaries it loaded for an
+    evaluation for all the following ones, instead of loading them
+    again as every run of ROUGE-1.5.5.pl does. Rouge155 starts one on
+    its first evaluation with the BACKEND_WORKER backend, which all the
+    Rouge155 objects of the process share until it exits (cf.
+    get_worker()):
+
+    rouge = Rouge155(backend=Rouge155.BACKEND_WORKER)
+
+    The evaluations are sent to the worker as JSON lines on its
+    standard input, one per evaluation, with the ROUGE argument list
+    (including the configuration file path):
+
+    {"options": [...], "confidence_intervals": true, "bootstrap_seed": 0}
+
+    and it answers each with a JSON line on its standard output, with
+    the ROUGE output or the error of the evaluation:
+
+    {"output": "..."} or {"error": "..."}
+
+    The worker can run with another Python interpreter than the one of
+    Rouge155 (e.g. a Python 3 with NumPy for a Python 2 caller). It
+    stops at the end of its standard input, so it does not outlive the
+    process that started it. The Perl script exits after a single
+    evaluation, so it cannot be kept running the same way.
+
+    """
+
+    def __init__(self, data_dir=None, token_cache_path=None,
+                 python=sys.executable):
+        """
+        Create a worker, started on its first evaluation.
+
+            data_dir:           The ROUGE 'data' directory (it can
+                                also be given with the -e option of
+                                the evaluations).
+            token_cache_path:   Optional path of the token cache file
+                                (cf. pyrouge.rouge_tokens) the worker
+                                starts from.
+            python:             The Python interpreter running the
+                                worker.
+
+        """
+        self.data_dir = data_dir
+        self.token_cache_path = token_cache_path
+        self.python = python
+        self._process = None
+
+    def start(self):
+        """
+        Start the worker process, if it is not running.
+
+        """
+        if self._process is not None and self._process.poll() is None:
+            return
+        command = [self.python, '-m', 'pyrouge.rouge_worker',
+                   self.data_dir or '', self.token_cache_path or '']
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def evaluate(self, options, confidence_intervals=True,
+                 bootstrap_seed=0):
+        """
+        Run an evaluation in the worker, with the arguments of
+        RougeNative.evaluate(). The worker is started (again) if it is
+        not running.
+
+        Returns: ROUGE output as string.
+
+        """
+        self.start()
+        request = json.dumps({
+            'options': [str(option) for option in options],
+            'confidence_intervals': confidence_intervals,
+            'bootstrap_seed': bootstrap_seed,
+            })
+        try:
+            self._process.stdin.write(request.encode('UTF-8') + b'\n')
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        except (IOError, OSError):
+            line = b''
+        if not line:
+            self.stop()
+            raise Exception("The ROUGE worker stopped unexpectedly.")
+        response = json.loads(line.decode('UTF-8'))
+        if 'error' in response:
+            raise Exception(
+                "ROUGE worker error: {}".format(response['error']))
+        return response['output']
+
+    def stop(self):
+        """
+        Stop the worker process, if it is running.
+
+        """
+        process = self._process
+        self._process = None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        process.wait()
+        process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+# The workers shared by the Rouge155 objects of the process:
+_workers = {}
+
+
+def get_worker(data_dir=None, token_cache_path=None,
+               python=sys.executable):
+    """
+    Get the worker of the process for the given arguments (cf.
+    RougeWorker()), created on the first call and returned by all the
+    following ones, so that it is started once for the whole run. The
+    workers are stopped when the process exits.
+
+    """
+    key = (data_dir, token_cache_path, python)
+    worker = _workers.get(key)
+    if worker is None:
+        worker = _workers[key] = RougeWorker(*key)
+    return worker
+
+
+def stop_workers():
+    """
+    Stop all the workers of the process (cf. get_worker()).
+
+    """
+    for worker in list(_workers.values()):
+        worker.stop()
+    _workers.clear()
+
+
+def _forget_workers():
+    """
+    Forget the workers of the parent process in a forked process,
+    closing its copies of their pipes (otherwise the workers would not
+    see the end of their input when the parent stops them).
+
+    """
+    for worker in _workers.values():
+        process = worker._process
+        worker._process = None
+        if process is not None:
+            process.stdin.close()
+            process.stdout.close()
+    _workers.clear()
+
+
+atexit.register(stop_workers)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_workers)
+
+
+def serve(input_stream, output_stream, data_dir=None,
+          token_cache_path=None):
+    """
+    Answer the evaluation requests read from input_stream (JSON lines,
+    cf. RougeWorker) on output_stream, with a single RougeNative object,
+    until the end of input_stream. Both streams are binary.
+
+    """
+    from pyrouge.rouge_native import RougeNative
+    from pyrouge.rouge_tokens import RougeTokenCache
+    token_cache = RougeTokenCache(token_cache_path or None)
+    native = RougeNative(data_dir or None, token_cache)
+    for line in iter(input_stream.readline, b''):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line.decode('UTF-8'))
+            output = native.evaluate(
+                request['options'], request['confidence_intervals'],
+                request['bootstrap_seed'])
+            response = {'output': output}
+        except Exception as e:
+            response = {'error': "{}: {}".format(type(e).__name__, e)}
+        output_stream.write(json.dumps(response).encode('UTF-8') + b'\n')
+        output_stream.flush()
+
+
+if __name__ == "__main__":
+    # the responses have the real standard output to themselves:
+    input_stream = getattr(sys.stdin, 'buffer', sys.stdin)
+    output_stream = getattr(sys.stdout, 'buffer', sys.stdout)
+    sys.stdout = sys.stderr
+    serve(input_stream, output_stream, *sys.argv[1:3])
@@ -0,0 +1,91 @@
+'''
+This module converts folders of plain text summaries (one sentence per line) into the SEE format ROUGE uses, once
+for all the ROUGE evaluations of a run, instead of converting the whole folders again for every evaluation
+(as Rouge155.convert_and_evaluate does).
+
+Every summary is converted once per content: the converted summaries are kept by the hash of the text they were
+converted from, so summaries with the same text (in the same folder, in other folders, or in a folder converted
+again after some of its files changed) share a converted file. The converted folders are in a temporary folder,
+removed at the end:
+    with SummaryConverter() as converter:
+        convertedFolder = converter.getConvertedFolder('data/text.summaries')
+'''
+
+import os
+import codecs
+import shutil
+import hashlib
+import tempfile
+from pyrouge import Rouge155
+
+
+class SummaryConverter(object):
+    '''
+    Converts text summary folders into SEE summary folders, in a temporary folder removed by cleanup().
+    The temporary folder is created in scratchDir (e.g. Rouge155.TMPFS_DIR) if given and it exists.
+    '''
+    def __init__(self, scratchDir=None):
+        if scratchDir and not os.path.isdir(scratchDir):
+            scratchDir = None
+        self.workFolder = tempfile.mkdtemp(prefix='rouge_converted_', dir=scratchDir)
+        self._summariesFolder = os.path.join(self.workFolder, 'summaries')
+        os.mkdir(self._summariesFolder)
+        # content hash -> path of the converted summary:
+        self._convertedSummaries = {}
+        # absolute folder path -> (tuple of (filename, content hash), converted folder path):
+        self._convertedFolders = {}
+
+    def getConvertedFolder(self, folder):
+        '''
+        Returns the path of a folder with the summaries of the folder converted to SEE format, under the same
+        filenames. The folder is converted again only if its files changed, and only its summaries with a text not
+        converted before are converted.
+        '''
+        folder = os.path.abspath(folder)
+        filenames = sorted(filename for filename in os.listdir(folder) if os.path.isfile(os.path.join(folder, filename)))
+        texts = {}
+        for filename in filenames:
+            with codecs.open(os.path.join(folder, filename), 'r', encoding='UTF-8') as inF:
+                texts[filename] = inF.read()
+        signature = tuple((filename, hashlib.sha1(texts[filename].encode('UTF-8')).hexdigest()) for filename in filenames)
+
+        converted = self._convertedFolders.get(folder)
+        if converted is not None and converted[0] == signature:
+            return converted[1]
+
+        convertedFolder = tempfile.mkdtemp(prefix='folder_', dir=self.workFolder)
+        for filename, contentHash in signature:
+            convertedPath = self._convertedSummaries.get(contentHash)
+            if convertedPath is None:
+                convertedPath = os.path.join(self._summariesFolder, contentHash)
+                with codecs.open(convertedPath, 'w', encoding='UTF-8') as outF:
+                    outF.write(Rouge155.convert_text_to_rouge_format(texts[filename]))
+                self._convertedSummaries[contentHash] = convertedPath
+            self.__linkFile(convertedPath, os.path.join(convertedFolder, filename))
+
+        if converted is not None:
+            shutil.rmtree(converted[1], ignore_errors=True)
+        self._convertedFolders[folder] = (signature, convertedFolder)
+        return convertedFolder
+
+    def cleanup(self):
+        '''
+        Removes all the converted summaries.
+        '''
+        shutil.rmtree(self.workFolder, ignore_errors=True)
+        self._convertedSummaries = {}
+        self._convertedFolders = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.cleanup()
+
+    @staticmethod
+    def __linkFile(sourcePath, targetPath):
+        # a hard link shares the converted summary, or a copy where links are not supported:
+        try:
+            os.link(sourcePath, targetPath)
+        except (OSError, AttributeError):
+            shutil.copyfile(sourcePath, targetPath)
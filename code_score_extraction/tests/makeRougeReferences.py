@@ -0,0 +1,89 @@
+'''
+This script writes the reference outputs of ROUGE-1.5.5.pl that test_rouge_native.py compares the native ROUGE
+(rouge_native.py) with: the output of the Perl script for each of the option sets of REFERENCE_OPTIONS, over the small
+corpus of SEE summaries in the rouge_reference folder (3 documents, each with 2 system and 3 model summaries).
+
+Run it where the Perl ROUGE works (with the ROUGE home directory of the pyrouge settings, or the one given):
+    python makeRougeReferences.py [<ROUGE home directory>]
+The outputs are written to rouge_reference/perl_outputs/<name>.txt, and checked in with the corpus.
+'''
+
+import os
+import sys
+import codecs
+import shutil
+import tempfile
+import subprocess
+from pyrouge import Rouge155
+
+
+# The folder of the test corpus, and of the reference outputs in it:
+REFERENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rouge_reference')
+OUTPUTS_DIR = os.path.join(REFERENCE_DIR, 'perl_outputs')
+
+# The systems of the corpus, as (system ID, pattern of its summary filenames, pattern of their model summaries):
+SYSTEMS = [(sysId, r'D(\d+)\.P\.{}\.html'.format(sysId), r'D#ID#\.M\.[A-Z]\.html') for sysId in ['1', '2']]
+
+# The options of all the reference outputs (all the systems, with 95% confidence intervals of 1000 resamples):
+COMMON_OPTIONS = ['-a', '-c', 95, '-r', 1000]
+
+# The options of each reference output, by its name:
+REFERENCE_OPTIONS = [
+    ('ngrams', ['-n', 4]),
+    ('skip_bigrams', ['-n', 2, '-2', 4]),
+    ('skip_bigrams_unigrams', ['-n', 2, '-2', 4, '-U']),
+    ('skip_bigrams_unlimited', ['-2', -1, '-U']),
+    ('wlcs', ['-n', 1, '-w', 1.2]),
+    ('length_limit', ['-n', 2, '-l', 12]),
+    ('stop_words', ['-n', 2, '-s']),
+    ('stemming', ['-n', 2, '-m']),
+    ('best_model', ['-n', 2, '-f', 'B']),
+    ('average_model_alpha', ['-n', 2, '-f', 'A', '-p', 0.2]),
+    ('all_options', ['-n', 4, '-w', 1.2, '-2', -1, '-U', '-l', 25, '-s', '-m']),
+]
+
+
+def writeConfig(configPath):
+    '''
+    Writes the ROUGE configuration file of the test corpus at configPath, with an EVAL per document, where both
+    systems are peers.
+    '''
+    Rouge155.write_batch_config_static(os.path.join(REFERENCE_DIR, 'peers'), os.path.join(REFERENCE_DIR, 'models'),
+        SYSTEMS, configPath)
+
+
+def getRougeOptions(dataDir, options, configPath):
+    '''
+    The ROUGE argument list of a reference output with the given options (of REFERENCE_OPTIONS).
+    '''
+    return ['-e', dataDir] + COMMON_OPTIONS + options + [configPath]
+
+
+def main(rougeHomeDir=None):
+    # the home directory is not passed to Rouge155, which would save it in the pyrouge settings:
+    if rougeHomeDir:
+        binPath = os.path.join(rougeHomeDir, 'ROUGE-1.5.5.pl')
+        dataDir = os.path.join(rougeHomeDir, 'data')
+    else:
+        rouge = Rouge155()
+        binPath = rouge.bin_path
+        dataDir = rouge.data_dir
+
+    if not os.path.isdir(OUTPUTS_DIR):
+        os.makedirs(OUTPUTS_DIR)
+    tempDir = tempfile.mkdtemp()
+    try:
+        configPath = os.path.join(tempDir, 'rouge_conf.xml')
+        writeConfig(configPath)
+        for name, options in REFERENCE_OPTIONS:
+            command = ['perl', binPath] + [str(option) for option in getRougeOptions(dataDir, options, configPath)]
+            print(' '.join(command))
+            output = subprocess.check_output(command).decode('UTF-8')
+            with codecs.open(os.path.join(OUTPUTS_DIR, name + '.txt'), 'w', encoding='utf-8') as outF:
+                outF.write(output)
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
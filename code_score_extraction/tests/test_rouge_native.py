@@ -0,0 +1,94 @@
+"""
+Tests of the native ROUGE (rouge_native.py) against the outputs of
+ROUGE-1.5.5.pl over the corpus of the rouge_reference folder, written
+by makeRougeReferences.py. The tests are skipped until the reference
+outputs are generated (the perl_outputs folder exists), and then fail
+for any reference output that is missing. They are also skipped
+without a ROUGE data directory.
+
+    python -m unittest discover code_score_extraction/tests
+
+"""
+
+import os
+import re
+import codecs
+import shutil
+import tempfile
+import unittest
+
+from pyrouge import Rouge155
+from pyrouge.rouge_native import RougeNative
+
+import makeRougeReferences as references
+
+
+AVERAGE_PATTERN = re.compile(
+    r'^(\S+) (ROUGE-\S+) Average_([RPF]): ([0-9.]+)', re.MULTILINE)
+
+
+def average_scores(output):
+    """
+    The average scores of a ROUGE output, as printed.
+
+    Returns: dictionary of (system ID, rouge type, measure) -> score.
+
+    """
+    return dict(((system_id, rouge_type, measure), score)
+                for system_id, rouge_type, measure, score
+                in AVERAGE_PATTERN.findall(output))
+
+
+class RougeNativeReferenceTest(unittest.TestCase):
+    """
+    The average scores of the native ROUGE must be those of the Perl
+    script, to the 5 decimals it prints. The confidence intervals are
+    not compared: they are computed from other random resamples (cf.
+    rouge_native.bootstrap_intervals()).
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.data_dir = Rouge155().data_dir
+        except Exception:
+            cls.data_dir = None
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.config_path = os.path.join(cls.temp_dir, 'rouge_conf.xml')
+        references.writeConfig(cls.config_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+
+    def check_reference(self, name):
+        if not os.path.isdir(references.OUTPUTS_DIR):
+            self.skipTest("No reference outputs of ROUGE-1.5.5.pl in {} "
+                          "(cf. makeRougeReferences.py).".format(
+                              references.OUTPUTS_DIR))
+        path = os.path.join(references.OUTPUTS_DIR, name + '.txt')
+        self.assertTrue(os.path.isfile(path),
+                        "Missing reference output {}.".format(path))
+        if not self.data_dir or not os.path.isdir(self.data_dir):
+            self.skipTest("No ROUGE data directory.")
+        with codecs.open(path, 'r', encoding='utf-8') as f:
+            expected = average_scores(f.read())
+        options = dict(references.REFERENCE_OPTIONS)[name]
+        output = RougeNative().evaluate(references.getRougeOptions(
+            self.data_dir, options, self.config_path))
+        self.assertTrue(expected)
+        self.assertEqual(average_scores(output), expected)
+
+
+def _reference_test(name):
+    return lambda self: self.check_reference(name)
+
+
+# a test per reference output:
+for _name, _ in references.REFERENCE_OPTIONS:
+    setattr(RougeNativeReferenceTest, 'test_' + _name, _reference_test(_name))
+
+
+if __name__ == '__main__':
+    unittest.main()